@@ -0,0 +1,122 @@
+"""
+Micro-benchmark of converting a long structured abstract to PubMed sections
+
+Run from the repository folder:
+
+    python -m benchmarks.benchmark_abstract
+
+The result compares markup.abstract_sections() to a reference version of the
+string passes it replaced, which cleaned the abstract with regular expressions,
+split it into sections and converted the text of each section.
+"""
+import re
+import timeit
+from collections import OrderedDict
+from elifearticle import utils as eautils
+from elifetools import utils as etoolsutils
+from elifetools import utils_html
+from elifepubmed import markup, utils
+
+SECTION_COUNT = 40
+
+REPEAT = 5
+
+LABEL_TYPES = ["Background:", "Methods:", "Results:", "Conclusions:"]
+
+SECTION = (
+    '<sec id="abs{index}">\n<title>Section {index}:</title>\n'
+    "<p>Cells were grown in <italic>vitro</italic> &amp; counted "
+    '<xref ref-type="bibr" rid="bib{index}">Smith et al., 2020</xref>, '
+    "the <inline-formula><mml:math><mml:mi>x</mml:mi></mml:math></inline-formula> "
+    'value was &gt; 5 <ext-link ext-link-type="uri" xlink:href="https://elifesciences.org/">'
+    "eLife</ext-link> and <sc>dna</sc> <bold>levels</bold>.</p>\n</sec>\n"
+)
+
+
+def abstract():
+    "abstract XML string with object-id, comment and many sections"
+    return (
+        "<abstract>\n<!-- a comment -->\n"
+        '<object-id pub-id-type="doi">10.7554/eLife.00666.001</object-id>\n'
+        + "".join(SECTION.format(index=index) for index in range(SECTION_COUNT))
+        + "</abstract>"
+    )
+
+
+def reference_clean_abstract(abstract):
+    abstract = etoolsutils.remove_tag("abstract", abstract)
+    abstract = etoolsutils.remove_tag("xref", abstract)
+    abstract = etoolsutils.remove_tag("ext-link", abstract)
+    abstract = etoolsutils.remove_tag("related-object", abstract)
+    abstract = etoolsutils.remove_tag_and_text("object-id", abstract)
+    return utils_html.remove_comment_tags(abstract)
+
+
+def reference_abstract_sec(string):
+    part = OrderedDict()
+    label = ""
+    string = string.rstrip()
+    if string:
+        parts = re.split(r".*?<title>(.*?)</title>", string)
+        label = parts[1]
+        string = parts[2]
+    string = etoolsutils.remove_tag("p", string)
+    string = etoolsutils.remove_tag("sec", string).rstrip()
+    if string != "":
+        part["text"] = string
+        part["label"] = label
+    return part
+
+
+def reference_abstract_parts(abstract):
+    "the sections of a structured abstract"
+    parts = []
+    for a_sec in abstract.split("<sec"):
+        part = reference_abstract_sec(a_sec)
+        if part:
+            parts.append(part)
+    return parts
+
+
+def reference_abstract_sections(abstract_xml):
+    "the string passes made over the abstract before it was tokenised"
+    sections = []
+    for section in reference_abstract_parts(reference_clean_abstract(abstract_xml)):
+        string = utils.replace_mathml_tags(section.get("text"))
+        string = utils.replace_inline_tags(string)
+        string = eautils.remove_tag("p", string)
+        string = etoolsutils.escape_ampersand(string)
+        string = eautils.remove_tag("sc", string)
+        string = etoolsutils.escape_unmatched_angle_brackets(
+            string, utils.allowed_tags()
+        )
+        sections.append((section.get("label"), string))
+    return sections
+
+
+def best_time(function):
+    return min(timeit.repeat(function, number=20, repeat=REPEAT))
+
+
+def main():
+    abstract_xml = abstract()
+    expected = reference_abstract_sections(abstract_xml)
+    sections = markup.abstract_sections(abstract_xml, LABEL_TYPES)
+    assert expected == [
+        (section.get("label"), section.get("text")) for section in sections
+    ]
+    reference_seconds = best_time(lambda: reference_abstract_sections(abstract_xml))
+    seconds = best_time(lambda: markup.abstract_sections(abstract_xml, LABEL_TYPES))
+    print(
+        "{count} section abstract: reference {reference:.4f}s, markup {seconds:.4f}s, "
+        "{ratio:.1f}x".format(
+            count=SECTION_COUNT,
+            reference=reference_seconds,
+            seconds=seconds,
+            ratio=reference_seconds / seconds if seconds else float("inf"),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Micro-benchmarks of the elifepubmed.utils text helpers for a 5,000 author article
+
+Run from the repository folder:
+
+    python -m benchmarks.benchmark_utils
+
+Each result compares the utils function to a reference version which compiles its
+regular expressions on every call and is not memoised, as the functions used to be.
+The authors are timed with the name caches cleared before each run, cold, and
+with them filled by an earlier run, warm, most of their names are distinct.
+"""
+import random
+import re
+import timeit
+from elifepubmed import utils
+
+AUTHOR_COUNT = 5000
+
+REPEAT = 5
+
+# syllables the names are made from, along with upper case initials
+SYLLABLES = ["an", "ber", "ci", "do", "el", "fa", "gar", "hu", "ju", "ka", "lo", "mü"]
+
+INITIALS = "ABCDEFGHIJKLMNOPRSTWXYZ"
+
+ABSTRACT = (
+    "<p>The <inline-formula><mml:math><mml:mi>x</mml:mi></mml:math></inline-formula> "
+    "and <inline-formula><mml:math><mml:mi>y</mml:mi></mml:math></inline-formula> "
+    "values. </p>"
+) * 50
+
+
+def reference_separate_initials(given_name):
+    "separate_initials compiling its patterns on each call"
+    if not given_name:
+        return ""
+    match_pattern_r_space = re.compile(r"(?P<content>[A-Z]{2,})(?P<r_space>\s+)")
+    match_pattern_l_space = re.compile(r"(?P<l_space>\s+)(?P<content>[A-Z]{2,})")
+    match_pattern_exact = re.compile(r"^(?P<content>[A-Z]{2,})$")
+    given_name = match_pattern_r_space.sub(
+        utils.expand_initial_match_string, given_name
+    )
+    given_name = match_pattern_l_space.sub(
+        utils.expand_initial_match_string, given_name
+    )
+    given_name = match_pattern_exact.sub(utils.expand_initial_match_string, given_name)
+    return given_name
+
+
+def reference_contributor_initials(surname, given_name):
+    return "".join([value[0] for value in [given_name, surname] if value is not None])
+
+
+def reference_replace_mathml_tags(string, replacement="[Formula: see text]"):
+    "replace_mathml_tags replacing the string once for each match"
+    for tag_match in re.finditer(
+        r"<inline-formula>(.*?)</inline-formula>", string, re.DOTALL
+    ):
+        old_tag = "<inline-formula>" + tag_match.group(1) + "</inline-formula>"
+        string = string.replace(old_tag, replacement)
+    return string
+
+
+def random_name():
+    "capitalised name of two to four syllables"
+    return "".join(
+        random.choice(SYLLABLES) for _ in range(random.randint(2, 4))
+    ).capitalize()
+
+
+def random_given_name():
+    "given name of a name, initials or both, such as Anna, AB or Marcel ALM"
+    parts = [random_name()]
+    if random.random() < 0.5:
+        parts.append("".join(random.sample(INITIALS, random.randint(1, 3))))
+    random.shuffle(parts)
+    return " ".join(parts)
+
+
+def authors():
+    "list of surname and given name pairs, most of them distinct"
+    random.seed(AUTHOR_COUNT)
+    return [(random_name(), random_given_name()) for _ in range(AUTHOR_COUNT)]
+
+
+def format_authors(author_list, separate_initials, contributor_initials):
+    for surname, given_name in author_list:
+        separate_initials(given_name)
+        contributor_initials(surname, given_name)
+
+
+def best_time(function, setup="pass"):
+    return min(timeit.repeat(function, setup=setup, number=1, repeat=REPEAT))
+
+
+def clear_name_caches():
+    utils.separate_initials.cache_clear()
+    utils.contributor_initials.cache_clear()
+
+
+def report(name, reference_seconds, seconds):
+    print(
+        "{name}: reference {reference:.4f}s, utils {seconds:.4f}s, {ratio:.1f}x".format(
+            name=name,
+            reference=reference_seconds,
+            seconds=seconds,
+            ratio=reference_seconds / seconds if seconds else float("inf"),
+        )
+    )
+
+
+def main():
+    author_list = authors()
+    print(
+        "%s distinct given names of %s authors"
+        % (len({given_name for _, given_name in author_list}), AUTHOR_COUNT)
+    )
+    reference_seconds = best_time(
+        lambda: format_authors(
+            author_list, reference_separate_initials, reference_contributor_initials
+        )
+    )
+    report(
+        "%s authors, cold cache" % AUTHOR_COUNT,
+        reference_seconds,
+        best_time(
+            lambda: format_authors(
+                author_list, utils.separate_initials, utils.contributor_initials
+            ),
+            setup=clear_name_caches,
+        ),
+    )
+    report(
+        "%s authors, warm cache" % AUTHOR_COUNT,
+        reference_seconds,
+        best_time(
+            lambda: format_authors(
+                author_list, utils.separate_initials, utils.contributor_initials
+            )
+        ),
+    )
+    report(
+        "replace_mathml_tags",
+        best_time(lambda: reference_replace_mathml_tags(ABSTRACT)),
+        best_time(lambda: utils.replace_mathml_tags(ABSTRACT)),
+    )
+
+
+if __name__ == "__main__":
+    main()
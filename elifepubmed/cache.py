@@ -0,0 +1,260 @@
+"""
+On disk caches of the Article objects parsed from article XML files and of the
+serialised Article tags generated from them
+
+An ArticleCache entry is keyed on the content of the article XML file, its file
+name, which has the article version, and the options it was parsed with, so a file
+which has not changed since the last run is not parsed again. A FragmentCache entry
+is keyed on the article data, the config and the pub date, so the Article tag of an
+article which has not changed is not generated again. A cache folder has a version
+stamp of the libraries, all entries are removed when it changes. Once the entries
+are more than the maximum size the least recently used are removed.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import elifearticle
+import elifetools
+import elifepubmed
+
+# change when the format or the keys of the cache entries change
+CACHE_FORMAT = 2
+
+# maximum total size of the entries in bytes
+MAX_BYTES = 512 * 1024 * 1024
+
+VERSION_FILE_NAME = "VERSION"
+
+
+def version_stamp():
+    "versions which the parsed Article objects depend on"
+    return "cache %s elifearticle %s elifetools %s elifepubmed %s" % (
+        CACHE_FORMAT,
+        elifearticle.__version__,
+        elifetools.__version__,
+        elifepubmed.__version__,
+    )
+
+
+class DiskCache:
+    """
+    bytes stored in a folder by key, one file for each entry, the least recently
+    used entries are removed once they are more than max_bytes,
+    safe to use from more than one thread
+    """
+
+    # file name suffix of the entries
+    suffix = ".cache"
+
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES):
+        """
+        :param cache_dir: folder to store the entries in, it is created if it is missing
+        :param max_bytes: maximum total size of the entries in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.check_version()
+        # entry key to its size in bytes, the least recently used first
+        self.index = self.read_index()
+        self.total_bytes = sum(self.index.values())
+        self.hits = 0
+        self.misses = 0
+
+    def check_version(self):
+        "remove all the entries if they were made by other versions"
+        version_file = os.path.join(self.cache_dir, VERSION_FILE_NAME)
+        try:
+            with open(version_file, "r") as open_file:
+                if open_file.read() == version_stamp():
+                    return
+        except FileNotFoundError:
+            pass
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.suffix):
+                remove_file(entry.path)
+        with open(version_file, "w") as open_file:
+            open_file.write(version_stamp())
+
+    def read_index(self):
+        entries = [
+            (entry.name[: -len(self.suffix)], entry.stat())
+            for entry in os.scandir(self.cache_dir)
+            if entry.name.endswith(self.suffix)
+        ]
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        return {key: stat.st_size for key, stat in entries}
+
+    def file_path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def contains(self, key):
+        "whether the key is in the cache, it can be removed before it is read"
+        return os.path.exists(self.file_path(key))
+
+    def read(self, key):
+        "bytes of the key, or None if it is not in the cache"
+        try:
+            with open(self.file_path(key), "rb") as open_file:
+                data = open_file.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            # move the key to the most recently used end of the index, an entry
+            # written by another process is added to it
+            self.total_bytes += len(data) - self.index.pop(key, 0)
+            self.index[key] = len(data)
+            self.hits += 1
+        try:
+            # the modification time is the last access time for the next run
+            os.utime(self.file_path(key))
+        except FileNotFoundError:
+            pass
+        return data
+
+    def write(self, key, data):
+        "store the bytes, then remove the least recently used entries over max_bytes"
+        # write to a temporary file first so a partly written entry is never read
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as open_file:
+            open_file.write(data)
+        os.replace(tmp_path, self.file_path(key))
+        with self.lock:
+            self.total_bytes -= self.index.pop(key, 0)
+            self.index[key] = len(data)
+            self.total_bytes += len(data)
+            self.evict()
+
+    def evict(self):
+        "remove the least recently used entries until they are not over max_bytes"
+        with self.lock:
+            while self.total_bytes > self.max_bytes and self.index:
+                self.remove(next(iter(self.index)))
+
+    def remove(self, key):
+        with self.lock:
+            self.total_bytes -= self.index.pop(key, 0)
+        remove_file(self.file_path(key))
+
+    def clear(self):
+        "remove all the entries"
+        with self.lock:
+            for key in list(self.index):
+                self.remove(key)
+
+    def size(self):
+        "total size of the entries in bytes"
+        return self.total_bytes
+
+
+class ArticleCache(DiskCache):
+    "parsed Article objects keyed on their article XML file and parse options"
+
+    suffix = ".pickle"
+
+    @staticmethod
+    def key(article_xml, options=None):
+        """
+        cache key of the article XML file parsed with the options
+
+        :param article_xml: path to the article XML file
+        :param options: dict of the parse options, such as build_parts, as JSON values
+        """
+        digest = hashlib.sha256()
+        with open(article_xml, "rb") as open_file:
+            for chunk in iter(lambda: open_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(os.path.basename(article_xml).encode("utf-8"))
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        "the Article object of the key, or None if it is not in the cache"
+        data = self.read(key)
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # an unreadable entry is removed
+            self.remove(key)
+            with self.lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+    def put(self, key, article):
+        self.write(key, pickle.dumps(article, pickle.HIGHEST_PROTOCOL))
+
+
+class FragmentCache(DiskCache):
+    """
+    serialised Article tags keyed on the article data and the options they were
+    generated with, see fragment_key()
+    """
+
+    suffix = ".xml"
+
+    def get(self, key):
+        "Article tag bytes of the key, or None if it is not in the cache"
+        return self.read(key)
+
+    def put(self, key, fragment):
+        self.write(key, fragment)
+
+
+def canonical_value(value):
+    "JSON value of a value json cannot serialise, see canonical_json()"
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if hasattr(value, "__dict__"):
+        # the class name tells apart objects having the same attributes
+        return [type(value).__name__, vars(value)]
+    return repr(value)
+
+
+def canonical_json(value):
+    """
+    JSON string of the value and the attributes of the objects in it sorted by name,
+    it is the same for equal values in any process, unlike a pickle which changes
+    with the references the objects share, such as after it is unpickled
+    """
+    return json.dumps(value, default=canonical_value, sort_keys=True)
+
+
+def fragment_key(poa_article, config_section, pubmed_config, pub_date, options=None):
+    """
+    cache key of the serialised Article tag of the article
+
+    :param poa_article: Article object
+    :param config_section: name of the config section
+    :param pubmed_config: dict of parsed config values
+    :param pub_date: time.struct_time pub date of the Article tag, see
+        generate.get_pub_date(), only its year, month and day are used in the tag
+    :param options: dict of the serialisation options, such as pretty, as JSON values
+    """
+    return hashlib.sha256(
+        canonical_json(
+            [
+                poa_article,
+                config_section,
+                pubmed_config,
+                tuple(pub_date[:3]) if pub_date else None,
+                options,
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
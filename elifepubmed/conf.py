@@ -1,36 +1,69 @@
 import configparser as configparser
+import copy
 import json
+import os
+import threading
+from collections import OrderedDict
 import yaml
 
+CONFIG_FILE = "pubmed.cfg"
+
+
+def file_mtime(path):
+    "modification time of the file, None if it does not exist"
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
 config = configparser.ConfigParser(interpolation=None)
-config.read("pubmed.cfg")
+config.read(CONFIG_FILE)
+
+BOOLEAN_VALUES = ["split_article_categories", "fast_parse"]
+INT_VALUES = ["year_of_first_volume"]
+LIST_VALUES = [
+    "pub_date_types",
+    "author_contrib_types",
+    "history_date_types",
+    "remove_tags",
+    "abstract_label_types",
+    "markup_allowed_tags",
+    "markup_remove_tags",
+    "article_stages",
+    "object_list_stages",
+    "skip_stages",
+]
+DICT_VALUES = ["markup_tag_replacements"]
+YAML_VALUES = ["publication_types"]
+# values which are not copied for each caller, the publication type matchers are
+# cached by the identity of the publication_types list so it must not be changed
+SHARED_VALUES = YAML_VALUES
+
+# parsed config by section, stored with the modification times of its YAML files
+CONFIG_CACHE = {}
+# parsed config values set by override_config(), by section
+CONFIG_OVERRIDES = {}
+CONFIG_LOCK = threading.RLock()
+CONFIG_FILE_MTIME = {"mtime": file_mtime(CONFIG_FILE)}
 
 
 def parse_raw_config(raw_config):
     "parse the raw config to something good"
     pubmed_config = {}
-    boolean_values = []
-    int_values = []
-    list_values = []
-    yaml_values = []
-
-    boolean_values.append("split_article_categories")
-    int_values.append("year_of_first_volume")
-    list_values.append("pub_date_types")
-    list_values.append("author_contrib_types")
-    list_values.append("history_date_types")
-    list_values.append("remove_tags")
-    list_values.append("abstract_label_types")
-    yaml_values.append("publication_types")
 
     for value_name in raw_config:
-        if value_name in boolean_values:
+        if value_name in BOOLEAN_VALUES:
             pubmed_config[value_name] = raw_config.getboolean(value_name)
-        elif value_name in int_values:
+        elif value_name in INT_VALUES:
             pubmed_config[value_name] = raw_config.getint(value_name)
-        elif value_name in list_values:
+        elif value_name in LIST_VALUES:
             pubmed_config[value_name] = json.loads(raw_config.get(value_name))
-        elif value_name in yaml_values:
+        elif value_name in DICT_VALUES:
+            pubmed_config[value_name] = json.loads(
+                raw_config.get(value_name), object_pairs_hook=OrderedDict
+            )
+        elif value_name in YAML_VALUES:
             with open(raw_config.get(value_name), "rb") as yaml_file:
                 pubmed_config[value_name] = yaml.load(
                     yaml_file.read(), Loader=yaml.FullLoader
@@ -39,3 +72,94 @@ def parse_raw_config(raw_config):
             # default
             pubmed_config[value_name] = raw_config.get(value_name)
     return pubmed_config
+
+
+def yaml_file_mtimes(raw_config):
+    "map of YAML file paths referenced in the raw config to their modification time"
+    return {
+        raw_config.get(value_name): file_mtime(raw_config.get(value_name))
+        for value_name in YAML_VALUES
+        if value_name in raw_config
+    }
+
+
+def copy_config(values):
+    "copy of the parsed config values, the nested values are copied too"
+    return {
+        value_name: value if value_name in SHARED_VALUES else copy.deepcopy(value)
+        for value_name, value in values.items()
+    }
+
+
+def reload_config_file():
+    "read the config file again if it was modified since it was read"
+    mtime = file_mtime(CONFIG_FILE)
+    if CONFIG_FILE_MTIME.get("mtime") == mtime:
+        return
+    # remove all the old values, including the defaults, before reading
+    config.clear()
+    config[config.default_section].clear()
+    config.read(CONFIG_FILE)
+    CONFIG_FILE_MTIME["mtime"] = mtime
+    CONFIG_CACHE.clear()
+
+
+def load_config(config_section="elife"):
+    """
+    parsed config for the section, it is parsed once and then reused until
+    the config file or a YAML file it references is modified
+
+    :param config_section: name of the section in the config file
+    :returns: dict of parsed config values, including any override_config() values,
+        a copy which the caller can change, apart from the shared publication_types
+    """
+    with CONFIG_LOCK:
+        reload_config_file()
+        cached = CONFIG_CACHE.get(config_section)
+        if not cached or any(
+            file_mtime(path) != mtime for path, mtime in cached.get("mtimes").items()
+        ):
+            if config_section in config or config_section not in CONFIG_OVERRIDES:
+                raw_config = config[config_section]
+            else:
+                # a section only set in code is based on the defaults
+                raw_config = config[config.default_section]
+            cached = {
+                "mtimes": yaml_file_mtimes(raw_config),
+                "pubmed_config": parse_raw_config(raw_config),
+            }
+            CONFIG_CACHE[config_section] = cached
+        pubmed_config = copy_config(cached.get("pubmed_config"))
+        pubmed_config.update(copy_config(CONFIG_OVERRIDES.get(config_section, {})))
+    return pubmed_config
+
+
+def preload_config(config_sections=None):
+    "parse the config sections, all of the config file sections by default, ahead of use"
+    with CONFIG_LOCK:
+        reload_config_file()
+        if config_sections is None:
+            config_sections = config.sections()
+        for config_section in config_sections:
+            load_config(config_section)
+
+
+def override_config(config_section, values):
+    """
+    set config values for the section from a dict of parsed values,
+    they take precedence over the config file values,
+    the section does not need to be in the config file
+
+    :param config_section: name of the section
+    :param values: dict of parsed config values
+    """
+    with CONFIG_LOCK:
+        CONFIG_OVERRIDES[config_section] = dict(values)
+        CONFIG_CACHE.pop(config_section, None)
+
+
+def clear_config_cache():
+    "remove parsed config and override values so the config is parsed again"
+    with CONFIG_LOCK:
+        CONFIG_CACHE.clear()
+        CONFIG_OVERRIDES.clear()
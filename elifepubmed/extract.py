@@ -0,0 +1,136 @@
+"""
+Fast parsing of JATS article XML for PubMed deposits
+
+Most of an article XML file is never read when generating PubMed XML, but the
+elifetools parser searches the whole document for each value it reads, so the
+parse time grows with the size of the body and reference list. The parts PubMed
+does not use are cut from the XML in one streaming pass before it is parsed into
+an Article object by elifearticle, which keeps the Article objects the same:
+
+- the content of the article body is removed, the empty body tag is kept because
+  its presence tells a PoA article from a VoR article
+- sub-articles, such as decision letters and author responses, are removed
+- references other than data references are removed
+
+The rest of the XML is kept byte for byte, which is why the expat parser
+underneath ElementTree.iterparse() is used directly, it reports the byte offset
+of each tag in the file.
+"""
+import os
+import tempfile
+from xml.parsers import expat
+from elifearticle import parse
+
+# citation tag names of a ref tag, which have the publication-type attribute
+CITATION_TAG_NAMES = ("element-citation", "mixed-citation")
+
+# publication-type of the references which are kept
+KEPT_REF_PUBLICATION_TYPES = ("data",)
+
+
+def start_tag_end(data, index):
+    "offset after the > which ends the tag starting at index, > in quotes is skipped"
+    quote = None
+    for offset in range(index + 1, len(data)):
+        char = data[offset : offset + 1]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in (b'"', b"'"):
+            quote = char
+        elif char == b">":
+            return offset + 1
+    return len(data)
+
+
+def cut_ranges(data):
+    """
+    list of (start, end) byte offsets of the parts of the article XML to remove,
+    found in one pass of the expat parser, a range can be inside another range
+
+    :param data: bytes of the article XML
+    """
+    parser = expat.ParserCreate()
+    ranges = []
+    # stack of tag names with their start offset
+    open_tags = []
+    # state of the ref tag being parsed
+    ref = {}
+
+    def start_element(name, attributes):
+        index = parser.CurrentByteIndex
+        open_tags.append((name, index))
+        if name in CITATION_TAG_NAMES and ref and "publication_type" not in ref:
+            # the first citation of the ref
+            ref["publication_type"] = attributes.get("publication-type")
+        elif name == "ref" and not ref:
+            ref["depth"] = len(open_tags)
+
+    def element_range(start, index):
+        "offsets of the whole element, its start tag and whether it is an empty tag"
+        tag_end = start_tag_end(data, start)
+        if data[tag_end - 2 : tag_end] == b"/>":
+            return start, tag_end, tag_end, True
+        return start, data.index(b">", index) + 1, tag_end, False
+
+    def end_element(name):
+        index = parser.CurrentByteIndex
+        _, start = open_tags.pop()
+        depth = len(open_tags)
+        if name == "body" and depth == 1:
+            _, _, tag_end, empty = element_range(start, index)
+            if not empty:
+                # remove the content of the article body but keep the tag
+                ranges.append((tag_end, index))
+        elif name == "sub-article" and depth == 1:
+            ranges.append(element_range(start, index)[:2])
+        elif name == "ref" and ref and ref.get("depth") == depth + 1:
+            if ref.get("publication_type") not in KEPT_REF_PUBLICATION_TYPES:
+                ranges.append(element_range(start, index)[:2])
+            ref.clear()
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(data, True)
+    return ranges
+
+
+def prune(data):
+    "article XML bytes with the parts PubMed does not use removed"
+    parts = []
+    position = 0
+    for start, end in sorted(cut_ranges(data)):
+        if start < position:
+            # inside a range which is already removed
+            continue
+        parts.append(data[position:start])
+        position = end
+    parts.append(data[position:])
+    return b"".join(parts)
+
+
+def build_article_from_xml(
+    article_xml, detail="full", build_parts=None, remove_tags=None
+):
+    """
+    parse the article XML file with the parts PubMed does not use removed, the same
+    as elifearticle parse.build_article_from_xml() which it uses
+
+    :param article_xml: path to the article XML file
+    :returns: tuple of Article object and error count
+    """
+    with open(article_xml, "rb") as open_file:
+        data = open_file.read()
+    try:
+        data = prune(data)
+    except expat.ExpatError:
+        # XML which is not well-formed is parsed in full by elifearticle
+        pass
+    # elifearticle parses from a file path, the file name has the article version
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pruned_xml = os.path.join(tmp_dir, os.path.basename(article_xml))
+        with open(pruned_xml, "wb") as open_file:
+            open_file.write(data)
+        return parse.build_article_from_xml(
+            pruned_xml, detail=detail, build_parts=build_parts, remove_tags=remove_tags
+        )
@@ -1,19 +1,47 @@
 import time
 import re
 import os
+import io
+import functools
+import itertools
+import hashlib
+import multiprocessing
+import tempfile
+import threading
 from collections import OrderedDict
 from xml.etree.ElementTree import Element, SubElement, Comment
-from xml.etree import ElementTree
-from xml.dom import minidom
 from elifearticle import parse
 from elifearticle import utils as eautils
 from elifetools import utils as etoolsutils
-from elifetools import xmlio, utils_html
-from elifepubmed.conf import config, parse_raw_config
-from elifepubmed import utils
+from elifepubmed.conf import load_config
+from elifepubmed import (
+    cache,
+    extract,
+    instrument,
+    markup,
+    pipeline,
+    profiling,
+    serialize,
+    utils,
+)
 
 TMP_DIR = "tmp"
 
+ON_BEHALF_OF_CONTRIB_TYPE = "on-behalf-of"
+
+# environment variable which can set the generator version in the comment
+VERSION_ENVIRONMENT_VARIABLE = "ELIFEPUBMED_VERSION"
+
+# worker processes are replaced after this many tasks when building in parallel
+MAX_TASKS_PER_CHILD = 100
+
+# batch_id of each file when the output is split, from the batch_id and file number
+SPLIT_BATCH_ID_FORMAT = "%s-%03d"
+
+# path of a file published with no_clobber when there is a file at its path, from
+# its path without the extension, a sequence number and the extension
+UNIQUE_FILE_PATH_FORMAT = "%s-%d%s"
+
 
 ASSIGNING_AUTHORITY_URI_MAP = {
     "10.5061/dryad": "Dryad",
@@ -47,14 +75,34 @@ class PubMedXML:
     Generate PubMed XML for the article
     """
 
-    def __init__(self, poa_articles, pubmed_config, pub_date=None, add_comment=True):
+    def __init__(
+        self,
+        poa_articles,
+        pubmed_config,
+        pub_date=None,
+        add_comment=True,
+        version=None,
+        generator=None,
+        instrumentation=None,
+    ):
         """
         set the root node
         get the article type from the object passed in to the class
         set default values for items that are boilder plate for this XML
+        version is used in the comment, see get_version() for the default
+        generator is a PubMedGenerator for the pubmed_config with its lookups prepared
+        instrumentation is an optional instrument.Instrumentation used when no
+        generator is supplied, otherwise the generator instrumentation is used
         """
         # Set the config
         self.pubmed_config = pubmed_config
+        if generator is None:
+            generator = PubMedGenerator(
+                pubmed_config=pubmed_config, instrumentation=instrumentation
+            )
+        self.generator = generator
+        self.instrumentation = generator.instrumentation
+        self.markup_policy = generator.markup_policy
         # Create the root XML node
         self.root = Element("ArticleSet")
 
@@ -65,206 +113,1166 @@ class PubMedXML:
             self.pub_date = pub_date
 
         # Generate batch id
-        batch_doi = ""
-        if len(poa_articles) == 1:
-            # If only one article is supplied, then add the doi to the batch file name
-            batch_doi = str(poa_articles[0].manuscript) + "-"
-        self.batch_id = (
-            str(self.pubmed_config.get("batch_file_prefix"))
-            + batch_doi
-            + time.strftime("%Y%m%d%H%M%S", self.pub_date)
-        )
+        self.batch_id = get_batch_id(poa_articles, self.pubmed_config, self.pub_date)
 
         # set comment
         if add_comment:
             self.generated = time.strftime("%Y-%m-%d %H:%M:%S")
-            self.last_commit = eautils.get_last_commit_to_master()
-            self.comment = Comment(
-                "generated by "
-                + str(self.pubmed_config.get("generator"))
-                + " at "
-                + self.generated
-                + " from version "
-                + self.last_commit
+            self.last_commit = get_version(self.pubmed_config, version)
+            self.comment = generated_comment(
+                self.pubmed_config, self.generated, self.last_commit
             )
             self.root.append(self.comment)
 
-        self.contributors = None
-        self.groups = None
-
-        self.build(self.root, poa_articles)
+        with instrument.phase(self.instrumentation, "build"):
+            self.build(self.root, poa_articles)
 
     def build(self, root, poa_articles):
         for poa_article in poa_articles:
-            # Initialise these as None for each loop
-            self.contributors = None
-            self.groups = None
-
-            article_tag = SubElement(root, "Article")
-
-            self.set_journal(article_tag, poa_article)
-            set_replaces(article_tag, poa_article)
-            set_article_title(article_tag, poa_article)
-            set_e_location_id(article_tag, poa_article)
-            set_language(article_tag, self.pubmed_config.get("language"))
-            for contrib_type in self.pubmed_config.get("author_contrib_types"):
-                self.set_author_list(article_tag, poa_article, contrib_type)
-            self.set_group_list(article_tag, poa_article)
-            set_publication_type(
-                article_tag, poa_article, self.pubmed_config.get("publication_types")
+            self.build_article(root, poa_article)
+
+    def build_article(self, parent, poa_article):
+        "add the Article tag for one article to the parent tag and return it"
+        with profiling.article(self.generator.profiler, poa_article.doi):
+            return build_article_tag(poa_article, self.generator, self.pub_date, parent)
+
+    def output_xml(self, pretty=False, indent=""):
+        with instrument.phase(self.instrumentation, "serialise"):
+            xml_string = serialize.output_xml(
+                self.root,
+                self.pubmed_config.get("pubmed_xml_public_id"),
+                self.pubmed_config.get("pubmed_xml_system_id"),
+                pretty=pretty,
+                indent=indent,
             )
-            set_article_id_list(article_tag, poa_article)
-            self.set_history(article_tag, poa_article)
-            set_abstract(
-                article_tag, poa_article, self.pubmed_config.get("abstract_label_types")
+        instrument.count(self.instrumentation, "output_bytes", len(xml_string))
+        return xml_string
+
+
+class PubMedXMLWriter:
+    """
+    Generate PubMed XML for the articles and write it to a file-like object,
+    each Article tag is written and then discarded as soon as it is built
+    so the whole ArticleSet is never held in memory, it has the same pubmed_config,
+    generator, pub_date, batch_id and root attributes as PubMedXML
+    """
+
+    def __init__(
+        self,
+        poa_articles,
+        pubmed_config,
+        open_file,
+        pub_date=None,
+        add_comment=True,
+        pretty=False,
+        indent="",
+        jobs=None,
+        executor=None,
+        chunksize=1,
+        version=None,
+        generator=None,
+        fragment_cache=None,
+        hash_fragments=False,
+    ):
+        """
+        open_file is a file-like object opened for writing bytes,
+        if jobs is more than 1 or an executor is supplied the Article tags are
+        built and serialised in worker processes, see map_in_parallel(),
+        Article tags in the optional cache.FragmentCache are not built again,
+        the comment is not part of them so they can be reused by later batches,
+        if hash_fragments is True the sha256 hex digest of each Article tag written
+        is added to fragment_hashes
+        """
+        self.open_file = open_file
+        self.fragment_cache = fragment_cache
+        self.fragment_hashes = [] if hash_fragments else None
+        self.pretty = pretty
+        self.indent = indent
+        self.jobs = jobs
+        self.executor = executor
+        self.chunksize = chunksize
+        self.article_count = 0
+        self.byte_count = 0
+        self.pubmed_config = pubmed_config
+        if generator is None:
+            generator = PubMedGenerator(pubmed_config=pubmed_config)
+        self.generator = generator
+        self.instrumentation = generator.instrumentation
+        self.pub_date = time.gmtime() if pub_date is None else pub_date
+        self.batch_id = get_batch_id(poa_articles, self.pubmed_config, self.pub_date)
+        # the ArticleSet tag only ever has the comment, the Article tags are written
+        self.root = Element("ArticleSet")
+        if add_comment:
+            self.generated = time.strftime("%Y-%m-%d %H:%M:%S")
+            self.last_commit = get_version(self.pubmed_config, version)
+            self.comment = generated_comment(
+                self.pubmed_config, self.generated, self.last_commit
             )
-            set_plain_language_summary(article_tag, poa_article)
-            set_copyright_information(article_tag, poa_article)
-            set_coi_statement(
-                article_tag, poa_article, self.pubmed_config.get("author_contrib_types")
+            self.root.append(self.comment)
+        with instrument.phase(self.instrumentation, "build"):
+            self.build(self.root, poa_articles)
+
+    def build(self, root, poa_articles):
+        newl = "\n" if self.pretty else ""
+        indent = self.indent if self.pretty else ""
+        # the ArticleSet open tag is completed once its first child is written
+        has_children = False
+        self.write(
+            serialize.xml_header(
+                self.pubmed_config.get("pubmed_xml_public_id"),
+                self.pubmed_config.get("pubmed_xml_system_id"),
+                pretty=self.pretty,
             )
-            set_object_list(
-                article_tag,
-                poa_article,
-                self.pubmed_config.get("split_article_categories"),
+            + "<"
+            + root.tag
+        )
+        if len(root):
+            self.write(">" + newl)
+            has_children = True
+            for tag in root:
+                # only the comment tag has been added so far
+                self.write("%s<!--%s-->%s" % (indent, tag.text, newl))
+        for fragment in self.article_fragments(root, poa_articles):
+            if not has_children:
+                self.write(">" + newl)
+                has_children = True
+            self.write_fragment(fragment)
+        if has_children:
+            self.write("</%s>%s" % (root.tag, newl))
+        else:
+            self.write("/>" + newl)
+        instrument.count(self.instrumentation, "output_bytes", self.byte_count)
+
+    def article_fragments(self, root, poa_articles):
+        "serialised Article tags as bytes in the same order as poa_articles"
+        if self.fragment_cache is not None:
+            yield from self.cached_fragments(root, poa_articles)
+            return
+        yield from self.built_fragments(root, poa_articles)
+
+    def fragment_key(self, poa_article):
+        return fragment_key(
+            poa_article,
+            self.generator.config_section,
+            self.pubmed_config,
+            self.pub_date,
+            {"pretty": self.pretty, "indent": self.indent},
+        )
+
+    def cached_fragments(self, root, poa_articles):
+        """
+        serialised Article tags from the fragment cache, the articles not in it are
+        built together, in worker processes if it is parallel, and added to it
+        """
+        poa_articles = list(poa_articles)
+        keys = [self.fragment_key(poa_article) for poa_article in poa_articles]
+        is_missing = [not self.fragment_cache.contains(key) for key in keys]
+        built_fragments = self.built_fragments(
+            root,
+            [
+                poa_article
+                for poa_article, missing in zip(poa_articles, is_missing)
+                if missing
+            ],
+        )
+        for poa_article, key, missing in zip(poa_articles, keys, is_missing):
+            fragment = None if missing else self.fragment_cache.get(key)
+            if fragment is not None:
+                instrument.count(self.instrumentation, "fragment_cache_hits")
+            else:
+                if missing:
+                    fragment = next(built_fragments)
+                else:
+                    # removed from the cache since it was checked
+                    fragment = serialize.element_xml(
+                        self.generator.article_tag(poa_article, self.pub_date),
+                        pretty=self.pretty,
+                        indent=self.indent,
+                        level=1,
+                    )
+                self.fragment_cache.put(key, fragment)
+            yield fragment
+
+    def built_fragments(self, root, poa_articles):
+        "serialised Article tags built for the articles"
+        if not is_parallel(self.jobs, self.executor):
+            for poa_article in poa_articles:
+                article_tag = self.build_article(root, poa_article)
+                yield serialize.element_xml(
+                    article_tag, pretty=self.pretty, indent=self.indent, level=1
+                )
+                # discard the tag now it is serialised
+                root.remove(article_tag)
+            return
+        worker_args = (
+            (
+                self.generator.config_section,
+                self.pubmed_config,
+                self.generator.version,
+                self.instrumentation is not None,
+            ),
+            (self.pub_date, self.pretty, self.indent),
+        )
+        fragment_function = worker_article_xml
+        if self.executor is not None:
+            # the executor workers are not initialised, the arguments go with each task
+            fragment_function = functools.partial(
+                worker_article_xml, worker_args=worker_args
             )
+        for fragment, measurements in map_in_parallel(
+            fragment_function,
+            poa_articles,
+            self.jobs,
+            self.executor,
+            self.chunksize,
+            initializer=init_worker,
+            initargs=worker_args,
+        ):
+            if self.instrumentation is not None:
+                self.instrumentation.merge(measurements)
+            else:
+                self.generator.stage_timings.merge(measurements.get("stages"))
+            yield fragment
+
+    def build_article(self, parent, poa_article):
+        "add the Article tag for one article to the parent tag and return it"
+        with profiling.article(self.generator.profiler, poa_article.doi):
+            return build_article_tag(poa_article, self.generator, self.pub_date, parent)
 
-    def set_journal(self, parent, poa_article):
-        journal_tag = SubElement(parent, "Journal")
+    def write_fragment(self, fragment):
+        "write one serialised Article tag"
+        self.open_file.write(fragment)
+        self.article_count += 1
+        self.byte_count += len(fragment)
+        if self.fragment_hashes is not None:
+            self.fragment_hashes.append(hashlib.sha256(fragment).hexdigest())
 
-        publisher_name = SubElement(journal_tag, "PublisherName")
-        publisher_name.text = poa_article.publisher_name
+    def write(self, string):
+        data = string.encode("utf-8")
+        self.open_file.write(data)
+        self.byte_count += len(data)
 
-        journal_title = SubElement(journal_tag, "JournalTitle")
-        journal_title.text = poa_article.journal_title
 
-        issn = SubElement(journal_tag, "Issn")
-        issn.text = poa_article.journal_issn
+class PubMedBatchWriter(PubMedXMLWriter):
+    """
+    Generate PubMed XML for the articles and write it to ArticleSet files in
+    output_dir, a new file is started once a file has max_articles articles or the
+    next article would make it more than max_bytes, an article larger than
+    max_bytes is written to a file of its own. The files have sequential batch ids,
+    see SPLIT_BATCH_ID_FORMAT, and each is written to a temporary file which is
+    published once it is complete, see publish_file()
+    """
 
-        pub_date = get_pub_date(
-            poa_article, self.pubmed_config.get("pub_date_types"), self.pub_date
+    def __init__(
+        self,
+        poa_articles,
+        pubmed_config,
+        output_dir=TMP_DIR,
+        pub_date=None,
+        add_comment=True,
+        pretty=False,
+        indent="",
+        max_articles=None,
+        max_bytes=None,
+        jobs=None,
+        executor=None,
+        chunksize=1,
+        version=None,
+        generator=None,
+        fragment_cache=None,
+        hash_fragments=False,
+        no_clobber=False,
+    ):
+        """
+        output_dir is the folder the files are written to,
+        max_articles and max_bytes limit the size of each file, no limit if None,
+        if no_clobber is True an existing file is not replaced, see publish_file()
+        """
+        self.output_dir = output_dir
+        self.no_clobber = no_clobber
+        self.max_articles = max_articles
+        self.max_bytes = max_bytes
+        # tuples of the batch_id and number of articles of each file written
+        self.batches = []
+        self.file_batch_id = None
+        self.tmp_path = None
+        self.file_article_count = 0
+        self.file_start = 0
+        super().__init__(
+            poa_articles,
+            pubmed_config,
+            None,
+            pub_date,
+            add_comment,
+            pretty,
+            indent,
+            jobs=jobs,
+            executor=executor,
+            chunksize=chunksize,
+            version=version,
+            generator=generator,
+            fragment_cache=fragment_cache,
+            hash_fragments=hash_fragments,
         )
 
-        volume = SubElement(journal_tag, "Volume")
-        # Use volume from the article unless not present then use the default
-        if poa_article.volume:
-            volume.text = poa_article.volume
-        else:
-            if pub_date and self.pubmed_config.get("year_of_first_volume"):
-                volume.text = eautils.calculate_journal_volume(
-                    pub_date, self.pubmed_config.get("year_of_first_volume")
-                )
+    def build(self, root, poa_articles):
+        newl = "\n" if self.pretty else ""
+        indent = self.indent if self.pretty else ""
+        header = (
+            serialize.xml_header(
+                self.pubmed_config.get("pubmed_xml_public_id"),
+                self.pubmed_config.get("pubmed_xml_system_id"),
+                pretty=self.pretty,
+            )
+            + "<"
+            + root.tag
+        )
+        # only the comment tag has been added so far, it is in each file
+        comments = "".join("%s<!--%s-->%s" % (indent, tag.text, newl) for tag in root)
+        head = header + ">" + newl + comments
+        tail = "</%s>%s" % (root.tag, newl)
+        tail_bytes = len(tail.encode("utf-8"))
+        try:
+            for fragment in self.article_fragments(root, poa_articles):
+                if self.open_file is not None and self.is_full(
+                    len(fragment) + tail_bytes
+                ):
+                    self.close_batch(tail)
+                if self.open_file is None:
+                    self.open_batch(head)
+                self.write_fragment(fragment)
+                self.file_article_count += 1
+            if self.open_file is not None:
+                self.close_batch(tail)
+            elif not self.batches:
+                # one file with an empty ArticleSet
+                self.open_batch(head + tail if len(root) else header + "/>" + newl)
+                self.close_batch("")
+        except BaseException:
+            self.discard_batch()
+            raise
+        instrument.count(self.instrumentation, "output_bytes", self.byte_count)
+
+    def is_full(self, next_bytes):
+        "whether the next article, of next_bytes to the end of the file, starts a new file"
+        if self.max_articles and self.file_article_count >= self.max_articles:
+            return True
+        file_bytes = self.byte_count - self.file_start
+        return bool(self.max_bytes and file_bytes + next_bytes > self.max_bytes)
+
+    def open_batch(self, head):
+        "start the next file in a temporary file and write its head"
+        self.file_batch_id = SPLIT_BATCH_ID_FORMAT % (
+            self.batch_id,
+            len(self.batches) + 1,
+        )
+        file_descriptor, self.tmp_path = tempfile.mkstemp(
+            dir=self.output_dir, prefix=self.file_batch_id + "-", suffix=".tmp"
+        )
+        self.open_file = os.fdopen(file_descriptor, "wb")
+        self.file_article_count = 0
+        self.file_start = self.byte_count
+        self.write(head)
+
+    def close_batch(self, tail):
+        "write the tail of the file and publish it from its temporary file"
+        self.write(tail)
+        self.open_file.close()
+        self.open_file = None
+        file_path = publish_file(
+            self.tmp_path,
+            batch_file_path(self.output_dir, self.file_batch_id),
+            self.no_clobber,
+        )
+        self.batches.append((file_batch_id(file_path), self.file_article_count))
 
-        if poa_article.issue:
-            issue = SubElement(journal_tag, "Issue")
-            issue.text = poa_article.issue
+    def discard_batch(self):
+        "remove the temporary file of a file which is not complete"
+        if self.open_file is not None:
+            self.open_file.close()
+            self.open_file = None
+            cache.remove_file(self.tmp_path)
 
-        # Add the pub date now
-        pub_type = get_pub_type(poa_article)
-        if pub_type:
-            set_pub_date(journal_tag, pub_date, pub_type)
 
-    def set_author_list(self, parent, poa_article, contrib_type=None):
-        # If contrib_type is None, all contributors will be added regardless of their type
+class PubMedGenerator:
+    """
+    PubMed XML generator for one config section, the config, publication type rules,
+    markup policy and dataset lookups are prepared once when it is created and
+    reused for every batch of articles it generates
+    """
 
-        if self.contributors is None:
-            # Create the XML element on first use
-            self.contributors = SubElement(parent, "AuthorList")
+    def __init__(
+        self,
+        config_section="elife",
+        pubmed_config=None,
+        version=None,
+        instrumentation=None,
+        profiler=None,
+    ):
+        """
+        :param config_section: name of the section in the config file
+        :param pubmed_config: dict of parsed config values to use instead of
+            loading the config_section
+        :param version: version in the comment, see get_version() for the default
+        :param instrumentation: optional instrument.Instrumentation to record
+            the stages and articles built in this process
+        :param profiler: optional profiling.Profiler to record the peak memory
+            of each article built in this process
+        """
+        self.config_section = config_section
+        if pubmed_config is None:
+            pubmed_config = load_config(config_section)
+        self.pubmed_config = pubmed_config
+        self.version = version
+        self.markup_policy = markup.markup_policy(pubmed_config)
+        types_map = pubmed_config.get("publication_types")
+        self.publication_type_matcher = (
+            utils.publication_type_matcher(types_map) if types_map else None
+        )
+        self.dataset_resolver = dataset_resolver()
+        self.pipeline = pipeline.StagePipeline(
+            ARTICLE_STAGES,
+            pubmed_config.get("article_stages"),
+            skipped_stage_names(ARTICLE_STAGES, pubmed_config.get("skip_stages")),
+        )
+        self.object_list_pipeline = pipeline.StagePipeline(
+            OBJECT_LIST_STAGES,
+            pubmed_config.get("object_list_stages"),
+            skipped_stage_names(OBJECT_LIST_STAGES, pubmed_config.get("skip_stages")),
+        )
+        self.instrumentation = instrumentation
+        self.profiler = profiler
+        # time spent in each stage of the Article tags this generator built
+        if instrumentation is not None:
+            self.stage_timings = instrumentation.stages
+        else:
+            self.stage_timings = pipeline.StageTimings()
+
+    def build(self, poa_articles, pub_date=None, add_comment=True):
+        "PubMedXML object with the ArticleSet built for the articles"
+        return PubMedXML(
+            poa_articles,
+            self.pubmed_config,
+            pub_date,
+            add_comment,
+            version=self.version,
+            generator=self,
+        )
 
-        for contributor in [
-            contrib
-            for contrib in poa_article.contributors
-            if contrib.group_author_key is None or contrib.collab is not None
-        ]:
-            set_contributor(self.contributors, contributor, contrib_type)
+    def generate(
+        self,
+        poa_articles,
+        pub_date=None,
+        add_comment=True,
+        pretty=False,
+        indent="",
+        jobs=None,
+        executor=None,
+        chunksize=1,
+        fragment_cache=None,
+    ):
+        """
+        PubMed XML of the articles as bytes,
+        the articles are built in worker processes if jobs is more than 1 or an executor
+        is supplied, with the same output, Article tags in the optional
+        cache.FragmentCache are not built again
+        """
+        if is_parallel(jobs, executor) or fragment_cache is not None:
+            open_file = io.BytesIO()
+            self.write(
+                poa_articles,
+                open_file,
+                pub_date,
+                add_comment,
+                pretty,
+                indent,
+                jobs=jobs,
+                executor=executor,
+                chunksize=chunksize,
+                fragment_cache=fragment_cache,
+            )
+            return open_file.getvalue()
+        p_xml = self.build(poa_articles, pub_date, add_comment)
+        return p_xml.output_xml(pretty=pretty, indent=indent)
+
+    def write(
+        self,
+        poa_articles,
+        open_file,
+        pub_date=None,
+        add_comment=True,
+        pretty=False,
+        indent="",
+        jobs=None,
+        executor=None,
+        chunksize=1,
+        fragment_cache=None,
+        hash_fragments=False,
+    ):
+        """
+        write PubMed XML of the articles to the file-like open_file one article
+        at a time, returns the PubMedXMLWriter
+        """
+        return PubMedXMLWriter(
+            poa_articles,
+            self.pubmed_config,
+            open_file,
+            pub_date,
+            add_comment,
+            pretty,
+            indent,
+            jobs=jobs,
+            executor=executor,
+            chunksize=chunksize,
+            version=self.version,
+            generator=self,
+            fragment_cache=fragment_cache,
+            hash_fragments=hash_fragments,
+        )
 
-    def set_group_list(self, parent, poa_article):
-        on_behalf_of_contrib_type = "on-behalf-of"
+    def write_batches(
+        self,
+        poa_articles,
+        output_dir=TMP_DIR,
+        pub_date=None,
+        add_comment=True,
+        pretty=False,
+        indent="",
+        max_articles=None,
+        max_bytes=None,
+        jobs=None,
+        executor=None,
+        chunksize=1,
+        fragment_cache=None,
+        hash_fragments=False,
+        no_clobber=False,
+    ):
+        """
+        write PubMed XML of the articles to files in output_dir of at most
+        max_articles articles and max_bytes, returns the PubMedBatchWriter
+        """
+        return PubMedBatchWriter(
+            poa_articles,
+            self.pubmed_config,
+            output_dir,
+            pub_date,
+            add_comment,
+            pretty,
+            indent,
+            max_articles=max_articles,
+            max_bytes=max_bytes,
+            jobs=jobs,
+            executor=executor,
+            chunksize=chunksize,
+            version=self.version,
+            generator=self,
+            fragment_cache=fragment_cache,
+            hash_fragments=hash_fragments,
+            no_clobber=no_clobber,
+        )
 
-        if self.groups is None:
-            # Create the XML element on first use
-            self.groups = SubElement(parent, "GroupList")
+    def article_tag(self, poa_article, pub_date=None):
+        """
+        Article tag for one article, it is safe to call from more than one thread,
+        see build_article_tag()
+        """
+        if pub_date is None:
+            pub_date = time.gmtime()
+        return build_article_tag(poa_article, self, pub_date)
 
-        for contributor in [
-            contrib
-            for contrib in poa_article.contributors
-            if (
-                contrib.group_author_key is not None
-                or contrib.contrib_type == on_behalf_of_contrib_type
-            )
-            and (contrib.surname or contrib.collab)
-        ]:
-            group_name_text = get_group_name_text(poa_article, contributor)
-
-            # Find existing group with the same name or create it if not exists
-            matched_group = group_exists(self.groups, group_name_text)
-            if matched_group is None:
-                # Create a new group
-                group_tag = SubElement(self.groups, "Group")
-                # Set the GroupName of the group
-                group_name = SubElement(group_tag, "GroupName")
-                group_name.text = group_name_text
-
-                # skip to the next contributor in list unless it is on-behalf-of
-                if contributor.contrib_type == on_behalf_of_contrib_type:
-                    matched_group = group_tag
-                else:
-                    continue
-
-            # Add the individual to the group
-            set_group_individual(matched_group, contributor)
-
-        # Remove any GroupName with no IndividualName
-        group_delete_indexes = []
-        if self.groups and len(self.groups) > 0:
-            for i, tag in enumerate(self.groups):
-                if len(tag.findall(".//IndividualName")) <= 0:
-                    # mark the group for deletion
-                    group_delete_indexes.append(i)
-        # delete groups by index in reverse order to avoid index reordering side effect
-        for i in sorted(group_delete_indexes)[::-1]:
-            del self.groups[i]
-
-        # Remove a completely empty GroupList element, if empty
-        if len(self.groups) <= 0:
-            parent.remove(self.groups)
-            self.groups = None
-
-    def set_history(self, parent, poa_article):
-        history = SubElement(parent, "History")
-
-        for date_type in self.pubmed_config.get("history_date_types"):
-            date = poa_article.get_date(date_type)
-            if date:
-                set_date(history, date.date, date_type)
-
-        # If the article is VoR and is was ever PoA, then set the aheadofprint history date
-        if poa_article.is_poa is False and poa_article.was_ever_poa is True:
-            date_type = "aheadofprint"
-            date = get_pub_date(
-                poa_article, self.pubmed_config.get("pub_date_types"), self.pub_date
+    def iter_fragments(self, poa_articles, pub_date=None, pretty=False, indent=""):
+        """
+        serialised Article tags as bytes, one for each article in order, each is
+        indented as a child of the ArticleSet tag when pretty
+        """
+        if pub_date is None:
+            pub_date = time.gmtime()
+        for poa_article in poa_articles:
+            yield serialize.element_xml(
+                self.article_tag(poa_article, pub_date),
+                pretty=pretty,
+                indent=indent,
+                level=1,
             )
-            if date:
-                set_date(history, date, date_type)
 
-    def output_xml(self, pretty=False, indent=""):
-        encoding = "utf-8"
-        qualified_name = "ArticleSet"
 
-        doctype = xmlio.ElifeDocumentType(qualified_name)
-        doctype._identified_mixin_init(
-            publicId=self.pubmed_config.get("pubmed_xml_public_id"),
-            systemId=self.pubmed_config.get("pubmed_xml_system_id"),
+def fragment_key(
+    poa_article, config_section, pubmed_config, default_pub_date, options=None
+):
+    """
+    cache.fragment_key() of the data the Article tag of the article is built from,
+    the default_pub_date of the run is only part of it if the article has no pub date
+    """
+    pub_date = get_pub_date(
+        poa_article, pubmed_config.get("pub_date_types"), default_pub_date
+    )
+    return cache.fragment_key(
+        poa_article, config_section, pubmed_config, pub_date, options
+    )
+
+
+def changed_articles(poa_articles, article_keys, ledger):
+    """
+    the articles and their keys which are not in the ledger.DepositLedger with the
+    same key, the articles not deposited before or changed since they were
+
+    :returns: tuple of the list of articles and the list of their keys
+    """
+    changed = [
+        (poa_article, article_key)
+        for poa_article, article_key in zip(poa_articles, article_keys)
+        if ledger.is_changed(poa_article.doi, poa_article.version, article_key)
+    ]
+    return [item[0] for item in changed], [item[1] for item in changed]
+
+
+def get_version(pubmed_config=None, version=None):
+    """
+    version of the generator for the comment, in order of precedence from
+    the version argument, the generator_version config value, the environment
+    variable named in VERSION_ENVIRONMENT_VARIABLE or the last git commit
+    """
+    if version:
+        return version
+    if pubmed_config and pubmed_config.get("generator_version"):
+        return pubmed_config.get("generator_version")
+    if os.environ.get(VERSION_ENVIRONMENT_VARIABLE):
+        return os.environ.get(VERSION_ENVIRONMENT_VARIABLE)
+    return get_last_commit()
+
+
+@functools.lru_cache(maxsize=None)
+def get_last_commit():
+    "last commit to the git repository, only looked up once per process"
+    return eautils.get_last_commit_to_master()
+
+
+# the PubMedGenerator and fragment options of a worker, see init_worker(), one for
+# each thread so worker threads of an executor do not share them
+WORKER_STATE = threading.local()
+
+
+def init_worker(generator_args, fragment_args):
+    """
+    prepare a worker process or thread to build Article tags, the PubMedGenerator
+    is only created again if its arguments change
+
+    :param generator_args: tuple of config_section, pubmed_config, version and
+        whether the generator is instrumented
+    :param fragment_args: tuple of the pub_date, pretty and indent of the fragments
+    """
+    if getattr(WORKER_STATE, "generator_args", None) != generator_args:
+        config_section, pubmed_config, version, instrumented = generator_args
+        WORKER_STATE.generator = PubMedGenerator(
+            config_section,
+            pubmed_config,
+            version,
+            instrumentation=instrument.Instrumentation() if instrumented else None,
+        )
+        WORKER_STATE.generator_args = generator_args
+    WORKER_STATE.fragment_args = fragment_args
+
+
+def worker_article_xml(poa_article, worker_args=None):
+    """
+    build the Article tag for one article with the worker generator and serialise
+    it as bytes, indented as a child of the ArticleSet tag when pretty
+
+    :param worker_args: init_worker() arguments, for a worker not initialised
+        when it was started
+    :returns: tuple of the bytes and a dict of the stage timings, and the
+        instrumentation measurements if it is instrumented, of the article
+    """
+    if worker_args is not None:
+        init_worker(*worker_args)
+    generator = WORKER_STATE.generator
+    pub_date, pretty, indent = WORKER_STATE.fragment_args
+    article_tag = generator.article_tag(poa_article, pub_date)
+    fragment = serialize.element_xml(article_tag, pretty=pretty, indent=indent, level=1)
+    if generator.instrumentation is not None:
+        measurements = generator.instrumentation.as_dict()
+        generator.instrumentation.clear()
+    else:
+        measurements = {"stages": generator.stage_timings.report()}
+        generator.stage_timings.clear()
+    return fragment, measurements
+
+
+def is_parallel(jobs=None, executor=None):
+    "whether to map work to worker processes given the jobs and executor arguments"
+    return executor is not None or (jobs is not None and jobs > 1)
+
+
+def map_in_parallel(
+    function,
+    items,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    max_tasks_per_child=MAX_TASKS_PER_CHILD,
+    initializer=None,
+    initargs=(),
+):
+    """
+    apply the function to each item in worker processes, yields the results in
+    the same order as items
+
+    :param jobs: number of worker processes in a multiprocessing Pool
+    :param executor: a concurrent.futures Executor to use instead of a Pool
+    :param chunksize: number of items sent to a worker process at a time
+    :param max_tasks_per_child: a Pool worker process is replaced after this many
+        chunks, to release memory during long runs
+    :param initializer: function called with initargs once when each Pool worker
+        process starts, it is not called for the workers of an executor
+    """
+    if executor is not None:
+        yield from executor.map(function, items, chunksize=chunksize)
+        return
+    with multiprocessing.Pool(
+        jobs,
+        initializer=initializer,
+        initargs=initargs,
+        maxtasksperchild=max_tasks_per_child,
+    ) as pool:
+        yield from pool.imap(function, items, chunksize)
+
+
+def generated_comment(pubmed_config, generated, version):
+    "Comment tag of the generator, the time it was generated and the version"
+    return Comment(
+        "generated by "
+        + str(pubmed_config.get("generator"))
+        + " at "
+        + generated
+        + " from version "
+        + version
+    )
+
+
+def get_batch_id(poa_articles, pubmed_config, pub_date):
+    "batch_id is used as the output file name"
+    batch_doi = ""
+    if hasattr(poa_articles, "__len__") and len(poa_articles) == 1:
+        # If only one article is supplied, then add the doi to the batch file name
+        batch_doi = str(poa_articles[0].manuscript) + "-"
+    return (
+        str(pubmed_config.get("batch_file_prefix"))
+        + batch_doi
+        + time.strftime("%Y%m%d%H%M%S", pub_date)
+    )
+
+
+def batch_file_path(output_dir, batch_id):
+    "path of the output file of the batch_id"
+    return os.path.join(output_dir, batch_id + ".xml")
+
+
+def file_batch_id(file_path):
+    "batch_id of the output file at file_path, see batch_file_path()"
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def publish_file(tmp_path, file_path, no_clobber=False):
+    """
+    rename the complete temporary file to file_path, replacing an existing file,
+    returns the path the file is published to
+
+    :param no_clobber: if True an existing file is never replaced, a sequence number
+        is added to the path of the file instead, see UNIQUE_FILE_PATH_FORMAT
+    """
+    if not no_clobber:
+        os.replace(tmp_path, file_path)
+        return file_path
+    root, extension = os.path.splitext(file_path)
+    published_path = file_path
+    sequence = 0
+    while True:
+        try:
+            link_new_file(tmp_path, published_path)
+            return published_path
+        except FileExistsError:
+            sequence += 1
+            published_path = UNIQUE_FILE_PATH_FORMAT % (root, sequence, extension)
+
+
+def link_new_file(tmp_path, file_path):
+    """
+    link the temporary file to file_path and remove it, raises FileExistsError if
+    there is a file at file_path, on a filesystem without hard links file_path is
+    created empty to reserve it and the temporary file is renamed over it
+    """
+    try:
+        os.link(tmp_path, file_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        os.close(os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        os.replace(tmp_path, file_path)
+        return
+    os.remove(tmp_path)
+
+
+class AtomicFile:
+    """
+    a temporary file next to file_path opened for writing bytes in a with block,
+    it is renamed to file_path once the with block ends, see publish_file(), so
+    the file is never seen partly written, and removed if there is an error,
+    file_path is then the path it was published to
+    """
+
+    def __init__(self, file_path, no_clobber=False):
+        self.file_path = file_path
+        self.no_clobber = no_clobber
+        self.tmp_path = None
+        self.open_file = None
+
+    def __enter__(self):
+        file_descriptor, self.tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.file_path) or os.curdir,
+            prefix=os.path.basename(self.file_path) + "-",
+            suffix=".tmp",
+        )
+        self.open_file = os.fdopen(file_descriptor, "wb")
+        return self.open_file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.open_file.close()
+        if exc_type is not None:
+            cache.remove_file(self.tmp_path)
+            return False
+        self.file_path = publish_file(self.tmp_path, self.file_path, self.no_clobber)
+        return False
+
+
+def open_atomic(file_path, no_clobber=False):
+    "AtomicFile to write the file at file_path in a with block"
+    return AtomicFile(file_path, no_clobber)
+
+
+def build_article_tag(poa_article, generator, pub_date, parent=None):
+    """
+    build the Article tag for one article by running the generator pipeline stages,
+    no state is kept between calls other than the stage timings, which are added up
+    under a lock, so it can be called for different articles in more than one thread
+
+    :param poa_article: Article object
+    :param generator: PubMedGenerator with the config and lookups to use
+    :param pub_date: time.struct_time date used when the article has no pub date
+    :param parent: optional tag to add the Article tag to
+    :returns: the Article tag
+    """
+    instrumentation = generator.instrumentation
+    if instrumentation is not None:
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+    context = ArticleContext(poa_article, generator.pubmed_config, pub_date, generator)
+    if parent is None:
+        article_tag = Element("Article")
+    else:
+        article_tag = SubElement(parent, "Article")
+    generator.pipeline.run(
+        article_tag, poa_article, generator, context, timings=generator.stage_timings
+    )
+    if instrumentation is not None:
+        instrumentation.add_article(
+            poa_article.doi,
+            time.perf_counter() - start,
+            time.thread_time() - cpu_start,
+            sum(1 for _ in article_tag.iter()),
+        )
+    return article_tag
+
+
+def journal_stage(parent, poa_article, generator, context):
+    set_journal(
+        parent, poa_article, generator.pubmed_config, context.default_pub_date, context
+    )
+
+
+def replaces_stage(parent, poa_article, generator, context):
+    set_replaces(parent, poa_article, context)
+
+
+def article_title_stage(parent, poa_article, generator, context):
+    set_article_title(parent, poa_article, generator.markup_policy)
+
+
+def e_location_id_stage(parent, poa_article, generator, context):
+    set_e_location_id(parent, poa_article)
+
+
+def language_stage(parent, poa_article, generator, context):
+    set_language(parent, generator.pubmed_config.get("language"))
+
+
+def author_list_stage(parent, poa_article, generator, context):
+    set_author_list(
+        parent,
+        poa_article,
+        generator.pubmed_config.get("author_contrib_types"),
+        context.contributor_index,
+    )
+
+
+def group_list_stage(parent, poa_article, generator, context):
+    set_group_list(parent, poa_article, context.contributor_index)
+
+
+def publication_type_stage(parent, poa_article, generator, context):
+    set_publication_type(
+        parent,
+        poa_article,
+        generator.pubmed_config.get("publication_types"),
+        generator.publication_type_matcher,
+        context,
+    )
+
+
+def article_id_list_stage(parent, poa_article, generator, context):
+    set_article_id_list(parent, poa_article)
+
+
+def history_stage(parent, poa_article, generator, context):
+    set_history(
+        parent, poa_article, generator.pubmed_config, context.default_pub_date, context
+    )
+
+
+def abstract_stage(parent, poa_article, generator, context):
+    set_abstract(
+        parent,
+        poa_article,
+        generator.pubmed_config.get("abstract_label_types"),
+        generator.markup_policy,
+    )
+
+
+def plain_language_summary_stage(parent, poa_article, generator, context):
+    set_plain_language_summary(parent, poa_article, generator.markup_policy)
+
+
+def copyright_information_stage(parent, poa_article, generator, context):
+    set_copyright_information(parent, poa_article)
+
+
+def coi_statement_stage(parent, poa_article, generator, context):
+    set_coi_statement(
+        parent,
+        poa_article,
+        generator.pubmed_config.get("author_contrib_types"),
+        context.contributor_index,
+        generator.markup_policy,
+    )
+
+
+def object_list_stage(parent, poa_article, generator, context):
+    "ObjectList tag with the objects added by the object list stages, if any"
+    object_list = SubElement(parent, "ObjectList")
+    generator.object_list_pipeline.run(
+        object_list, poa_article, generator, context, timings=generator.stage_timings
+    )
+    # do not leave an empty ObjectList tag
+    if len(object_list) <= 0:
+        parent.remove(object_list)
+
+
+def article_type_stage(object_list, poa_article, generator, context):
+    set_article_type(object_list, poa_article)
+
+
+def research_organism_stage(object_list, poa_article, generator, context):
+    set_research_organism(object_list, poa_article)
+
+
+def categories_stage(object_list, poa_article, generator, context):
+    set_categories(
+        object_list,
+        poa_article,
+        generator.pubmed_config.get("split_article_categories"),
+    )
+
+
+def keywords_stage(object_list, poa_article, generator, context):
+    set_keywords(object_list, poa_article)
+
+
+def grants_stage(object_list, poa_article, generator, context):
+    set_grants(object_list, poa_article)
+
+
+def datasets_stage(object_list, poa_article, generator, context):
+    set_datasets(object_list, poa_article, generator.dataset_resolver)
+
+
+def clinical_trials_stage(object_list, poa_article, generator, context):
+    set_clinical_trials(object_list, poa_article)
+
+
+# stages adding the parts of an Article tag in their default order, the article_stages
+# and skip_stages config values can reorder them or leave some out for a journal
+ARTICLE_STAGES = OrderedDict(
+    [
+        ("journal", journal_stage),
+        ("replaces", replaces_stage),
+        ("article_title", article_title_stage),
+        ("e_location_id", e_location_id_stage),
+        ("language", language_stage),
+        ("author_list", author_list_stage),
+        ("group_list", group_list_stage),
+        ("publication_type", publication_type_stage),
+        ("article_id_list", article_id_list_stage),
+        ("history", history_stage),
+        ("abstract", abstract_stage),
+        ("plain_language_summary", plain_language_summary_stage),
+        ("copyright_information", copyright_information_stage),
+        ("coi_statement", coi_statement_stage),
+        ("object_list", object_list_stage),
+    ]
+)
+
+# stages adding the Object tags of the ObjectList tag, see object_list_stages config
+OBJECT_LIST_STAGES = OrderedDict(
+    [
+        ("article_type", article_type_stage),
+        ("research_organism", research_organism_stage),
+        ("categories", categories_stage),
+        ("keywords", keywords_stage),
+        ("grants", grants_stage),
+        ("datasets", datasets_stage),
+        ("clinical_trials", clinical_trials_stage),
+    ]
+)
+
+
+def skipped_stage_names(registry, skip_stages):
+    """
+    names in the skip_stages config value of the stages in the registry,
+    skip_stages is one list for both the Article and ObjectList stages
+
+    :raises ValueError: if a name is not a stage of either registry
+    """
+    unknown = [
+        name
+        for name in skip_stages or []
+        if name not in ARTICLE_STAGES and name not in OBJECT_LIST_STAGES
+    ]
+    if unknown:
+        raise ValueError("unknown stage names %s" % ", ".join(unknown))
+    return [name for name in skip_stages or [] if name in registry]
+
+
+def set_journal(parent, poa_article, pubmed_config, default_pub_date, context=None):
+    if context is None:
+        context = ArticleContext(poa_article, pubmed_config, default_pub_date)
+
+    journal_tag = SubElement(parent, "Journal")
+
+    publisher_name = SubElement(journal_tag, "PublisherName")
+    publisher_name.text = poa_article.publisher_name
+
+    journal_title = SubElement(journal_tag, "JournalTitle")
+    journal_title.text = poa_article.journal_title
+
+    issn = SubElement(journal_tag, "Issn")
+    issn.text = poa_article.journal_issn
+
+    volume = SubElement(journal_tag, "Volume")
+    volume.text = context.volume
+
+    if poa_article.issue:
+        issue = SubElement(journal_tag, "Issue")
+        issue.text = poa_article.issue
+
+    # Add the pub date now
+    if context.pub_type:
+        set_pub_date(journal_tag, context.pub_date, context.pub_type)
+
+
+def set_author_list(parent, poa_article, contrib_types, contributor_index=None):
+    """
+    add an AuthorList of the authors of each of the contrib_types in turn,
+    if a contrib_type is None all the authors are added regardless of their type
+    """
+    if not contrib_types:
+        return None
+    if contributor_index is None:
+        contributor_index = ContributorIndex(poa_article.contributors)
+
+    author_list_tag = SubElement(parent, "AuthorList")
+    for contrib_type in contrib_types:
+        for contributor in contributor_index.author_list(contrib_type):
+            set_contributor(author_list_tag, contributor, None)
+    return author_list_tag
+
+
+def set_group_list(parent, poa_article, contributor_index=None):
+    "add a GroupList of the group members, if there are any, and return it"
+    group_list_tag = SubElement(parent, "GroupList")
+
+    if contributor_index is None:
+        contributor_index = ContributorIndex(poa_article.contributors)
+
+    # index the Group tags by name and count the individuals added to each Group
+    group_tags = OrderedDict()
+    individual_counts = {}
+
+    for contributor in contributor_index.group_members:
+        group_name_text = get_group_name_text(
+            poa_article, contributor, contributor_index.collab_names
         )
 
-        rough_string = ElementTree.tostring(self.root, encoding)
-        reparsed = minidom.parseString(rough_string)
-        if doctype:
-            reparsed.insertBefore(doctype, reparsed.documentElement)
+        # Find existing group with the same name or create it if not exists
+        matched_group = group_tags.get(group_name_text)
+        if matched_group is None:
+            # Create a new group
+            group_tag = SubElement(group_list_tag, "Group")
+            # Set the GroupName of the group
+            group_name = SubElement(group_tag, "GroupName")
+            group_name.text = group_name_text
+            group_tags[group_name_text] = group_tag
+            individual_counts[group_name_text] = 0
+
+            # skip to the next contributor in list unless it is on-behalf-of
+            if contributor.contrib_type == ON_BEHALF_OF_CONTRIB_TYPE:
+                matched_group = group_tag
+            else:
+                continue
+
+        # Add the individual to the group
+        set_group_individual(matched_group, contributor)
+        individual_counts[group_name_text] += 1
+
+    # Remove any Group with no IndividualName, keeping the order of the others
+    if 0 in individual_counts.values():
+        group_list_tag[:] = [
+            group_tag
+            for group_name_text, group_tag in group_tags.items()
+            if individual_counts.get(group_name_text) > 0
+        ]
+
+    # Remove a completely empty GroupList element, if empty
+    if len(group_list_tag) <= 0:
+        parent.remove(group_list_tag)
+        return None
+    return group_list_tag
+
+
+def set_history(parent, poa_article, pubmed_config, default_pub_date, context=None):
+    if context is None:
+        context = ArticleContext(poa_article, pubmed_config, default_pub_date)
+
+    history = SubElement(parent, "History")
 
-        if pretty is True:
-            return reparsed.toprettyxml(indent, encoding=encoding)
-        return reparsed.toxml(encoding=encoding)
+    for date_type in pubmed_config.get("history_date_types"):
+        date = poa_article.get_date(date_type)
+        if date:
+            set_date(history, date.date, date_type)
+
+    # If the article is VoR and is was ever PoA, then set the aheadofprint history date
+    if context.vor_was_ever_poa:
+        date_type = "aheadofprint"
+        if context.pub_date:
+            set_date(history, context.pub_date, date_type)
 
 
 def set_group_individual(parent, contributor):
@@ -299,34 +1307,112 @@ def set_affiliation(parent, contributor):
                 affiliation.text = aff.text
 
 
-def group_exists(group_tags, group_name_text):
-    "look in the Group tags if the group exists already"
-    matched_group = None
-    for group in group_tags.findall("./Group"):
-        for group_name in group.findall("./GroupName"):
-            if group_name.text == group_name_text:
-                # Matched an existing group tag, use it
-                matched_group = group
-                break
-    return matched_group
+class ArticleContext:
+    """
+    values derived from an article which more than one part of its Article tag uses,
+    computed once before the Article tag is built
+    """
+
+    def __init__(self, poa_article, pubmed_config, default_pub_date, generator=None):
+        """
+        :param poa_article: Article object
+        :param pubmed_config: dict of parsed config values
+        :param default_pub_date: time.struct_time date used if the article has no pub date
+        :param generator: optional PubMedGenerator with a compiled publication type matcher
+        """
+        self.poa_article = poa_article
+        self.default_pub_date = default_pub_date
+        self.pub_date = get_pub_date(
+            poa_article, pubmed_config.get("pub_date_types"), default_pub_date
+        )
+        # PubStatus of the pub date
+        self.pub_type = get_pub_type(poa_article)
+        self.vor_was_ever_poa = is_vor_was_ever_poa(poa_article)
+        self.volume = get_volume(
+            poa_article, self.pub_date, pubmed_config.get("year_of_first_volume")
+        )
+        self.contributor_index = ContributorIndex(poa_article.contributors)
+        self.publication_type = get_publication_type(
+            poa_article,
+            pubmed_config.get("publication_types"),
+            generator.publication_type_matcher if generator else None,
+        )
 
 
-def get_group_name_text(poa_article, contributor):
-    "for setting groups find the group name text in the contributors"
+class ContributorIndex:
+    """
+    article contributors partitioned for the author list, group list and conflict
+    of interest statement, each list is in the contributor order
+    """
+
+    def __init__(self, contributors):
+        # authors, excluding individual group members, having a surname or collab
+        self.authors = []
+        self.authors_by_type = {}
+        # group members and on-behalf-of contributors having a surname or collab
+        self.group_members = []
+        # collab name of the first collab having each group_author_key
+        self.collab_names = group_author_key_collab_map(contributors)
+        # contributors having conflict statements
+        self.conflict_contributors = []
+        for contributor in contributors:
+            if contributor.conflict:
+                self.conflict_contributors.append(contributor)
+            # Skip contributors with no surname and no collab
+            if not contributor.surname and not contributor.collab:
+                continue
+            if contributor.group_author_key is None or contributor.collab is not None:
+                self.authors.append(contributor)
+                self.authors_by_type.setdefault(contributor.contrib_type, []).append(
+                    contributor
+                )
+            if (
+                contributor.group_author_key is not None
+                or contributor.contrib_type == ON_BEHALF_OF_CONTRIB_TYPE
+            ):
+                self.group_members.append(contributor)
+
+    def author_list(self, contrib_type=None):
+        "authors of the contrib_type, or all the authors if contrib_type is None"
+        if contrib_type is None:
+            return self.authors
+        return self.authors_by_type.get(contrib_type, [])
+
+    def conflicts(self, contrib_types):
+        "contributors having conflict statements whose contrib_type is in the list"
+        return [
+            contributor
+            for contributor in self.conflict_contributors
+            if contributor.contrib_type in contrib_types
+        ]
+
+
+def group_author_key_collab_map(contributors):
+    "map of group_author_key values to the name of the first collab having the key"
+    collab_names = {}
+    for contributor in contributors:
+        if (
+            contributor.collab is not None
+            and contributor.group_author_key not in collab_names
+        ):
+            collab_names[contributor.group_author_key] = contributor.collab
+    return collab_names
+
+
+def get_group_name_text(poa_article, contributor, collab_names=None):
+    """
+    for setting groups find the group name text in the contributors,
+    collab_names is an optional group_author_key_collab_map() of the contributors
+    """
     # Set the GroupName value
     group_name_text = None
     if contributor.group_author_key:
         # The contributor has a contrib-id contrib-id-type="group-author-key"
         #  Match this value to article contributors of type collab having the same id
-        for collab_contrib in poa_article.contributors:
-            if (
-                collab_contrib.collab is not None
-                and collab_contrib.group_author_key == contributor.group_author_key
-            ):
-                # Set the individual GroupName to the collab name
-                group_name_text = collab_contrib.collab
-                # stop looking after finding the first one
-                break
+        if collab_names is None:
+            collab_names = group_author_key_collab_map(poa_article.contributors)
+        # Set the individual GroupName to the collab name
+        group_name_text = collab_names.get(contributor.group_author_key)
     elif contributor.collab:
         # If a collab value and no group_author_key then use the collab value
         group_name_text = contributor.collab
@@ -385,16 +1471,38 @@ def set_contributor(parent, contributor, contrib_type):
         orcid.text = contributor.orcid
 
 
-def set_publication_type(parent, poa_article, types_map):
-    "PubMed will set PublicationType as Journal Article as the default, also the default here"
-    publication_type = utils.pubmed_publication_type(
-        poa_article.article_type, poa_article.display_channel, types_map
-    )
+def set_publication_type(parent, poa_article, types_map, matcher=None, context=None):
+    """
+    PubMed will set PublicationType as Journal Article as the default, also the default here,
+    matcher is a utils.PublicationTypeMatcher already compiled from the types_map
+    """
+    if context is not None:
+        publication_type = context.publication_type
+    else:
+        publication_type = get_publication_type(poa_article, types_map, matcher)
     if publication_type:
         publication_type_tag = SubElement(parent, "PublicationType")
         publication_type_tag.text = publication_type
 
 
+def get_publication_type(poa_article, types_map, matcher=None):
+    "PubMed publication type of the article, using the matcher if it is supplied"
+    if matcher is not None:
+        return matcher.match(poa_article.article_type, poa_article.display_channel)
+    return utils.pubmed_publication_type(
+        poa_article.article_type, poa_article.display_channel, types_map
+    )
+
+
+def get_volume(poa_article, pub_date, year_of_first_volume):
+    "volume from the article unless not present then calculated from the pub date"
+    if poa_article.volume:
+        return poa_article.volume
+    if pub_date and year_of_first_volume:
+        return eautils.calculate_journal_volume(pub_date, year_of_first_volume)
+    return None
+
+
 def get_pub_date(poa_article, pub_date_types, default_pub_date):
     """
     For using in XML generation, use the article pub date
@@ -421,77 +1529,81 @@ def set_language(parent, language):
 
 
 def clean_abstract(abstract):
-    abstract = etoolsutils.remove_tag("abstract", abstract)
-    abstract = etoolsutils.remove_tag("xref", abstract)
-    abstract = etoolsutils.remove_tag("ext-link", abstract)
-    abstract = etoolsutils.remove_tag("related-object", abstract)
-    abstract = etoolsutils.remove_tag_and_text("object-id", abstract)
-    abstract = utils_html.remove_comment_tags(abstract)
-    return abstract
+    """
+    remove the abstract, xref, ext-link and related-object tags, object-id tags and
+    their text, and comments from the abstract XML string
+    """
+    return "".join(markup.clean_abstract_tokens(markup.abstract_tokens(abstract)))
 
 
-def set_abstract(parent, poa_article, abstract_label_types):
+def set_abstract(parent, poa_article, abstract_label_types, policy=None):
     "set the Abstract"
+    if policy is None:
+        policy = markup.markup_policy()
     abstract_tag = SubElement(parent, "Abstract")
 
     abstract = (
         poa_article.abstract_xml if poa_article.abstract_xml else poa_article.abstract
     )
-    sections = utils.abstract_parts(clean_abstract(abstract), abstract_label_types)
+    # sections are cleaned, split and their text converted in one pass of the abstract
+    sections = markup.abstract_sections(abstract, abstract_label_types, policy)
 
     if sections:
         for section in sections:
-            if section.get("text"):
-                set_abstract_text(
-                    abstract_tag, section.get("text"), section.get("label")
-                )
+            attr_map = {"Label": etoolsutils.escape_ampersand(section.get("label"))}
+            markup.append_fragment(
+                abstract_tag,
+                "AbstractText",
+                section.get("text"),
+                attributes=attr_map,
+                allowed_tags=policy.allowed_tags,
+            )
     else:
         # Add an empty abstract
-        set_abstract_text(abstract_tag, "", "")
+        set_abstract_text(abstract_tag, "", "", policy)
 
 
-def set_plain_language_summary(parent, article):
+def set_plain_language_summary(parent, article, policy=None):
     "set an OtherAbstract tag to include the digest as plain-language-summary"
     tag_name = "OtherAbstract"
     attr_map = {"Language": "eng", "Type": "plain-language-summary"}
+    if policy is None:
+        policy = markup.markup_policy()
     if hasattr(article, "digest") and article.digest:
-        tag_converted_digest = utils.replace_inline_tags(article.digest)
+        tag_converted_digest = policy.rename(article.digest)
         # tweak to add spaces between paragraph tags
         tag_converted_digest = tag_converted_digest.replace("</p><p>", "</p> <p>")
-        tag_converted_digest = eautils.remove_tag("p", tag_converted_digest)
+        tag_converted_digest = policy.strip(tag_converted_digest, ("p",))
         tag_converted_digest = etoolsutils.escape_ampersand(tag_converted_digest)
-        tag_converted_digest = etoolsutils.escape_unmatched_angle_brackets(
-            tag_converted_digest, utils.allowed_tags()
-        )
-        minidom_tag = xmlio.reparsed_tag(
+        tag_converted_digest = policy.escape_unmatched(tag_converted_digest)
+        markup.append_fragment(
+            parent,
             tag_name,
             tag_converted_digest,
-            attributes_text=eautils.attr_string(attr_map),
-        )
-        xmlio.append_minidom_xml_to_elementtree_xml(
-            parent, minidom_tag, attributes=attr_map
+            attributes=attr_map,
+            allowed_tags=policy.allowed_tags,
         )
 
 
-def set_coi_statement(parent, poa_article, author_contrib_types):
+def set_coi_statement(
+    parent, poa_article, author_contrib_types, contributor_index=None, policy=None
+):
     "add a CoiStatement as all the conflict values from article contributors"
     coi_list = []
     coi_map = OrderedDict()
+    if policy is None:
+        policy = markup.markup_policy()
 
     # step 1 look for contributors with conflicts first
-    contributor_list = []
-    # look for contributors with conflicts first
-    for contributor in poa_article.contributors:
-        if contributor.contrib_type in author_contrib_types and contributor.conflict:
-            contributor_list.append(contributor)
+    if contributor_index is None:
+        contributor_index = ContributorIndex(poa_article.contributors)
+    contributor_list = contributor_index.conflicts(author_contrib_types)
 
     # step 2 compile a map of coi statements and their associated contributors
     for contributor in contributor_list:
         for conflict in contributor.conflict:
             # remove inline tags
-            if "<" in conflict:
-                for tag_name in utils.allowed_tag_names():
-                    conflict = eautils.remove_tag(tag_name, conflict)
+            conflict = policy.strip(conflict, policy.allowed_tag_names)
             # start a list of contributors if the statement is not seen yet
             if conflict not in coi_map:
                 coi_map[conflict] = []
@@ -517,7 +1629,7 @@ def set_coi_statement(parent, poa_article, author_contrib_types):
         coi_statement_tag.text = utils.join_phrases(coi_list)
 
 
-def set_replaces(parent, poa_article):
+def set_replaces(parent, poa_article, context=None):
     """
     Set the Replaces tag, if applicable
     """
@@ -526,7 +1638,11 @@ def set_replaces(parent, poa_article):
     # - article has a version attribute  > 1
     # - article has a replaces attribute set to True
     add_replaces_tag = False
-    if poa_article.is_poa is False and poa_article.was_ever_poa is True:
+    if context is not None:
+        vor_was_ever_poa = context.vor_was_ever_poa
+    else:
+        vor_was_ever_poa = is_vor_was_ever_poa(poa_article)
+    if vor_was_ever_poa:
         add_replaces_tag = True
     if poa_article.version and poa_article.version > 1:
         add_replaces_tag = True
@@ -538,23 +1654,24 @@ def set_replaces(parent, poa_article):
         replaces.text = poa_article.doi
 
 
-def set_article_title(parent, poa_article):
+def set_article_title(parent, poa_article, policy=None):
     """
     Set the titles and title tags allowing sub tags within title
     """
     tag_name = "ArticleTitle"
+    if policy is None:
+        policy = markup.markup_policy()
 
-    tag_converted_title = utils.replace_inline_tags(poa_article.title)
+    tag_converted_title = policy.rename(poa_article.title)
     # Specific issue to remove b tag wrapping the entire title, if present
     if tag_converted_title.startswith("<b>") and tag_converted_title.endswith("</b>"):
         tag_converted_title = tag_converted_title.lstrip("<b>")
         tag_converted_title = tag_converted_title.rstrip("</b>")
-    tag_converted_title = etoolsutils.escape_unmatched_angle_brackets(
-        tag_converted_title, utils.allowed_tags()
-    )
+    tag_converted_title = policy.escape_unmatched(tag_converted_title)
     tag_converted_title = etoolsutils.escape_ampersand(tag_converted_title)
-    minidom_tag = xmlio.reparsed_tag(tag_name, tag_converted_title)
-    xmlio.append_minidom_xml_to_elementtree_xml(parent, minidom_tag)
+    markup.append_fragment(
+        parent, tag_name, tag_converted_title, allowed_tags=policy.allowed_tags
+    )
 
 
 def set_e_location_id(parent, poa_article):
@@ -605,26 +1722,25 @@ def set_date(parent, a_date, date_type):
         day.text = str(a_date.tm_mday).zfill(2)
 
 
-def set_abstract_text(parent, abstract, label=""):
+def set_abstract_text(parent, abstract, label="", policy=None):
     "set the AbstractText value of an Abstract given an abstract string"
     tag_name = "AbstractText"
-    attr_map = {"Label": label}
+    attr_map = {"Label": etoolsutils.escape_ampersand(label)}
+    if policy is None:
+        policy = markup.markup_policy()
     tag_converted_abstract = abstract
     tag_converted_abstract = utils.replace_mathml_tags(tag_converted_abstract)
-    tag_converted_abstract = utils.replace_inline_tags(tag_converted_abstract)
-    tag_converted_abstract = eautils.remove_tag("p", tag_converted_abstract)
+    tag_converted_abstract = policy.rename(tag_converted_abstract)
+    tag_converted_abstract = policy.strip(tag_converted_abstract, ("p",))
     tag_converted_abstract = etoolsutils.escape_ampersand(tag_converted_abstract)
-    not_allowed_tags = ["sc"]
-    for tagname in not_allowed_tags:
-        tag_converted_abstract = eautils.remove_tag(tagname, tag_converted_abstract)
-    tag_converted_abstract = etoolsutils.escape_unmatched_angle_brackets(
-        tag_converted_abstract, utils.allowed_tags()
-    )
-    minidom_tag = xmlio.reparsed_tag(
-        tag_name, tag_converted_abstract, attributes_text=eautils.attr_string(attr_map)
-    )
-    xmlio.append_minidom_xml_to_elementtree_xml(
-        parent, minidom_tag, attributes=attr_map
+    tag_converted_abstract = policy.strip(tag_converted_abstract)
+    tag_converted_abstract = policy.escape_unmatched(tag_converted_abstract)
+    markup.append_fragment(
+        parent,
+        tag_name,
+        tag_converted_abstract,
+        attributes=attr_map,
+        allowed_tags=policy.allowed_tags,
     )
 
 
@@ -718,13 +1834,97 @@ def set_grants(parent, poa_article):
                 set_object(parent, "grant", params)
 
 
+class DatasetResolver:
+    """
+    assigning authority lookups compiled from the ASSIGNING_AUTHORITY_URI_MAP
+    and DATA_REF_SOURCE_MAP, see dataset_resolver() for the shared instance
+    """
+
+    def __init__(self, uri_map=None, source_map=None):
+        if uri_map is None:
+            uri_map = ASSIGNING_AUTHORITY_URI_MAP
+        if source_map is None:
+            source_map = DATA_REF_SOURCE_MAP
+        self.uri_map = OrderedDict(uri_map)
+        # one pattern to check whether a uri contains any of the hints
+        self.uri_pattern = None
+        if self.uri_map:
+            self.uri_pattern = re.compile(
+                "|".join(re.escape(hint) for hint in self.uri_map)
+            )
+        # map keys converted to lower case for case-insensitive matching
+        self.source_map = {key.lower(): value for key, value in source_map.items()}
+
+    def assigning_authority(self, uri):
+        "precise assigning_authority value considering the uri in some cases"
+        if self.uri_pattern and uri and self.uri_pattern.search(uri):
+            # the first hint in the map order is used if the uri contains more than one
+            for hint, new_value in self.uri_map.items():
+                if hint in uri:
+                    return new_value
+        return None
+
+    def dataset_details(self, dataset):
+        "assigning_authority and id value for a Dataset object"
+        assigning_authority = self.assigning_authority(
+            etoolsutils.firstnn([dataset.uri, dataset.doi])
+        )
+        id_value = etoolsutils.firstnn([dataset.doi, dataset.accession_id])
+        return assigning_authority, id_value
+
+    def data_ref_details(self, ref):
+        "assigning_authority and id value for a data Citation object"
+        assigning_authority = None
+        id_value = None
+        # case-insensitive matching of ref source to map key
+        if ref.source:
+            assigning_authority = self.source_map.get(ref.source.lower())
+        if assigning_authority:
+            if ref.accession:
+                id_value = ref.accession
+            elif ref.doi:
+                id_value = ref.doi
+        return assigning_authority, id_value
+
+    def datasets(self, poa_article):
+        """
+        list of assigning_authority and id value for the article datasets,
+        followed by the data refs which are not a duplicate of one already listed
+        """
+        dataset_list = []
+        dataset_keys = set()
+        for dataset in poa_article.datasets:
+            assigning_authority, id_value = self.dataset_details(dataset)
+            if assigning_authority and id_value:
+                dataset_list.append((assigning_authority, id_value))
+                dataset_keys.add((assigning_authority, id_value))
+        # next add from ref list but do not add duplicates
+        for ref in poa_article.ref_list:
+            if ref.publication_type != "data":
+                continue
+            assigning_authority, id_value = self.data_ref_details(ref)
+            if (
+                assigning_authority
+                and id_value
+                and (assigning_authority, id_value) not in dataset_keys
+            ):
+                dataset_list.append((assigning_authority, id_value))
+                dataset_keys.add((assigning_authority, id_value))
+        return dataset_list
+
+
+@functools.lru_cache(maxsize=None)
+def dataset_resolver():
+    """
+    DatasetResolver for the module maps, compiled once per process,
+    call dataset_resolver.cache_clear() after changing the maps
+    """
+    return DatasetResolver()
+
+
 def dataset_assigning_authority(uri):
     """precise assigning_authority value considering the uri in some cases"""
-    if ASSIGNING_AUTHORITY_URI_MAP and uri:
-        for hint, new_value in ASSIGNING_AUTHORITY_URI_MAP.items():
-            if hint in uri:
-                return new_value
-    return None
+    return dataset_resolver().assigning_authority(uri)
 
 
 def dataset_details(dataset):
@@ -735,62 +1935,20 @@ def dataset_details(dataset):
     :param dataset: Dataset object
     :returns: string assigning authority of the dataset, string id is the uri or doi
     """
-    assigning_authority = dataset_assigning_authority(
-        etoolsutils.firstnn([dataset.uri, dataset.doi])
-    )
-    id_value = etoolsutils.firstnn([dataset.doi, dataset.accession_id])
-    return assigning_authority, id_value
+    return dataset_resolver().dataset_details(dataset)
 
 
 def data_ref_details(ref):
-    assigning_authority = None
-    id_value = None
-    # convert map keys to lower case
-    lower_case_map = OrderedDict()
-    for key, value in DATA_REF_SOURCE_MAP.items():
-        lower_case_map[key.lower()] = value
-    # case-insensitive matching of ref source to map key
-    if ref.source and ref.source.lower() in lower_case_map.keys():
-        assigning_authority = lower_case_map[ref.source.lower()]
-        if ref.accession:
-            id_value = ref.accession
-        elif ref.doi:
-            id_value = ref.doi
-    return assigning_authority, id_value
-
-
-def set_datasets(parent, poa_article):
-    """object tags for datasets"""
-    dataset_objects = []
-    for dataset in poa_article.datasets:
-        assigning_authority, id_value = dataset_details(dataset)
-        if assigning_authority and id_value:
-            dataset = OrderedDict(
-                [
-                    ("assigning_authority", assigning_authority),
-                    ("params", {"id": id_value}),
-                ]
-            )
-            dataset_objects.append(dataset)
-    # next add from ref list but do not add duplicates
-    for ref in [ref for ref in poa_article.ref_list if ref.publication_type == "data"]:
-        assigning_authority, id_value = data_ref_details(ref)
-        if assigning_authority and id_value:
-            dataset = OrderedDict(
-                [
-                    ("assigning_authority", assigning_authority),
-                    ("params", {"id": id_value}),
-                ]
-            )
-            # only add if not a duplicate
-            if str(dataset) not in [
-                str(existing_dataset) for existing_dataset in dataset_objects
-            ]:
-                dataset_objects.append(dataset)
+    return dataset_resolver().data_ref_details(ref)
+
 
+def set_datasets(parent, poa_article, resolver=None):
+    """object tags for datasets"""
+    if resolver is None:
+        resolver = dataset_resolver()
     # set the object tags
-    for dataset in dataset_objects:
-        set_object(parent, dataset.get("assigning_authority"), dataset.get("params"))
+    for assigning_authority, id_value in resolver.datasets(poa_article):
+        set_object(parent, assigning_authority, {"id": id_value})
 
 
 def set_clinical_trials(parent, poa_article):
@@ -814,36 +1972,15 @@ def set_clinical_trials(parent, poa_article):
         )
 
 
-def set_object_list(parent, poa_article, split_article_categories):
-    # Keywords and others go in Object tags
-    object_list = SubElement(parent, "ObjectList")
-
-    # Add related article data for correction articles
-    set_article_type(object_list, poa_article)
-
-    # Add research organisms
-    set_research_organism(object_list, poa_article)
-
-    # Add article categories
-    set_categories(object_list, poa_article, split_article_categories)
-
-    # Add keywords
+def set_keywords(parent, poa_article):
     for keyword in poa_article.author_keywords:
         params = {"value": keyword}
-        set_object(object_list, "keyword", params)
+        set_object(parent, "keyword", params)
 
-    # Add grant / funding
-    set_grants(object_list, poa_article)
 
-    # Add datasets
-    set_datasets(object_list, poa_article)
-
-    # Add clinical trial data
-    set_clinical_trials(object_list, poa_article)
-
-    # Finally, do not leave an empty ObjectList tag, if present
-    if len(object_list) <= 0:
-        parent.remove(object_list)
+def is_vor_was_ever_poa(poa_article):
+    "whether the article is a VoR article which was a PoA article in the past"
+    return poa_article.is_poa is False and poa_article.was_ever_poa is True
 
 
 def get_pub_type(poa_article):
@@ -862,47 +1999,382 @@ def get_pub_type(poa_article):
 
 
 def build_pubmed_xml(
-    poa_articles, config_section="elife", pub_date=None, add_comment=True
+    poa_articles,
+    config_section="elife",
+    pub_date=None,
+    add_comment=True,
+    instrumentation=None,
 ):
     """
     Given a list of article article objects
     generate PubMed XML from them
     """
-    raw_config = config[config_section]
-    pubmed_config = parse_raw_config(raw_config)
-    return PubMedXML(poa_articles, pubmed_config, pub_date, add_comment)
+    return PubMedGenerator(config_section, instrumentation=instrumentation).build(
+        poa_articles, pub_date, add_comment
+    )
 
 
 def pubmed_xml(
-    poa_articles, config_section="elife", pub_date=None, add_comment=True, pretty=False
+    poa_articles,
+    config_section="elife",
+    pub_date=None,
+    add_comment=True,
+    pretty=False,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    instrumentation=None,
+    fragment_cache=None,
 ):
-    "build PubMed xml and return output as a string"
-    p_xml = build_pubmed_xml(poa_articles, config_section, pub_date, add_comment)
-    return p_xml.output_xml(pretty=pretty)
+    """
+    build PubMed xml and return output as a string,
+    the articles are built in worker processes if jobs is more than 1 or an executor
+    is supplied, with the same output
+    """
+    return PubMedGenerator(config_section, instrumentation=instrumentation).generate(
+        poa_articles,
+        pub_date,
+        add_comment,
+        pretty,
+        jobs=jobs,
+        executor=executor,
+        chunksize=chunksize,
+        fragment_cache=fragment_cache,
+    )
+
+
+def write_pubmed_xml(
+    poa_articles,
+    open_file,
+    config_section="elife",
+    pub_date=None,
+    add_comment=True,
+    pretty=False,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    instrumentation=None,
+    fragment_cache=None,
+):
+    "build PubMed xml one article at a time and write it to the file-like open_file"
+    return PubMedGenerator(config_section, instrumentation=instrumentation).write(
+        poa_articles,
+        open_file,
+        pub_date,
+        add_comment,
+        pretty,
+        jobs=jobs,
+        executor=executor,
+        chunksize=chunksize,
+        fragment_cache=fragment_cache,
+    )
 
 
 def pubmed_xml_to_disk(
-    poa_articles, config_section="elife", pub_date=None, add_comment=True, pretty=False
+    poa_articles,
+    config_section="elife",
+    pub_date=None,
+    add_comment=True,
+    pretty=False,
+    stream=False,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    instrumentation=None,
+    profile=False,
+    fragment_cache=None,
+    ledger=None,
+    changed_only=False,
+    max_articles=None,
+    max_bytes=None,
+    no_clobber=False,
 ):
-    "build pubmed xml and write the output to disk"
-    p_xml = build_pubmed_xml(poa_articles, config_section, pub_date, add_comment)
-    xml_string = p_xml.output_xml(pretty=pretty)
-    # Write to file
-    filename = TMP_DIR + os.sep + p_xml.batch_id + ".xml"
-    with open(filename, "wb") as open_file:
-        open_file.write(xml_string)
-
-
-def build_articles_for_pubmed(article_xmls, config_section="elife"):
-    "specify some detail and build_parts specific to generating pubmed output"
-    raw_config = config[config_section]
-    pubmed_config = parse_raw_config(raw_config)
+    """
+    build pubmed xml and write the output to disk,
+    if stream is True each article is written as soon as it is built,
+    articles built in worker processes, using a fragment_cache or recorded in a
+    ledger are always streamed, each file is written to a temporary file in
+    TMP_DIR and renamed once complete, see publish_file()
+
+    :param instrumentation: optional instrument.Instrumentation to record the
+        build, serialise and write phases in
+    :param profile: if True the run is profiled with cProfile and tracemalloc and
+        the profile files are written next to the output, see profiling.Profiler
+    :param fragment_cache: optional cache.FragmentCache of serialised Article tags
+    :param ledger: optional ledger.DepositLedger, each article is recorded in it
+        with its fragment_key() and the hash of its Article tag once the file is
+        written
+    :param changed_only: if True and a ledger is supplied only the articles whose
+        fragment_key() is not in it, not deposited before or changed since they
+        were, are built and written, no file is written if there are none
+    :param max_articles: if supplied the output is split into files of at most
+        this many articles, see PubMedBatchWriter
+    :param max_bytes: if supplied the output is split into files of at most this
+        many bytes, unless one article is larger
+    :param no_clobber: if True an existing file is not replaced, the file is written
+        to a path with a sequence number added instead, see publish_file()
+    :returns: list of the path of each file written, empty if no file is written
+    """
+    pubmed_config = load_config(config_section)
+    if pub_date is None:
+        pub_date = time.gmtime()
+    article_keys = None
+    if ledger is not None:
+        poa_articles = list(poa_articles)
+        article_keys = [
+            fragment_key(poa_article, config_section, pubmed_config, pub_date)
+            for poa_article in poa_articles
+        ]
+        if changed_only:
+            poa_articles, article_keys = changed_articles(
+                poa_articles, article_keys, ledger
+            )
+            if not poa_articles:
+                return []
+    batch_id = get_batch_id(poa_articles, pubmed_config, pub_date)
+    profiler = profiling.Profiler(batch_id, TMP_DIR) if profile else None
+    generator = PubMedGenerator(
+        config_section,
+        pubmed_config,
+        instrumentation=instrumentation,
+        profiler=profiler,
+    )
+    hash_fragments = ledger is not None
+    fragment_hashes = None
+    with profiling.run(profiler):
+        if max_articles or max_bytes:
+            with instrument.phase(instrumentation, "write"):
+                writer = generator.write_batches(
+                    poa_articles,
+                    TMP_DIR,
+                    pub_date,
+                    add_comment,
+                    pretty,
+                    max_articles=max_articles,
+                    max_bytes=max_bytes,
+                    jobs=jobs,
+                    executor=executor,
+                    chunksize=chunksize,
+                    fragment_cache=fragment_cache,
+                    hash_fragments=hash_fragments,
+                    no_clobber=no_clobber,
+                )
+            # batch_id and number of articles of each file, all the articles if None
+            batches = writer.batches
+            fragment_hashes = writer.fragment_hashes
+        elif (
+            stream
+            or is_parallel(jobs, executor)
+            or fragment_cache is not None
+            or hash_fragments
+        ):
+            atomic_file = open_atomic(batch_file_path(TMP_DIR, batch_id), no_clobber)
+            with instrument.phase(instrumentation, "write"):
+                with atomic_file as open_file:
+                    writer = generator.write(
+                        poa_articles,
+                        open_file,
+                        pub_date,
+                        add_comment,
+                        pretty,
+                        jobs=jobs,
+                        executor=executor,
+                        chunksize=chunksize,
+                        fragment_cache=fragment_cache,
+                        hash_fragments=hash_fragments,
+                    )
+            batches = [(file_batch_id(atomic_file.file_path), None)]
+            fragment_hashes = writer.fragment_hashes
+        else:
+            p_xml = generator.build(poa_articles, pub_date, add_comment)
+            xml_string = p_xml.output_xml(pretty=pretty)
+            # Write to file
+            atomic_file = open_atomic(batch_file_path(TMP_DIR, batch_id), no_clobber)
+            with instrument.phase(instrumentation, "write"):
+                with atomic_file as open_file:
+                    open_file.write(xml_string)
+            batches = [(file_batch_id(atomic_file.file_path), None)]
+        if profiler is not None and not (max_articles or max_bytes):
+            # the profile files are written once the run ends, named after the output
+            profiler.name = batches[0][0]
+    if ledger is not None:
+        # the articles are written to the files in order
+        article_iter = zip(poa_articles, article_keys, fragment_hashes)
+        for output_batch_id, article_count in batches:
+            ledger.record(
+                output_batch_id,
+                [
+                    (poa_article.doi, poa_article.version, article_key, fragment_hash)
+                    for poa_article, article_key, fragment_hash in itertools.islice(
+                        article_iter, article_count
+                    )
+                ],
+            )
+    return [batch_file_path(TMP_DIR, output_batch_id) for output_batch_id, _ in batches]
+
+
+def build_articles_for_pubmed(
+    article_xmls,
+    config_section="elife",
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    instrumentation=None,
+    profile=False,
+    article_cache=None,
+):
+    """
+    specify some detail and build_parts specific to generating pubmed output,
+    the parse phase and the number of articles are recorded in the optional
+    instrument.Instrumentation, if profile is True the parsing is profiled and
+    the profile files are written to TMP_DIR, see profiling.Profiler,
+    the fast_parse config value parses only the parts PubMed uses, see extract,
+    files in the optional cache.ArticleCache are not parsed again
+    """
+    pubmed_config = load_config(config_section)
     build_parts = pubmed_config.get("build_parts")
     remove_tags = pubmed_config.get("remove_tags")
-    return build_articles(article_xmls, build_parts, remove_tags)
+    fast = bool(pubmed_config.get("fast_parse"))
+    profiler = None
+    if profile:
+        profiler = profiling.Profiler(
+            str(pubmed_config.get("batch_file_prefix"))
+            + "parse-"
+            + time.strftime("%Y%m%d%H%M%S", time.gmtime()),
+            TMP_DIR,
+        )
+    with profiling.run(profiler), instrument.phase(instrumentation, "parse"):
+        articles = build_articles(
+            article_xmls,
+            build_parts,
+            remove_tags,
+            jobs=jobs,
+            executor=executor,
+            chunksize=chunksize,
+            profiler=profiler,
+            fast=fast,
+            article_cache=article_cache,
+        )
+    instrument.count(instrumentation, "articles", len(articles))
+    return articles
 
 
-def build_articles(article_xmls, build_parts=None, remove_tags=None):
-    return parse.build_articles_from_article_xmls(
-        article_xmls, detail="full", build_parts=build_parts, remove_tags=remove_tags
+def build_article(article_xml, build_parts=None, remove_tags=None, fast=False):
+    """
+    parse one article XML file, returns None if there were errors parsing it,
+    if fast is True the parts of the XML PubMed does not use are not parsed
+    """
+    build_article_from_xml = (
+        extract.build_article_from_xml if fast else parse.build_article_from_xml
+    )
+    article, error_count = build_article_from_xml(
+        article_xml, detail="full", build_parts=build_parts, remove_tags=remove_tags
+    )
+    if error_count == 0:
+        return article
+    return None
+
+
+def build_articles(
+    article_xmls,
+    build_parts=None,
+    remove_tags=None,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    max_tasks_per_child=MAX_TASKS_PER_CHILD,
+    profiler=None,
+    fast=False,
+    article_cache=None,
+):
+    """
+    parse the article XML files into Article objects, in the same order as article_xmls
+
+    :param jobs: number of worker processes to parse in, None or 1 parses in this process
+    :param executor: a concurrent.futures Executor to parse in, used instead of jobs
+    :param chunksize: number of files sent to a worker process at a time
+    :param max_tasks_per_child: a worker process is replaced after parsing this many
+        chunks, to release memory during long runs
+    :param profiler: optional profiling.Profiler to record the peak memory of
+        parsing each file in, when parsing in this process
+    :param fast: if True only the parts of the XML PubMed uses are parsed, the
+        Article ref_list then only has data references, see extract
+    :param article_cache: optional cache.ArticleCache, files which are in it are
+        not parsed again and the articles parsed are added to it
+    """
+    parallel = is_parallel(jobs, executor)
+    if article_cache is None and profiler is None and not fast and not parallel:
+        return parse.build_articles_from_article_xmls(
+            article_xmls,
+            detail="full",
+            build_parts=build_parts,
+            remove_tags=remove_tags,
+        )
+    if article_cache is None:
+        articles = parse_articles(
+            article_xmls,
+            build_parts,
+            remove_tags,
+            jobs,
+            executor,
+            chunksize,
+            max_tasks_per_child,
+            profiler,
+            fast,
+        )
+        return [article for article in articles if article is not None]
+    article_xmls = list(article_xmls)
+    options = {"build_parts": build_parts, "remove_tags": remove_tags, "fast": fast}
+    keys = [article_cache.key(article_xml, options) for article_xml in article_xmls]
+    articles = [article_cache.get(key) for key in keys]
+    missing = [index for index, article in enumerate(articles) if article is None]
+    parsed_articles = parse_articles(
+        [article_xmls[index] for index in missing],
+        build_parts,
+        remove_tags,
+        jobs,
+        executor,
+        chunksize,
+        max_tasks_per_child,
+        profiler,
+        fast,
+    )
+    for index, article in zip(missing, parsed_articles):
+        # articles with parsing errors are not added
+        if article is not None:
+            article_cache.put(keys[index], article)
+            articles[index] = article
+    return [article for article in articles if article is not None]
+
+
+def parse_articles(
+    article_xmls,
+    build_parts=None,
+    remove_tags=None,
+    jobs=None,
+    executor=None,
+    chunksize=1,
+    max_tasks_per_child=MAX_TASKS_PER_CHILD,
+    profiler=None,
+    fast=False,
+):
+    """
+    Article objects of the article XML files in the same order as article_xmls,
+    None for a file having errors parsing it, see build_articles()
+    """
+    if not is_parallel(jobs, executor):
+        articles = []
+        for article_xml in article_xmls:
+            with profiling.article(profiler, article_xml):
+                articles.append(
+                    build_article(article_xml, build_parts, remove_tags, fast)
+                )
+        return articles
+    build_function = functools.partial(
+        build_article, build_parts=build_parts, remove_tags=remove_tags, fast=fast
+    )
+    return list(
+        map_in_parallel(
+            build_function, article_xmls, jobs, executor, chunksize, max_tasks_per_child
+        )
     )
@@ -0,0 +1,127 @@
+"""
+Optional instrumentation of parsing, building and serialising PubMed XML
+
+An Instrumentation object passed to the generate functions records the wall time,
+CPU time and number of calls of each phase, pipeline stage and article, along with
+counters such as the number of elements and output bytes. When no Instrumentation
+is passed nothing is recorded.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from elifepubmed import pipeline
+
+
+class Instrumentation:
+    "measurements of one or more batches, safe to record from more than one thread"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # parse, build, serialise and write phases by name
+        self.phases = OrderedDict()
+        # pipeline stages of the Article tags, see pipeline.StageTimings
+        self.stages = pipeline.StageTimings(cpu=True)
+        # one dict for each Article tag built in this process
+        self.articles = []
+        self.counters = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        "record the wall time and the process CPU time of the code in the with block"
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield self
+        finally:
+            self.add_phase(
+                name, time.perf_counter() - start, time.process_time() - cpu_start
+            )
+
+    def add_phase(self, name, seconds, cpu_seconds):
+        with self.lock:
+            phase = self.phases.setdefault(
+                name, {"seconds": 0.0, "cpu_seconds": 0.0, "count": 0}
+            )
+            phase["seconds"] += seconds
+            phase["cpu_seconds"] += cpu_seconds
+            phase["count"] += 1
+
+    def add_article(self, doi, seconds, cpu_seconds, elements):
+        "record the building of one Article tag and the number of elements in it"
+        with self.lock:
+            self.articles.append(
+                OrderedDict(
+                    [
+                        ("doi", doi),
+                        ("seconds", seconds),
+                        ("cpu_seconds", cpu_seconds),
+                        ("elements", elements),
+                    ]
+                )
+            )
+            self.counters["elements"] = self.counters.get("elements", 0) + elements
+
+    def count(self, name, value=1):
+        "add the value to the named counter"
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, measurements):
+        "add the measurements of an as_dict() of other instrumentation, such as a worker's"
+        self.stages.merge(measurements.get("stages", {}))
+        for name, phase in measurements.get("phases", {}).items():
+            with self.lock:
+                total = self.phases.setdefault(
+                    name, {"seconds": 0.0, "cpu_seconds": 0.0, "count": 0}
+                )
+                for key in total:
+                    total[key] += phase.get(key)
+        with self.lock:
+            self.articles.extend(
+                OrderedDict(article) for article in measurements.get("articles", [])
+            )
+            for name, value in measurements.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        "all the measurements as a dict of plain values"
+        stages = self.stages.report()
+        with self.lock:
+            return OrderedDict(
+                [
+                    (
+                        "phases",
+                        OrderedDict(
+                            (name, dict(phase)) for name, phase in self.phases.items()
+                        ),
+                    ),
+                    ("stages", stages),
+                    ("articles", [OrderedDict(article) for article in self.articles]),
+                    ("counters", OrderedDict(self.counters)),
+                ]
+            )
+
+    def to_json(self, indent=None):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def clear(self):
+        self.stages.clear()
+        with self.lock:
+            self.phases.clear()
+            self.articles = []
+            self.counters.clear()
+
+
+def phase(instrumentation, name):
+    "phase context manager of the instrumentation, one doing nothing if it is None"
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.phase(name)
+
+
+def count(instrumentation, name, value=1):
+    "add the value to the named counter of the instrumentation if it is not None"
+    if instrumentation is not None:
+        instrumentation.count(name, value)
@@ -0,0 +1,107 @@
+"""
+SQLite ledger of the articles deposited to PubMed
+
+Each deposit of an article is recorded with its DOI, version, the batch_id of
+the deposit file, the key of the article data its Article tag was generated from,
+see generate.fragment_key(), a hash of the Article tag written and the time it was
+recorded. An article whose key has not changed since it was last deposited can be
+left out of the next deposit before its Article tag is generated.
+"""
+import sqlite3
+import threading
+import time
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS deposit ("
+    "id INTEGER PRIMARY KEY, "
+    "doi TEXT NOT NULL, "
+    "version TEXT, "
+    "batch_id TEXT NOT NULL, "
+    "article_key TEXT NOT NULL, "
+    "content_hash TEXT NOT NULL, "
+    "deposited TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS deposit_doi_version ON deposit (doi, version)",
+)
+
+
+def version_value(version):
+    "version as stored in the ledger, None if the article has no version"
+    return None if version is None else str(version)
+
+
+class DepositLedger:
+    "deposits recorded in an SQLite database file, safe to use from more than one thread"
+
+    def __init__(self, path):
+        """
+        :param path: path to the SQLite database file, it is created if it is missing
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def record(self, batch_id, deposits, deposited=None):
+        """
+        record the articles of a deposit file
+
+        :param batch_id: batch_id of the deposit file
+        :param deposits: list of (DOI, version, article key, content hash) tuples
+        :param deposited: time.struct_time of the deposit, now by default
+        """
+        if deposited is None:
+            deposited = time.gmtime()
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", deposited)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO deposit "
+                "(doi, version, batch_id, article_key, content_hash, deposited) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        doi,
+                        version_value(version),
+                        batch_id,
+                        article_key,
+                        content_hash,
+                        timestamp,
+                    )
+                    for doi, version, article_key, content_hash in deposits
+                ],
+            )
+
+    def last_deposit(self, doi, version):
+        """
+        dict of the last deposit of the DOI and version, None if it was not deposited
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT batch_id, article_key, content_hash, deposited FROM deposit "
+                "WHERE doi = ? AND version IS ? ORDER BY id DESC LIMIT 1",
+                (doi, version_value(version)),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "batch_id": row[0],
+            "article_key": row[1],
+            "content_hash": row[2],
+            "deposited": row[3],
+        }
+
+    def is_changed(self, doi, version, article_key):
+        "whether the article was not deposited before with the same article key"
+        deposit = self.last_deposit(doi, version)
+        return deposit is None or deposit.get("article_key") != article_key
@@ -0,0 +1,575 @@
+"""
+Build ElementTree tags from strings of text containing inline markup
+"""
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from xml.etree.ElementTree import SubElement
+from xml.parsers.expat import ExpatError
+from elifetools import utils as etoolsutils
+from elifepubmed import utils
+
+
+# the predefined XML entities and numeric character references
+ENTITY_PATTERN = re.compile(r"&(?:(amp|lt|gt|quot|apos)|#([0-9]+)|#x([0-9a-fA-F]+));")
+
+ENTITY_MAP = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+
+ATTRIBUTE_WHITESPACE_PATTERN = re.compile(r"\r\n|[\t\n\r]")
+
+
+def entity_match_string(match):
+    "for use by unescape_entities(), the character for an entity match"
+    if match.group(1):
+        return ENTITY_MAP[match.group(1)]
+    if match.group(2):
+        return chr(int(match.group(2)))
+    return chr(int(match.group(3), 16))
+
+
+def unescape_entities(string):
+    "replace XML entities and character references with the characters"
+    if not string or "&" not in string:
+        return string
+    return ENTITY_PATTERN.sub(entity_match_string, string)
+
+
+def attribute_value(string):
+    "unescape an attribute value, whitespace is normalised as an XML parser would"
+    if not string:
+        return string
+    return unescape_entities(ATTRIBUTE_WHITESPACE_PATTERN.sub(" ", string))
+
+
+# any tag on one line, or an angle bracket which is not part of one
+ANGLE_BRACKET_PATTERN = re.compile(r"<.*?>|[<>]")
+
+# tag names removed from text by default, the text in them is kept
+REMOVE_TAG_NAMES = ("sc",)
+
+
+@lru_cache(maxsize=None)
+def strip_tag_pattern(tag_names):
+    """
+    regular expression matching open and close tags starting with any of the tuple
+    of tag names, the same tags elifearticle utils remove_tag() matches for each name
+    """
+    return re.compile(
+        "</?(?:%s).*?>" % "|".join(re.escape(tag_name) for tag_name in tag_names)
+    )
+
+
+def escape_angle_brackets(string):
+    return string.replace("<", "&lt;").replace(">", "&gt;")
+
+
+class MarkupPolicy:
+    """
+    inline markup rules for text values, compiled once and then reused
+
+    :param allowed_tags: tuple of open and close tags allowed in text,
+        defaults to utils.allowed_tags()
+    :param tag_replacements: OrderedDict of tag names renamed to another tag name,
+        defaults to utils.TAG_REPLACEMENT_MAP
+    :param remove_tags: tuple of tag names removed from text, keeping the text in them
+    """
+
+    def __init__(self, allowed_tags=None, tag_replacements=None, remove_tags=None):
+        if allowed_tags is None:
+            allowed_tags = utils.allowed_tags()
+        if tag_replacements is None:
+            tag_replacements = utils.TAG_REPLACEMENT_MAP
+        if remove_tags is None:
+            remove_tags = REMOVE_TAG_NAMES
+        self.allowed_tags = tuple(allowed_tags)
+        self.allowed_tag_names = tuple(
+            sorted({re.sub(r"[<>/]", "", tag) for tag in self.allowed_tags})
+        )
+        self.tag_replacements = OrderedDict(tag_replacements)
+        self.remove_tags = tuple(remove_tags)
+        # open and close tags and the tags they are renamed to
+        self.tag_map = OrderedDict()
+        for from_tag, to_tag in self.tag_replacements.items():
+            self.tag_map["<%s>" % from_tag] = "<%s>" % to_tag
+            self.tag_map["</%s>" % from_tag] = "</%s>" % to_tag
+        self.rename_pattern = (
+            re.compile("|".join(re.escape(tag) for tag in self.tag_map))
+            if self.tag_map
+            else None
+        )
+
+    def rename(self, string):
+        "rename tags in the tag replacement map, in one pass of the string"
+        if not string or self.rename_pattern is None or "<" not in string:
+            return string
+        return self.rename_pattern.sub(
+            lambda tag_match: self.tag_map[tag_match.group(0)], string
+        )
+
+    def strip(self, string, tag_names=None):
+        """
+        remove open and close tags which start with the tag names, keeping the text
+        in them, in one pass of the string
+
+        :param string: XML string
+        :param tag_names: tuple of tag names, defaults to the remove_tags
+        """
+        if tag_names is None:
+            tag_names = self.remove_tags
+        if not string or not tag_names or "<" not in string:
+            return string
+        return strip_tag_pattern(tuple(tag_names)).sub("", string)
+
+    def escape_unmatched_tag(self, tag_match):
+        "for use by escape_unmatched(), the escaped string of an angle bracket match"
+        token = tag_match.group(0)
+        if len(token) == 1:
+            return escape_angle_brackets(token)
+        # only the last open angle bracket can be the start of a tag
+        start = token.rfind("<")
+        tag = token[start:]
+        if not tag.startswith(self.allowed_tags):
+            tag = escape_angle_brackets(tag)
+        return token[:start].replace("<", "&lt;") + tag
+
+    def escape_unmatched(self, string):
+        """
+        escape angle brackets which are not part of an allowed tag, in one pass of the
+        string, the same as elifetools utils escape_unmatched_angle_brackets()
+        """
+        if not string or ("<" not in string and ">" not in string):
+            return string
+        return ANGLE_BRACKET_PATTERN.sub(self.escape_unmatched_tag, string)
+
+
+@lru_cache(maxsize=None)
+def compiled_markup_policy(allowed_tags, tag_replacements, remove_tags):
+    "MarkupPolicy of hashable values, allowed_tags and remove_tags tuples and tag pairs"
+    return MarkupPolicy(allowed_tags, OrderedDict(tag_replacements), remove_tags)
+
+
+def markup_policy(pubmed_config=None):
+    """
+    MarkupPolicy of the markup values of a parsed config section,
+    policies of the same values are compiled once
+
+    :param pubmed_config: dict of parsed config values
+    :returns: MarkupPolicy
+    """
+    if pubmed_config is None:
+        pubmed_config = {}
+    allowed_tag_names = pubmed_config.get("markup_allowed_tags")
+    if allowed_tag_names is None:
+        allowed_tags = utils.allowed_tags()
+    else:
+        allowed_tags = tuple(
+            tag
+            for tag_name in allowed_tag_names
+            for tag in ("<%s>" % tag_name, "</%s>" % tag_name)
+        )
+    tag_replacements = pubmed_config.get("markup_tag_replacements")
+    if tag_replacements is None:
+        tag_replacements = utils.TAG_REPLACEMENT_MAP
+    remove_tags = pubmed_config.get("markup_remove_tags")
+    if remove_tags is None:
+        remove_tags = REMOVE_TAG_NAMES
+    return compiled_markup_policy(
+        tuple(allowed_tags), tuple(tag_replacements.items()), tuple(remove_tags)
+    )
+
+
+@lru_cache(maxsize=None)
+def inline_tag_pattern(allowed_tags):
+    "regular expression to split a string on the tuple of allowed tags"
+    return re.compile("(%s)" % "|".join(re.escape(tag) for tag in allowed_tags))
+
+
+def append_fragment(parent, tag_name, string, attributes=None, allowed_tags=None):
+    """
+    add a tag_name tag to the parent holding the string content, the allowed inline tags
+    found in the string become child tags and the text between them their text and tail
+
+    :param parent: ElementTree tag
+    :param tag_name: name of the new tag
+    :param string: escaped XML string which may include the allowed tags
+    :param attributes: dict of attribute names and escaped values of the new tag
+    :param allowed_tags: tuple of open and close tags, defaults to utils.allowed_tags()
+    :returns: the new tag
+    :raises ExpatError: if the allowed tags are not closed in order, the same error
+        the minidom parser raised
+    """
+    if allowed_tags is None:
+        allowed_tags = utils.allowed_tags()
+    tag = SubElement(parent, tag_name)
+    if attributes:
+        for name, value in attributes.items():
+            tag.set(name, attribute_value(value))
+    if not string:
+        return tag
+    # open tags, the text of the last one is set next unless a tag was just closed
+    open_tags = [tag]
+    closed_tag = None
+    for index, token in enumerate(inline_tag_pattern(allowed_tags).split(string)):
+        if not token:
+            continue
+        if index % 2 == 0:
+            # text
+            if closed_tag is None:
+                open_tags[-1].text = unescape_entities(token)
+            else:
+                closed_tag.tail = unescape_entities(token)
+        elif token.startswith("</"):
+            if len(open_tags) <= 1 or open_tags[-1].tag != token[2:-1]:
+                raise ExpatError("mismatched tag %s in %s" % (token, tag_name))
+            closed_tag = open_tags.pop()
+        else:
+            open_tags.append(SubElement(open_tags[-1], token[1:-1]))
+            closed_tag = None
+    if len(open_tags) > 1:
+        raise ExpatError("unclosed tag %s in %s" % (open_tags[-1].tag, tag_name))
+    return tag
+
+
+# abstract XML is split into comments, tags and the text between them
+ABSTRACT_TOKEN_PATTERN = re.compile(r"(<!--.*?-->|<[^<>]*>)", re.DOTALL)
+
+# tags removed from an abstract, along with new lines on either side of them
+ABSTRACT_REMOVE_TAG_NAMES = ("abstract", "xref", "ext-link", "related-object")
+
+OBJECT_ID_TAG_NAME = "object-id"
+
+# tags removed from an abstract section, along with new lines on either side of them
+ABSTRACT_SEC_REMOVE_TAG_NAMES = ("p", "sec")
+
+# tags removed from abstract text, leaving the text on either side of them
+ABSTRACT_TEXT_REMOVE_TAG_NAMES = ("p",)
+
+MATHML_REPLACEMENT = "[Formula: see text]"
+
+
+def is_tag(token):
+    "whether the abstract token is a tag or comment rather than text"
+    return len(token) > 1 and token[0] == "<" and token[-1] == ">"
+
+
+def tag_name_matches(token, tag_names):
+    """
+    whether the open or close tag starts with one of the tag names, the same as
+    a remove_tag() regular expression matches it, one which spans lines does not match
+    """
+    if "\n" in token:
+        return False
+    if token.startswith("</"):
+        return token.startswith(tag_names, 2)
+    return token.startswith(tag_names, 1)
+
+
+def append_text(tokens, text):
+    "add the text to the list of tokens, joined to a text token at the end of it"
+    if not text:
+        return
+    if tokens and not is_tag(tokens[-1]):
+        tokens[-1] += text
+    else:
+        tokens.append(text)
+
+
+def strip_trailing_text(tokens, chars=None):
+    "strip the characters from the end of the text tokens at the end of the list"
+    while tokens and not is_tag(tokens[-1]):
+        stripped = tokens[-1].rstrip(chars)
+        if stripped:
+            tokens[-1] = stripped
+            return
+        tokens.pop()
+
+
+def abstract_tokens(abstract):
+    "split the abstract XML string into a list of tag, comment and text tokens"
+    if not abstract:
+        return []
+    return [token for token in ABSTRACT_TOKEN_PATTERN.split(abstract) if token]
+
+
+def remove_tag_tokens(tokens, tag_names):
+    """
+    remove the tags from the list of tokens along with new lines on either side of
+    them, the same as elifetools utils remove_tag() does to an XML string
+    """
+    kept = []
+    strip_next = False
+    for token in tokens:
+        if not is_tag(token):
+            if strip_next:
+                token = token.lstrip("\n")
+                strip_next = not token
+            if token:
+                kept.append(token)
+        elif tag_name_matches(token, tag_names):
+            strip_trailing_text(kept, "\n")
+            strip_next = True
+        else:
+            kept.append(token)
+            strip_next = False
+    return kept
+
+
+def remove_object_id_tokens(tokens):
+    """
+    remove object-id tags and the text in them, if it is all on one line, the same as
+    elifetools utils remove_tag_and_text() does to an XML string
+    """
+    kept = []
+    strip_next = False
+    # indexes of object-id open tags which are not yet closed
+    open_indexes = []
+    for token in tokens:
+        if not is_tag(token):
+            if strip_next:
+                token = token.lstrip("\n")
+                strip_next = not token
+            if token:
+                kept.append(token)
+            continue
+        strip_next = False
+        if token.startswith("<" + OBJECT_ID_TAG_NAME) and "\n" not in token:
+            open_indexes.append(len(kept))
+        elif token == "</%s>" % OBJECT_ID_TAG_NAME:
+            # the first open tag with no new lines between it and this close tag
+            for index in open_indexes:
+                if not any("\n" in kept_token for kept_token in kept[index:]):
+                    del kept[index:]
+                    strip_trailing_text(kept, "\n")
+                    strip_next = True
+                    token = None
+                    break
+            open_indexes = []
+        if token:
+            kept.append(token)
+    return remove_tag_tokens(kept, (OBJECT_ID_TAG_NAME,))
+
+
+def clean_abstract_tokens(tokens):
+    """
+    remove the abstract, xref, ext-link and related-object tags, object-id tags
+    and their text, and comments on one line from the abstract tokens, see
+    generate.clean_abstract()
+    """
+    tokens = remove_tag_tokens(tokens, ABSTRACT_REMOVE_TAG_NAMES)
+    tokens = remove_object_id_tokens(tokens)
+    cleaned = []
+    for token in tokens:
+        if not is_tag(token):
+            append_text(cleaned, token)
+        elif not (token.startswith("<!--") and "\n" not in token):
+            # a comment on more than one line is not removed
+            cleaned.append(token)
+    return cleaned
+
+
+def title_indexes(tokens, start=0):
+    """
+    indexes of the first title open and close tag after start with no new line
+    between them, None if there is no match
+    """
+    for open_index in range(start, len(tokens)):
+        if tokens[open_index] != "<title>":
+            continue
+        for close_index in range(open_index + 1, len(tokens)):
+            if tokens[close_index] == "</title>":
+                break
+            if "\n" in tokens[close_index]:
+                close_index = None
+                break
+        else:
+            close_index = None
+        if close_index is not None:
+            return open_index, close_index
+    return None
+
+
+def abstract_sec_tokens(tokens):
+    "label and list of text tokens of an abstract sec, the tokens after its sec tag"
+    label = ""
+    title = title_indexes(tokens)
+    if title:
+        label = "".join(tokens[title[0] + 1 : title[1]])
+        next_title = title_indexes(tokens, title[1] + 1)
+        if next_title:
+            tokens = tokens[title[1] + 1 : next_title[0]]
+            # the text on the line of the next title is not included
+            while tokens and "\n" not in tokens[-1]:
+                tokens.pop()
+            if tokens:
+                tokens[-1] = tokens[-1][: tokens[-1].rfind("\n") + 1]
+        else:
+            tokens = tokens[title[1] + 1 :]
+    sec_tokens = []
+    for token in remove_tag_tokens(tokens, ABSTRACT_SEC_REMOVE_TAG_NAMES):
+        if is_tag(token):
+            sec_tokens.append(token)
+        else:
+            append_text(sec_tokens, token)
+    strip_trailing_text(sec_tokens)
+    return label, sec_tokens
+
+
+def abstract_paragraph_tokens(tokens, label_types):
+    "label and list of text tokens of an abstract paragraph, the tokens after its p tag"
+    label = ""
+    first = 1 if tokens and not is_tag(tokens[0]) and not tokens[0].strip() else 0
+    if first < len(tokens) and tokens[first] == "<bold>":
+        string = "".join(tokens)
+        label, labelled_string = utils.abstract_part_label(string, label_types)
+        # remove the tokens which come before the label, and the label
+        offset = len(string) - len(labelled_string)
+        for index, token in enumerate(tokens):
+            if offset < len(token):
+                tokens = [token[offset:]] + tokens[index + 1 :]
+                break
+            offset -= len(token)
+        else:
+            tokens = []
+    paragraph_tokens = []
+    for token in tokens:
+        if is_tag(token):
+            if token != "</p>":
+                paragraph_tokens.append(token)
+        else:
+            append_text(paragraph_tokens, token)
+    return label, paragraph_tokens
+
+
+def split_tokens(tokens, split_test):
+    "split a list of tokens into lists of tokens after each one split_test is true for"
+    token_lists = [[]]
+    for token in tokens:
+        if split_test(token):
+            token_lists.append([])
+        else:
+            token_lists[-1].append(token)
+    return token_lists
+
+
+def abstract_text_string(tokens, policy=None):
+    """
+    convert the tokens of an abstract section to an escaped XML string which only
+    includes the allowed tags, the same as generate.set_abstract_text() does
+
+    :param tokens: list of tokens of an abstract section
+    :param policy: MarkupPolicy, defaults to the default MarkupPolicy()
+    """
+    if policy is None:
+        policy = markup_policy()
+    parts = []
+    text = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        index += 1
+        if not is_tag(token):
+            text.append(token)
+            continue
+        if token == "<inline-formula>":
+            try:
+                index = tokens.index("</inline-formula>", index) + 1
+                text.append(MATHML_REPLACEMENT)
+                continue
+            except ValueError:
+                # with no close tag it is not replaced
+                pass
+        token = policy.tag_map.get(token, token)
+        if tag_name_matches(token, ABSTRACT_TEXT_REMOVE_TAG_NAMES):
+            continue
+        if text:
+            parts.append(escape_abstract_text("".join(text)))
+            text = []
+        if tag_name_matches(token, policy.remove_tags):
+            continue
+        if "&" in token:
+            token = etoolsutils.escape_ampersand(token)
+        if not token.startswith(policy.allowed_tags):
+            token = escape_angle_brackets(token)
+        parts.append(token)
+    if text:
+        parts.append(escape_abstract_text("".join(text)))
+    return "".join(parts)
+
+
+def escape_abstract_text(string):
+    "escape ampersands and angle brackets in text of an abstract"
+    string = etoolsutils.escape_ampersand(string)
+    if "<" in string or ">" in string:
+        string = escape_angle_brackets(string)
+    return string
+
+
+def abstract_part_tokens(tokens, label_types):
+    """
+    split the tokens of an abstract into sections, by sec tag if it is structured
+    with titles otherwise by p tag, an unstructured paragraph may start with a label
+
+    :returns: list of tuples of the label and list of text tokens of each section
+    """
+    structured = any(
+        is_tag(token) and token.startswith("<sec") for token in tokens
+    ) and any(is_tag(token) and token.startswith("<title") for token in tokens)
+    if structured:
+        token_lists = split_tokens(
+            tokens, lambda token: is_tag(token) and token.startswith("<sec")
+        )
+        label_token_lists = [
+            abstract_sec_tokens(token_list) for token_list in token_lists
+        ]
+    else:
+        token_lists = split_tokens(tokens, lambda token: token == "<p>")
+        label_token_lists = [
+            abstract_paragraph_tokens(token_list, label_types)
+            for token_list in token_lists
+        ]
+    return [
+        (label, section_tokens)
+        for label, section_tokens in label_token_lists
+        if section_tokens
+    ]
+
+
+def abstract_parts(abstract, label_types):
+    """
+    break apart an abstract XML string into sections with optional labels, the
+    section text is not cleaned or converted
+
+    :param abstract: abstract XML string
+    :param label_types: list of labels which may start an unstructured abstract paragraph
+    :returns: list of OrderedDict with text and label values
+    """
+    parts = []
+    for label, section_tokens in abstract_part_tokens(
+        abstract_tokens(abstract), label_types
+    ):
+        part = OrderedDict()
+        part["text"] = "".join(section_tokens)
+        part["label"] = label
+        parts.append(part)
+    return parts
+
+
+def abstract_sections(abstract, label_types, policy=None):
+    """
+    break apart an abstract XML string into sections with optional labels and the
+    section text converted to an escaped XML string of allowed tags, the abstract is
+    tokenised once, cleaned, split and its sections converted
+
+    :param abstract: abstract XML string
+    :param label_types: list of labels which may start an unstructured abstract paragraph
+    :param policy: MarkupPolicy, defaults to the default MarkupPolicy()
+    :returns: list of OrderedDict with text and label values
+    """
+    sections = []
+    tokens = clean_abstract_tokens(abstract_tokens(abstract))
+    for label, section_tokens in abstract_part_tokens(tokens, label_types):
+        section = OrderedDict()
+        section["text"] = abstract_text_string(section_tokens, policy)
+        section["label"] = label
+        sections.append(section)
+    return sections
@@ -0,0 +1,120 @@
+"""
+Ordered stages which each add their part of a tag, enabled, disabled or reordered
+by the config section, with the time spent in each stage added up as they run
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class StagePipeline:
+    "the stages of a registry to run, in order, leaving out the skipped stages"
+
+    def __init__(self, registry, stage_names=None, skip_stage_names=None):
+        """
+        :param registry: OrderedDict of stage name to stage function
+        :param stage_names: optional list of stage names in the order to run them,
+            all stages of the registry in their registry order by default
+        :param skip_stage_names: optional list of stage names not to run
+        """
+        if stage_names is None:
+            stage_names = list(registry)
+        unknown = [
+            name
+            for name in list(stage_names) + list(skip_stage_names or [])
+            if name not in registry
+        ]
+        if unknown:
+            raise ValueError("unknown stage names %s" % ", ".join(unknown))
+        skip_stage_names = set(skip_stage_names or [])
+        self.stages = tuple(
+            (name, registry.get(name))
+            for name in stage_names
+            if name not in skip_stage_names
+        )
+        self.stage_names = tuple(name for name, _ in self.stages)
+
+    def run(self, *args, timings=None):
+        """
+        call each stage function with the arguments
+
+        :param timings: optional StageTimings to add the time spent in each stage to
+        """
+        if timings is None:
+            for _, stage in self.stages:
+                stage(*args)
+            return
+        elapsed = []
+        if timings.cpu:
+            for name, stage in self.stages:
+                start = time.perf_counter()
+                cpu_start = time.thread_time()
+                stage(*args)
+                elapsed.append(
+                    (
+                        name,
+                        time.perf_counter() - start,
+                        time.thread_time() - cpu_start,
+                    )
+                )
+        else:
+            for name, stage in self.stages:
+                start = time.perf_counter()
+                stage(*args)
+                elapsed.append((name, time.perf_counter() - start, None))
+        timings.add(elapsed)
+
+
+class StageTimings:
+    """
+    total seconds and number of runs of each stage, safe to add to from threads,
+    the CPU time of the thread running each stage is also added up if cpu is True
+    """
+
+    def __init__(self, cpu=False):
+        self.cpu = cpu
+        self.lock = threading.Lock()
+        self.seconds = OrderedDict()
+        self.cpu_seconds = OrderedDict()
+        self.counts = OrderedDict()
+
+    def add(self, elapsed):
+        "add a list of (stage name, seconds, CPU seconds or None) from one pipeline run"
+        with self.lock:
+            for name, seconds, cpu_seconds in elapsed:
+                self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+                self.counts[name] = self.counts.get(name, 0) + 1
+                if cpu_seconds is not None:
+                    self.cpu_seconds[name] = (
+                        self.cpu_seconds.get(name, 0.0) + cpu_seconds
+                    )
+
+    def merge(self, report):
+        "add the totals of a report() of other stage timings, such as a worker's"
+        with self.lock:
+            for name, stage in report.items():
+                self.seconds[name] = self.seconds.get(name, 0.0) + stage.get("seconds")
+                self.counts[name] = self.counts.get(name, 0) + stage.get("count")
+                if "cpu_seconds" in stage:
+                    self.cpu_seconds[name] = self.cpu_seconds.get(
+                        name, 0.0
+                    ) + stage.get("cpu_seconds")
+
+    def report(self):
+        """
+        OrderedDict of stage name to a dict of its total seconds and number of runs,
+        and its total CPU seconds if they are recorded
+        """
+        report = OrderedDict()
+        with self.lock:
+            for name, seconds in self.seconds.items():
+                report[name] = {"seconds": seconds, "count": self.counts.get(name)}
+                if name in self.cpu_seconds:
+                    report[name]["cpu_seconds"] = self.cpu_seconds.get(name)
+        return report
+
+    def clear(self):
+        with self.lock:
+            self.seconds.clear()
+            self.cpu_seconds.clear()
+            self.counts.clear()
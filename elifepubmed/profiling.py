@@ -0,0 +1,111 @@
+"""
+Profile a batch run with cProfile and tracemalloc
+
+The pstats file, a report of the lines allocating the most memory and the peak
+memory used by each article are written to the output folder once the run ends,
+named after the run, for example for a run named elife-pubmed-20170717071707:
+
+    elife-pubmed-20170717071707.prof
+    elife-pubmed-20170717071707-allocations.txt
+    elife-pubmed-20170717071707-memory.json
+"""
+import cProfile
+import json
+import os
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+# number of lines in the allocations report
+TOP_ALLOCATIONS = 25
+
+
+class Profiler:
+    "profile of one run, the articles are profiled one at a time in this process"
+
+    def __init__(self, name, output_dir, top=TOP_ALLOCATIONS):
+        """
+        :param name: name of the run, the start of the output file names
+        :param output_dir: folder to write the output files to
+        :param top: number of lines in the allocations report
+        """
+        self.name = name
+        self.output_dir = output_dir
+        self.top = top
+        self.profile = None
+        self.peak_bytes = 0
+        # peak memory of each article as (article name, bytes) tuples
+        self.article_peaks = []
+
+    @contextmanager
+    def run(self):
+        "profile the code in the with block and then write the output files"
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        try:
+            yield self
+        finally:
+            self.profile.disable()
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            self.write(snapshot)
+
+    @contextmanager
+    def article(self, name):
+        """
+        record the peak memory used by the code in the with block for one article,
+        the memory which was already allocated when it started is not included
+        """
+        self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            self.peak_bytes = max(self.peak_bytes, peak_bytes)
+            self.article_peaks.append((name, peak_bytes - start_bytes))
+
+    def file_path(self, suffix):
+        return os.path.join(self.output_dir, self.name + suffix)
+
+    def write(self, snapshot):
+        "write the pstats, allocations and memory files"
+        self.profile.dump_stats(self.file_path(".prof"))
+        statistics = snapshot.statistics("lineno")
+        with open(self.file_path("-allocations.txt"), "w") as open_file:
+            for statistic in statistics[: self.top]:
+                open_file.write("%s\n" % statistic)
+        memory = OrderedDict(
+            [
+                ("peak_bytes", self.peak_bytes),
+                (
+                    "articles",
+                    [
+                        OrderedDict([("article", name), ("peak_bytes", peak_bytes)])
+                        for name, peak_bytes in self.article_peaks
+                    ],
+                ),
+            ]
+        )
+        with open(self.file_path("-memory.json"), "w") as open_file:
+            json.dump(memory, open_file, indent=4)
+
+
+def run(profiler):
+    "run context manager of the profiler, one doing nothing if it is None"
+    if profiler is None:
+        return nullcontext()
+    return profiler.run()
+
+
+def article(profiler, name):
+    "article context manager of the profiler, one doing nothing if it is None"
+    if profiler is None:
+        return nullcontext()
+    return profiler.article(name)
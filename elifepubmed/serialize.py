@@ -0,0 +1,98 @@
+"""
+Serialise ElementTree tags to PubMed XML bytes
+
+The output format is the same as the xml.dom.minidom toxml() and toprettyxml()
+output PubMed deposits have always been made with, but it is written directly
+from the ElementTree tags without parsing them again
+"""
+from xml.etree.ElementTree import Comment
+
+ENCODING = "utf-8"
+
+ROOT_TAG_NAME = "ArticleSet"
+
+
+def escape_data(string):
+    "escape a text or attribute value the same as xml.dom.minidom"
+    if "&" in string:
+        string = string.replace("&", "&amp;")
+    if "<" in string:
+        string = string.replace("<", "&lt;")
+    if '"' in string:
+        string = string.replace('"', "&quot;")
+    if ">" in string:
+        string = string.replace(">", "&gt;")
+    return string
+
+
+def escape_text(string):
+    "escape a text value, line endings are normalised as an XML parser would"
+    if "\r" in string:
+        string = string.replace("\r\n", "\n").replace("\r", "\n")
+    return escape_data(string)
+
+
+def xml_declaration(newl=""):
+    return '<?xml version="1.0" encoding="%s"?>%s' % (ENCODING, newl)
+
+
+def doctype(qualified_name, public_id=None, system_id=None, newl=""):
+    "DOCTYPE string with double quoted identifiers"
+    parts = ["<!DOCTYPE ", qualified_name]
+    if public_id:
+        parts.append('%s PUBLIC "%s"%s  "%s"' % (newl, public_id, newl, system_id))
+    elif system_id:
+        parts.append('%s SYSTEM "%s"' % (newl, system_id))
+    parts.append(">" + newl)
+    return "".join(parts)
+
+
+def xml_header(public_id=None, system_id=None, pretty=False):
+    "XML declaration and DOCTYPE which come before the ArticleSet tag"
+    newl = "\n" if pretty else ""
+    return xml_declaration(newl) + doctype(ROOT_TAG_NAME, public_id, system_id, newl)
+
+
+def write_element(parts, element, indent="", addindent="", newl=""):
+    "append the strings of the serialised element and its children to the parts list"
+    if element.tag is Comment:
+        parts.append("%s<!--%s-->%s" % (indent, element.text, newl))
+        return
+    parts.append(indent + "<" + element.tag)
+    for name, value in element.items():
+        parts.append(' %s="%s"' % (name, escape_data(value)))
+    text = element.text
+    if not len(element):
+        if not text:
+            parts.append("/>" + newl)
+            return
+        # a single text node is not indented
+        parts.append(">" + escape_text(text))
+    else:
+        parts.append(">" + newl)
+        child_indent = indent + addindent
+        if text:
+            parts.append(child_indent + escape_text(text) + newl)
+        for child in element:
+            write_element(parts, child, child_indent, addindent, newl)
+            if child.tail:
+                parts.append(child_indent + escape_text(child.tail) + newl)
+        parts.append(indent)
+    parts.append("</%s>%s" % (element.tag, newl))
+
+
+def element_xml(element, pretty=False, indent="", level=0):
+    "serialise the element as bytes, when pretty it is indented to the nesting level"
+    parts = []
+    if pretty is True:
+        write_element(parts, element, indent * level, indent, "\n")
+    else:
+        write_element(parts, element)
+    return "".join(parts).encode(ENCODING, "xmlcharrefreplace")
+
+
+def output_xml(root, public_id=None, system_id=None, pretty=False, indent=""):
+    "serialise the root element as a complete XML document in bytes"
+    return xml_header(public_id, system_id, pretty).encode(ENCODING) + element_xml(
+        root, pretty, indent
+    )
@@ -1,6 +1,7 @@
 import re
+import threading
 from collections import OrderedDict
-from elifetools import utils as etoolsutils
+from functools import lru_cache
 from elifearticle import utils as eautils
 
 
@@ -12,48 +13,63 @@ TAG_REPLACEMENT_MAP = OrderedDict(
     ]
 )
 
+# number of distinct names to keep cached results of name formatting functions
+NAME_CACHE_SIZE = 8192
+
+# match over newlines with DOTALL for kitchen sink testing and if found in real articles
+MATHML_PATTERN = re.compile(r"<inline-formula>(.*?)</inline-formula>", re.DOTALL)
+
+# match if there is whitespace to the right of the content
+INITIALS_R_SPACE_PATTERN = re.compile(r"(?P<content>[A-Z]{2,})(?P<r_space>\s+)")
+# match if there is whitespace to the left of the content
+INITIALS_L_SPACE_PATTERN = re.compile(r"(?P<l_space>\s+)(?P<content>[A-Z]{2,})")
+# match if there is not whitepsace but it is all upper case characters
+INITIALS_EXACT_PATTERN = re.compile(r"^(?P<content>[A-Z]{2,})$")
+
+ABSTRACT_LABEL_PATTERN = re.compile(r"^<bold>(.*?)</bold>.*$", re.MULTILINE)
+
+
+ALLOWED_TAGS = (
+    "<i>",
+    "</i>",
+    "<italic>",
+    "</italic>",
+    "<b>",
+    "</b>",
+    "<bold>",
+    "</bold>",
+    "<sup>",
+    "</sup>",
+    "<sub>",
+    "</sub>",
+    "<u>",
+    "</u>",
+    "<underline>",
+    "</underline>",
+    "<p>",
+    "</p>",
+)
+
+# note: uses set comprehension syntax when removing duplicate values
+ALLOWED_TAG_NAMES = tuple(sorted({re.sub(r"[<>/]", "", tag) for tag in ALLOWED_TAGS}))
+
 
 def allowed_tags():
     "tuple of whitelisted tags"
-    return (
-        "<i>",
-        "</i>",
-        "<italic>",
-        "</italic>",
-        "<b>",
-        "</b>",
-        "<bold>",
-        "</bold>",
-        "<sup>",
-        "</sup>",
-        "<sub>",
-        "</sub>",
-        "<u>",
-        "</u>",
-        "<underline>",
-        "</underline>",
-        "<p>",
-        "</p>",
-    )
+    return ALLOWED_TAGS
 
 
 def allowed_tag_names():
     "only tag names of allow_tags sorted with no duplicates"
-    # note: uses set comprehension syntax when removing duplicate values
-    return list(sorted({re.sub(r"[<>/]", "", tag) for tag in allowed_tags()}))
+    return list(ALLOWED_TAG_NAMES)
 
 
 def replace_mathml_tags(string, replacement="[Formula: see text]"):
-    if not string:
+    if not string or "<inline-formula>" not in string:
         return string
-    # match over newlines with DOTALL for kitchen sink testing and if found in real articles
-    for tag_match in re.finditer(
-        r"<inline-formula>(.*?)</inline-formula>", string, re.DOTALL
-    ):
-        tag_content = tag_match.group(1)
-        old_tag = "<inline-formula>" + tag_content + "</inline-formula>"
-        string = string.replace(old_tag, replacement)
-    return string
+    # replace all the matches in one pass, a function is the replacement value
+    #  so any backslashes in the replacement string are not treated as escapes
+    return MATHML_PATTERN.sub(lambda tag_match: replacement, string)
 
 
 def replace_inline_tags(string, tag_map=None):
@@ -75,45 +91,112 @@ def compare_values(value1, value2, case_sensitive):
     return bool(value1.lower() == value2.lower())
 
 
-def pubmed_publication_type(article_type, display_channel, types_map):
-    "use the publication_types map to determine which PubMed value"
-    if types_map:
-        for match in types_map:
-            # return the first match that matches all the required values
+DEFAULT_PUBLICATION_TYPE = "Journal Article"
+
+# number of compiled publication_types maps to keep
+PUBLICATION_TYPE_MATCHER_CACHE_SIZE = 32
+
+PUBLICATION_TYPE_MATCHERS = OrderedDict()
+
+PUBLICATION_TYPE_MATCHERS_LOCK = threading.Lock()
+
+
+class PublicationTypeMatcher:
+    """
+    publication_types rules compiled into dict indexes keyed on the normalised
+    article_type and display_channel, the first rule that matches is used
+    """
+
+    def __init__(self, types_map):
+        # indexes keyed on a case_sensitive bool, values are the first rule position
+        # and its publication_type
+        self.article_type_display_channel = {True: {}, False: {}}
+        self.article_type = {True: {}, False: {}}
+        self.display_channel = {True: {}, False: {}}
+        self.results = {}
+        for position, match in enumerate(types_map or []):
             # if there is not publication_type then skip the match
             if not match.get("publication_type"):
                 continue
-            match_count = 0
-            match_count_required = None
-            # how many elements must we match on to return a value
-            if match.get("article_type") and match.get("display_channel"):
-                match_count_required = 2
-            elif match.get("article_type") or match.get("display_channel"):
-                match_count_required = 1
-            # look for matches
-            if (
-                compare_values(
-                    match.get("article_type"), article_type, match.get("case_sensitive")
+            case_sensitive = bool(match.get("case_sensitive"))
+            article_type = match.get("article_type")
+            display_channel = match.get("display_channel")
+            if not case_sensitive:
+                article_type = article_type.lower() if article_type else None
+                display_channel = display_channel.lower() if display_channel else None
+            if article_type and display_channel:
+                index = self.article_type_display_channel.get(case_sensitive)
+                key = (article_type, display_channel)
+            elif article_type:
+                index = self.article_type.get(case_sensitive)
+                key = article_type
+            elif display_channel:
+                index = self.display_channel.get(case_sensitive)
+                key = display_channel
+            else:
+                continue
+            if key not in index:
+                index[key] = (position, match.get("publication_type"))
+
+    def match(self, article_type, display_channel):
+        "publication_type of the first rule matching the values, or the default"
+        key = (article_type, display_channel)
+        if key not in self.results:
+            self.results[key] = self.first_match(article_type, display_channel)
+        return self.results.get(key)
+
+    def first_match(self, article_type, display_channel):
+        matches = []
+        if article_type and display_channel:
+            matches.append(
+                self.article_type_display_channel.get(True).get(
+                    (article_type, display_channel)
                 )
-                is True
-            ):
-                match_count = match_count + 1
-            if (
-                compare_values(
-                    match.get("display_channel"),
-                    display_channel,
-                    match.get("case_sensitive"),
+            )
+            matches.append(
+                self.article_type_display_channel.get(False).get(
+                    (article_type.lower(), display_channel.lower())
                 )
-                is True
-            ):
-                match_count = match_count + 1
-            # final check to return
-            if match_count == match_count_required:
-                return match.get("publication_type")
+            )
+        if article_type:
+            matches.append(self.article_type.get(True).get(article_type))
+            matches.append(self.article_type.get(False).get(article_type.lower()))
+        if display_channel:
+            matches.append(self.display_channel.get(True).get(display_channel))
+            matches.append(self.display_channel.get(False).get(display_channel.lower()))
+        matches = [match for match in matches if match]
+        if matches:
+            return min(matches)[1]
+        return DEFAULT_PUBLICATION_TYPE
+
+
+def publication_type_matcher(types_map):
+    """
+    compiled PublicationTypeMatcher for the types_map list, reused for the same list,
+    a reference to the list is kept so it is not garbage collected while it is cached
+    """
+    key = id(types_map)
+    with PUBLICATION_TYPE_MATCHERS_LOCK:
+        cached = PUBLICATION_TYPE_MATCHERS.get(key)
+        if cached and cached[0] is types_map:
+            PUBLICATION_TYPE_MATCHERS.move_to_end(key)
+            return cached[1]
+        matcher = PublicationTypeMatcher(types_map)
+        PUBLICATION_TYPE_MATCHERS[key] = (types_map, matcher)
+        if len(PUBLICATION_TYPE_MATCHERS) > PUBLICATION_TYPE_MATCHER_CACHE_SIZE:
+            PUBLICATION_TYPE_MATCHERS.popitem(last=False)
+    return matcher
+
+
+def pubmed_publication_type(article_type, display_channel, types_map):
+    "use the publication_types map to determine which PubMed value"
+    if types_map:
+        return publication_type_matcher(types_map).match(article_type, display_channel)
     # default
-    return "Journal Article"
+    return DEFAULT_PUBLICATION_TYPE
 
 
+@lru_cache(maxsize=NAME_CACHE_SIZE)
 def contributor_initials(surname, given_name):
     "a simple author initials format"
     return "".join([value[0] for value in [given_name, surname] if value is not None])
@@ -128,20 +211,15 @@ def expand_initial_match_string(match):
     return " ".join(match.group("content")[:])
 
 
+@lru_cache(maxsize=NAME_CACHE_SIZE)
 def separate_initials(given_name):
     "add spaces between initials of a first name value"
     if not given_name:
         return ""
-    # match if there is whitespace to the right of the content
-    match_pattern_r_space = re.compile(r"(?P<content>[A-Z]{2,})(?P<r_space>\s+)")
-    # match if there is whitespace to the left of the content
-    match_pattern_l_space = re.compile(r"(?P<l_space>\s+)(?P<content>[A-Z]{2,})")
-    # match if there is not whitepsace but it is all upper case characters
-    match_pattern_exact = re.compile(r"^(?P<content>[A-Z]{2,})$")
     # use a text munging function to separate capital letters matched in the regular expression
-    given_name = match_pattern_r_space.sub(expand_initial_match_string, given_name)
-    given_name = match_pattern_l_space.sub(expand_initial_match_string, given_name)
-    given_name = match_pattern_exact.sub(expand_initial_match_string, given_name)
+    given_name = INITIALS_R_SPACE_PATTERN.sub(expand_initial_match_string, given_name)
+    given_name = INITIALS_L_SPACE_PATTERN.sub(expand_initial_match_string, given_name)
+    given_name = INITIALS_EXACT_PATTERN.sub(expand_initial_match_string, given_name)
     return given_name
 
 
@@ -167,9 +245,7 @@ def abstract_part_label(string, label_types):
     "look for a label for part of an abstract and return the string without the label"
     label = ""
     if string.lstrip().startswith("<bold>"):
-        for tag_match in re.finditer(
-            r"^<bold>(.*?)</bold>.*$", string.lstrip(), re.MULTILINE
-        ):
+        for tag_match in ABSTRACT_LABEL_PATTERN.finditer(string.lstrip()):
             matched = tag_match.group(1)
             if matched.rstrip() in label_types:
                 first_section = "<bold>{matched}</bold>".format(matched=matched)
@@ -177,55 +253,3 @@ def abstract_part_label(string, label_types):
                 # to support multiple lines, just strip the first_section from the original string
                 string = string.split(first_section)[-1]
     return label, string
-
-
-def abstract_paragraph(string, label_types):
-    "parse an abstract paragraph into section data"
-    part = OrderedDict()
-    label, string = abstract_part_label(string, label_types)
-    text = string.replace("</p>", "")
-    if text != "":
-        part["text"] = text
-        part["label"] = label
-    return part
-
-
-def abstract_sec_parts(string):
-    label = ""
-    if string:
-        parts = re.split(r".*?<title>(.*?)</title>", string)
-        label = parts[1]
-        string = parts[2]
-    return label, string
-
-
-def abstract_sec(string):
-    "parse an abstract sec tag into section data"
-    part = OrderedDict()
-    label, string = abstract_sec_parts(string.rstrip())
-    string = etoolsutils.remove_tag("p", string)
-    string = etoolsutils.remove_tag("sec", string)
-    string = string.rstrip()
-    if string != "":
-        part["text"] = string
-        part["label"] = label
-    return part
-
-
-def abstract_parts(abstract, label_types):
-    "break apart an abstract into sections with optional labels"
-    parts = []
-    if not abstract:
-        return parts
-    # check for structured abstract
-    if "<sec" in abstract and "<title" in abstract:
-        for a_sec in abstract.split("<sec"):
-            part = abstract_sec(a_sec)
-            if part:
-                parts.append(part)
-    else:
-        for a_section in abstract.split("<p>"):
-            part = abstract_paragraph(a_section, label_types)
-            if part:
-                parts.append(part)
-    return parts
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from elifearticle.article import Article
+from elifepubmed import cache
+
+
+def write_file(path, content):
+    with open(path, "w") as open_file:
+        open_file.write(content)
+
+
+class TestArticleCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        self.article_xml = os.path.join(self.tmp_dir.name, "elife-00666-v1.xml")
+        write_file(self.article_xml, "<article/>")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key(self):
+        "the key changes with the file content, file name and options"
+        key = cache.ArticleCache.key(self.article_xml, {"fast": True})
+        self.assertEqual(cache.ArticleCache.key(self.article_xml, {"fast": True}), key)
+        self.assertNotEqual(
+            cache.ArticleCache.key(self.article_xml, {"fast": False}), key
+        )
+        write_file(self.article_xml, "<article></article>")
+        self.assertNotEqual(
+            cache.ArticleCache.key(self.article_xml, {"fast": True}), key
+        )
+        other_xml = os.path.join(self.tmp_dir.name, "elife-00666-v2.xml")
+        write_file(other_xml, "<article/>")
+        write_file(self.article_xml, "<article/>")
+        self.assertNotEqual(cache.ArticleCache.key(other_xml, {"fast": True}), key)
+
+    def test_get_put(self):
+        article_cache = cache.ArticleCache(self.cache_dir)
+        key = article_cache.key(self.article_xml)
+        self.assertIsNone(article_cache.get(key))
+        article_cache.put(key, Article("10.7554/eLife.00666", "Title"))
+        self.assertEqual(article_cache.get(key).doi, "10.7554/eLife.00666")
+        # entries are read from the folder by a new cache
+        article_cache = cache.ArticleCache(self.cache_dir)
+        self.assertEqual(article_cache.get(key).title, "Title")
+        self.assertEqual((article_cache.hits, article_cache.misses), (1, 0))
+        article_cache.clear()
+        self.assertIsNone(article_cache.get(key))
+        self.assertEqual(article_cache.size(), 0)
+
+    def test_unreadable_entry(self):
+        article_cache = cache.ArticleCache(self.cache_dir)
+        write_file(article_cache.file_path("key"), "not a pickle")
+        self.assertIsNone(article_cache.get("key"))
+        self.assertFalse(os.path.exists(article_cache.file_path("key")))
+
+    def test_evict(self):
+        "the least recently used entries are removed over the maximum size"
+        article_cache = cache.ArticleCache(self.cache_dir)
+        article_cache.put("one", Article("10.7554/eLife.00001", "One"))
+        # room for two entries
+        article_cache.max_bytes = article_cache.size() * 2 + 16
+        article_cache.put("two", Article("10.7554/eLife.00002", "Two"))
+        self.assertIsNotNone(article_cache.get("one"))
+        article_cache.put("three", Article("10.7554/eLife.00003", "Three"))
+        self.assertIsNone(article_cache.get("two"))
+        self.assertIsNotNone(article_cache.get("one"))
+        self.assertIsNotNone(article_cache.get("three"))
+
+    def test_version(self):
+        "entries are removed when the version stamp changes"
+        article_cache = cache.ArticleCache(self.cache_dir)
+        article_cache.put("one", Article("10.7554/eLife.00001", "One"))
+        with patch("elifepubmed.cache.version_stamp", return_value="other"):
+            article_cache = cache.ArticleCache(self.cache_dir)
+        self.assertIsNone(article_cache.get("one"))
+
+
+class TestFragmentCache(unittest.TestCase):
+    def test_fragment_key(self):
+        "the key changes with the article data, config, pub date and options"
+        pub_date = time.strptime("2017-07-17", "%Y-%m-%d")
+        article = Article("10.7554/eLife.00666", "Title")
+        key = cache.fragment_key(article, "elife", {}, pub_date, {"pretty": False})
+        self.assertEqual(
+            cache.fragment_key(
+                Article("10.7554/eLife.00666", "Title"),
+                "elife",
+                {},
+                pub_date,
+                {"pretty": False},
+            ),
+            key,
+        )
+        for changed_key in [
+            cache.fragment_key(
+                Article("10.7554/eLife.00666", "Title 2"),
+                "elife",
+                {},
+                pub_date,
+                {"pretty": False},
+            ),
+            cache.fragment_key(article, "pb", {}, pub_date, {"pretty": False}),
+            cache.fragment_key(
+                article, "elife", {"language": "FR"}, pub_date, {"pretty": False}
+            ),
+            cache.fragment_key(
+                article,
+                "elife",
+                {},
+                time.strptime("2017-07-18", "%Y-%m-%d"),
+                {"pretty": False},
+            ),
+            cache.fragment_key(article, "elife", {}, pub_date, {"pretty": True}),
+        ]:
+            self.assertNotEqual(changed_key, key)
+
+    def test_fragment_key_pub_date(self):
+        "only the day of the pub date is part of the key, the time is not in the tag"
+        article = Article("10.7554/eLife.00666", "Title")
+        self.assertEqual(
+            cache.fragment_key(
+                article,
+                "elife",
+                {},
+                time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S"),
+            ),
+            cache.fragment_key(
+                article,
+                "elife",
+                {},
+                time.strptime("2017-07-17 18:00:00", "%Y-%m-%d %H:%M:%S"),
+            ),
+        )
+
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fragment_cache = cache.FragmentCache(cache_dir)
+            self.assertFalse(fragment_cache.contains("key"))
+            self.assertIsNone(fragment_cache.get("key"))
+            fragment_cache.put("key", b"<Article/>")
+            self.assertTrue(fragment_cache.contains("key"))
+            self.assertEqual(fragment_cache.get("key"), b"<Article/>")
+
+
+if __name__ == "__main__":
+    unittest.main()
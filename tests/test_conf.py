@@ -0,0 +1,87 @@
+import unittest
+import os
+import shutil
+import tempfile
+from elifepubmed import conf
+
+
+class TestLoadConfig(unittest.TestCase):
+    def setUp(self):
+        conf.clear_config_cache()
+
+    def tearDown(self):
+        conf.clear_config_cache()
+        if "test_yaml" in conf.config:
+            conf.config.remove_section("test_yaml")
+
+    def test_load_config(self):
+        "config is the same as parsing the raw config and is parsed once"
+        pubmed_config = conf.load_config("elife")
+        self.assertEqual(pubmed_config, conf.parse_raw_config(conf.config["elife"]))
+        self.assertIs(
+            conf.load_config("elife").get("publication_types"),
+            pubmed_config.get("publication_types"),
+        )
+        # a copy of the dict is returned
+        pubmed_config["language"] = "FR"
+        self.assertEqual(conf.load_config("elife").get("language"), "EN")
+        # and of its nested values
+        pubmed_config.get("author_contrib_types").append("editor")
+        pubmed_config.get("markup_tag_replacements")["italic"] = "em"
+        self.assertEqual(
+            conf.load_config("elife"), conf.parse_raw_config(conf.config["elife"])
+        )
+
+    def test_load_config_markup(self):
+        "markup tag replacements are parsed in the order they are in the config"
+        pubmed_config = conf.load_config("elife")
+        self.assertEqual(
+            list(pubmed_config.get("markup_tag_replacements").items()),
+            [("italic", "i"), ("bold", "b"), ("underline", "u")],
+        )
+        self.assertEqual(pubmed_config.get("markup_remove_tags"), ["sc"])
+
+    def test_load_config_missing_section(self):
+        with self.assertRaises(KeyError):
+            conf.load_config("not_a_section")
+
+    def test_load_config_yaml_modified(self):
+        "YAML file is parsed again after it is modified"
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        yaml_file = os.path.join(tmp_dir.name, "test_publication_types.yaml")
+        shutil.copyfile(conf.config["DEFAULT"].get("publication_types"), yaml_file)
+        conf.config["test_yaml"] = {"publication_types": yaml_file}
+        publication_types = conf.load_config("test_yaml").get("publication_types")
+        self.assertTrue(len(publication_types) > 1)
+        with open(yaml_file, "w") as open_file:
+            open_file.write(
+                "- article_type: editorial\n  publication_type: Editorial\n"
+            )
+        stat = os.stat(yaml_file)
+        os.utime(yaml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(
+            conf.load_config("test_yaml").get("publication_types"),
+            [{"article_type": "editorial", "publication_type": "Editorial"}],
+        )
+
+    def test_preload_config(self):
+        conf.preload_config()
+        self.assertEqual(
+            sorted(conf.CONFIG_CACHE.keys()), sorted(conf.config.sections())
+        )
+
+    def test_override_config(self):
+        "override values of a config file section and set a new section"
+        conf.load_config("pb")
+        conf.override_config("pb", {"language": "FR"})
+        self.assertEqual(conf.load_config("pb").get("language"), "FR")
+        self.assertEqual(conf.load_config("pb").get("batch_file_prefix"), "pb-pubmed-")
+        conf.override_config("new_journal", {"batch_file_prefix": "new-pubmed-"})
+        pubmed_config = conf.load_config("new_journal")
+        self.assertEqual(pubmed_config.get("batch_file_prefix"), "new-pubmed-")
+        self.assertEqual(pubmed_config.get("author_contrib_types"), ["author"])
+
+
+if __name__ == "__main__":
+    unittest.main()
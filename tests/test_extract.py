@@ -0,0 +1,100 @@
+import os
+import time
+import unittest
+from xml.parsers import expat
+from elifearticle import parse
+from elifepubmed import extract, generate
+from elifepubmed.conf import load_config
+
+
+TEST_DATA_PATH = (
+    os.path.dirname(os.path.abspath(__file__)) + os.sep + "test_data" + os.sep
+)
+
+
+class TestPrune(unittest.TestCase):
+    def test_prune(self):
+        "body content, sub-articles and references other than data are removed"
+        xml = (
+            b'<?xml version="1.0"?><article><front><title>A &amp; B</title></front>'
+            b'<body attr="x>y"><sec><p>Text</p></sec></body>'
+            b"<back><ref-list>"
+            b'<ref id="bib1"><element-citation publication-type="journal">'
+            b"<source>Journal</source></element-citation></ref>"
+            b'<ref id="bib2"><element-citation publication-type="data">'
+            b"<source>Dryad</source></element-citation></ref>"
+            b'<ref id="bib3"/>'
+            b"</ref-list></back>"
+            b"<sub-article><body><p>Decision letter</p></body></sub-article>"
+            b"</article>"
+        )
+        self.assertEqual(
+            extract.prune(xml),
+            b'<?xml version="1.0"?><article><front><title>A &amp; B</title></front>'
+            b'<body attr="x>y"></body>'
+            b"<back><ref-list>"
+            b'<ref id="bib2"><element-citation publication-type="data">'
+            b"<source>Dryad</source></element-citation></ref>"
+            b"</ref-list></back>"
+            b"</article>",
+        )
+
+    def test_prune_poa(self):
+        "a PoA article has no body tag and an empty body tag is kept"
+        self.assertEqual(
+            extract.prune(b"<article><front/></article>"),
+            b"<article><front/></article>",
+        )
+        self.assertEqual(
+            extract.prune(b"<article><body/></article>"), b"<article><body/></article>"
+        )
+
+    def test_prune_not_well_formed(self):
+        with self.assertRaises(expat.ExpatError):
+            extract.prune(b"<article><body></article>")
+
+
+class TestBuildArticleFromXml(unittest.TestCase):
+    def test_build_article_from_xml(self):
+        "the PubMed XML of a fast parsed article is the same"
+        pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+        for config_section, article_xml_file in [
+            ("elife", "elife-02935-v2.xml"),
+            ("elife", "elife_poa_e12717.xml"),
+            ("bmjopen", "bmjopen-4-e003269.xml"),
+            ("pb", "pb369-jats.xml"),
+        ]:
+            pubmed_config = load_config(config_section)
+            article_xml = TEST_DATA_PATH + article_xml_file
+            article, error_count = parse.build_article_from_xml(
+                article_xml,
+                "full",
+                pubmed_config.get("build_parts"),
+                pubmed_config.get("remove_tags"),
+            )
+            fast_article, fast_error_count = extract.build_article_from_xml(
+                article_xml,
+                "full",
+                pubmed_config.get("build_parts"),
+                pubmed_config.get("remove_tags"),
+            )
+            self.assertEqual(fast_error_count, error_count)
+            self.assertEqual(fast_article.version, article.version)
+            self.assertEqual(fast_article.is_poa, article.is_poa)
+            self.assertEqual(
+                [ref.publication_type for ref in fast_article.ref_list],
+                [
+                    ref.publication_type
+                    for ref in article.ref_list
+                    if ref.publication_type == "data"
+                ],
+            )
+            generator = generate.PubMedGenerator(config_section)
+            self.assertEqual(
+                generator.generate([fast_article], pub_date, False),
+                generator.generate([article], pub_date, False),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
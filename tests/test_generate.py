@@ -1,11 +1,26 @@
 import unittest
+import hashlib
+import json
+import tempfile
 import time
 import os
+import io
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch
+from collections import OrderedDict
 from xml.etree.ElementTree import Element
 from xml.etree import ElementTree
 from elifearticle.article import Article, Citation, ClinicalTrial, Dataset
-from elifepubmed import generate
-from elifepubmed.conf import config, parse_raw_config
+from elifepubmed import cache, generate, instrument, ledger
+from elifepubmed.conf import (
+    clear_config_cache,
+    config,
+    load_config,
+    override_config,
+    parse_raw_config,
+)
 
 
 TEST_BASE_PATH = os.path.dirname(os.path.abspath(__file__)) + os.sep
@@ -19,6 +34,12 @@ def read_file_content(file_name):
 
 
 class TestGenerate(unittest.TestCase):
+    def written_files(self, file_paths):
+        "the paths of the files written, which are removed once the test ends"
+        for file_path in file_paths:
+            self.addCleanup(os.remove, file_path)
+        return file_paths
+
     def setUp(self):
         self.passes = []
         self.default_pub_date = time.strptime(
@@ -159,14 +180,763 @@ class TestGenerate(unittest.TestCase):
             article_xmls=[file_path], config_section=config_section
         )
         # generate and write to disk
-        generate.pubmed_xml_to_disk(articles, config_section, pub_date, False, True)
+        file_paths = self.written_files(
+            generate.pubmed_xml_to_disk(articles, config_section, pub_date, False, True)
+        )
+        self.assertEqual(file_paths, [generate.TMP_DIR + pubmed_xml_file])
         # check the output matches
         with open(TEST_DATA_PATH + pubmed_xml_file, "rb") as file_p:
             expected_output = file_p.read()
-        with open(generate.TMP_DIR + pubmed_xml_file, "rb") as file_p:
+        with open(file_paths[0], "rb") as file_p:
             generated_output = file_p.read()
         self.assertEqual(generated_output, expected_output)
 
+    def test_write_pubmed_xml(self):
+        "streamed output matches the fixtures and the in memory output"
+        for (
+            article_xml_file,
+            pubmed_xml_file,
+            config_section,
+            pub_date,
+        ) in self.passes:
+            file_path = TEST_DATA_PATH + article_xml_file
+            articles = generate.build_articles_for_pubmed(
+                article_xmls=[file_path], config_section=config_section
+            )
+            open_file = io.BytesIO()
+            p_xml = generate.write_pubmed_xml(
+                articles, open_file, config_section, pub_date, False, pretty=True
+            )
+            self.assertEqual(
+                open_file.getvalue(),
+                read_file_content(TEST_DATA_PATH + pubmed_xml_file),
+            )
+            self.assertEqual(p_xml.batch_id + ".xml", pubmed_xml_file)
+            self.assertEqual(p_xml.article_count, 1)
+            # compact output
+            open_file = io.BytesIO()
+            generate.write_pubmed_xml(
+                articles, open_file, config_section, pub_date, False
+            )
+            self.assertEqual(
+                open_file.getvalue(),
+                generate.pubmed_xml(articles, config_section, pub_date, False),
+            )
+
+    def test_write_pubmed_xml_generator(self):
+        "stream articles from a generator, with the comment and no articles"
+        config_section = "elife"
+        file_path = TEST_DATA_PATH + "elife-15743-v1.xml"
+        articles = generate.build_articles_for_pubmed(
+            article_xmls=[file_path], config_section=config_section
+        )
+        open_file = io.BytesIO()
+        p_xml = generate.write_pubmed_xml(
+            (article for article in articles * 2),
+            open_file,
+            config_section,
+            self.default_pub_date,
+        )
+        self.assertEqual(p_xml.batch_id, "elife-pubmed-20170717071707")
+        self.assertEqual(p_xml.article_count, 2)
+        output = open_file.getvalue()
+        self.assertTrue(output.startswith(b'<?xml version="1.0" encoding="utf-8"?>'))
+        self.assertTrue(b"<ArticleSet><!--generated by " in output)
+        self.assertEqual(output.count(b"<Article>"), 2)
+        self.assertTrue(output.endswith(b"</Article></ArticleSet>"))
+        self.assertEqual(len(p_xml.root), 1)
+        # no articles and no comment
+        open_file = io.BytesIO()
+        generate.write_pubmed_xml([], open_file, config_section, add_comment=False)
+        self.assertTrue(open_file.getvalue().endswith(b"<ArticleSet/>"))
+
+    def test_pubmed_xml_to_disk_stream(self):
+        "test streaming to disk matches the fixture"
+        article_xml_file = "elife-02935-v2.xml"
+        pubmed_xml_file = "elife-pubmed-02935-20170717071707.xml"
+        config_section = "elife"
+        file_path = TEST_DATA_PATH + article_xml_file
+        articles = generate.build_articles_for_pubmed(
+            article_xmls=[file_path], config_section=config_section
+        )
+        file_paths = self.written_files(
+            generate.pubmed_xml_to_disk(
+                articles,
+                config_section,
+                self.default_pub_date,
+                False,
+                True,
+                stream=True,
+            )
+        )
+        self.assertEqual(file_paths, [generate.TMP_DIR + pubmed_xml_file])
+        self.assertEqual(
+            read_file_content(file_paths[0]),
+            read_file_content(TEST_DATA_PATH + pubmed_xml_file),
+        )
+
+    def test_pubmed_xml_to_disk_instrumentation(self):
+        "the phases, stages and articles of a batch are recorded without changing it"
+        pubmed_xml_file = "elife-pubmed-02935-20170717071707.xml"
+        instrumentation = instrument.Instrumentation()
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-02935-v2.xml"],
+            "elife",
+            instrumentation=instrumentation,
+        )
+        file_paths = self.written_files(
+            generate.pubmed_xml_to_disk(
+                articles,
+                "elife",
+                self.default_pub_date,
+                False,
+                True,
+                instrumentation=instrumentation,
+            )
+        )
+        self.assertEqual(file_paths, [generate.TMP_DIR + pubmed_xml_file])
+        expected_output = read_file_content(TEST_DATA_PATH + pubmed_xml_file)
+        self.assertEqual(read_file_content(file_paths[0]), expected_output)
+        measurements = instrumentation.as_dict()
+        self.assertEqual(
+            list(measurements.get("phases")), ["parse", "build", "serialise", "write"]
+        )
+        self.assertEqual(measurements.get("stages").get("journal").get("count"), 1)
+        self.assertEqual(
+            [article.get("doi") for article in measurements.get("articles")],
+            ["10.7554/eLife.02935"],
+        )
+        counters = measurements.get("counters")
+        self.assertEqual(counters.get("articles"), 1)
+        self.assertEqual(counters.get("output_bytes"), len(expected_output))
+        self.assertEqual(
+            counters.get("elements"),
+            len(ElementTree.fromstring(expected_output).find("Article").findall(".//*"))
+            + 1,
+        )
+
+    def test_pubmed_xml_to_disk_ledger(self):
+        "articles are recorded in the ledger and unchanged articles can be left out"
+        pubmed_xml_file = "elife-pubmed-02935-20170717071707.xml"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-02935-v2.xml"], "elife"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ledger.DepositLedger(
+                os.path.join(tmp_dir, "ledger.sqlite")
+            ) as deposit_ledger:
+                file_paths = generate.pubmed_xml_to_disk(
+                    articles,
+                    "elife",
+                    self.default_pub_date,
+                    False,
+                    True,
+                    ledger=deposit_ledger,
+                    changed_only=True,
+                )
+                self.assertEqual(file_paths, [generate.TMP_DIR + pubmed_xml_file])
+                self.assertEqual(
+                    read_file_content(file_paths[0]),
+                    read_file_content(TEST_DATA_PATH + pubmed_xml_file),
+                )
+                deposit = deposit_ledger.last_deposit(
+                    articles[0].doi, articles[0].version
+                )
+                self.assertEqual(
+                    deposit.get("batch_id"), pubmed_xml_file.replace(".xml", "")
+                )
+                self.assertEqual(
+                    deposit.get("article_key"),
+                    generate.fragment_key(
+                        articles[0],
+                        "elife",
+                        load_config("elife"),
+                        self.default_pub_date,
+                    ),
+                )
+                # the hash of the Article tag as it was written
+                fragment = next(
+                    generate.PubMedGenerator("elife").iter_fragments(
+                        articles, self.default_pub_date, pretty=True
+                    )
+                )
+                self.assertEqual(
+                    deposit.get("content_hash"), hashlib.sha256(fragment).hexdigest()
+                )
+                # nothing is built or written when no article has changed
+                os.remove(generate.TMP_DIR + pubmed_xml_file)
+                with patch.object(
+                    generate, "build_article_tag", side_effect=AssertionError
+                ):
+                    self.assertEqual(
+                        generate.pubmed_xml_to_disk(
+                            articles,
+                            "elife",
+                            self.default_pub_date,
+                            ledger=deposit_ledger,
+                            changed_only=True,
+                        ),
+                        [],
+                    )
+                self.assertFalse(os.path.exists(generate.TMP_DIR + pubmed_xml_file))
+
+    def test_write_batches(self):
+        "the articles are split into files of at most max_articles and max_bytes"
+        articles = generate.build_articles_for_pubmed(
+            [
+                TEST_DATA_PATH + "elife-00666.xml",
+                TEST_DATA_PATH + "elife-02935-v2.xml",
+                TEST_DATA_PATH + "elife-15743-v1.xml",
+            ],
+            "elife",
+        )
+        generator = generate.PubMedGenerator("elife", version="test")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = generator.write_batches(
+                articles, tmp_dir, self.default_pub_date, pretty=True, max_articles=2
+            )
+            self.assertEqual(
+                writer.batches,
+                [
+                    ("elife-pubmed-20170717071707-001", 2),
+                    ("elife-pubmed-20170717071707-002", 1),
+                ],
+            )
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)),
+                [
+                    "elife-pubmed-20170717071707-001.xml",
+                    "elife-pubmed-20170717071707-002.xml",
+                ],
+            )
+            for (batch_id, _), batch_articles in zip(
+                writer.batches, [articles[:2], articles[2:]]
+            ):
+                with open(
+                    generate.batch_file_path(tmp_dir, batch_id), "rb"
+                ) as open_file:
+                    output = open_file.read()
+                # each file is the same as the XML of its articles but the comment
+                expected = generator.generate(
+                    batch_articles, self.default_pub_date, pretty=True
+                )
+                self.assertEqual(
+                    re.sub(b"<!--.*?-->", b"", output),
+                    re.sub(b"<!--.*?-->", b"", expected),
+                )
+
+            max_bytes = len(generator.generate(articles[:2], self.default_pub_date))
+            writer = generator.write_batches(
+                articles,
+                tmp_dir,
+                self.default_pub_date,
+                add_comment=False,
+                max_bytes=max_bytes,
+            )
+            self.assertEqual([count for _, count in writer.batches], [2, 1])
+            self.assertEqual(writer.article_count, 3)
+            for batch_id, _ in writer.batches:
+                self.assertTrue(
+                    os.path.getsize(generate.batch_file_path(tmp_dir, batch_id))
+                    <= max_bytes
+                )
+            # an article larger than max_bytes is in a file of its own
+            writer = generator.write_batches(
+                articles, tmp_dir, self.default_pub_date, max_bytes=1
+            )
+            self.assertEqual([count for _, count in writer.batches], [1, 1, 1])
+            self.assertFalse(
+                [name for name in os.listdir(tmp_dir) if name.endswith(".tmp")]
+            )
+
+    def test_pubmed_xml_to_disk_split(self):
+        "the output is split into files with sequential batch ids"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-00666.xml", TEST_DATA_PATH + "elife-02935-v2.xml"],
+            "elife",
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ledger.DepositLedger(
+                os.path.join(tmp_dir, "ledger.sqlite")
+            ) as deposit_ledger:
+                file_paths = self.written_files(
+                    generate.pubmed_xml_to_disk(
+                        articles,
+                        "elife",
+                        self.default_pub_date,
+                        max_articles=1,
+                        ledger=deposit_ledger,
+                    )
+                )
+                batch_ids = [
+                    "elife-pubmed-20170717071707-001",
+                    "elife-pubmed-20170717071707-002",
+                ]
+                self.assertEqual(
+                    file_paths,
+                    [
+                        generate.batch_file_path(generate.TMP_DIR, batch_id)
+                        for batch_id in batch_ids
+                    ],
+                )
+                for batch_id, poa_article in zip(batch_ids, articles):
+                    self.assertEqual(
+                        deposit_ledger.last_deposit(
+                            poa_article.doi, poa_article.version
+                        ).get("batch_id"),
+                        batch_id,
+                    )
+        for file_path in file_paths:
+            self.assertEqual(
+                len(ElementTree.parse(file_path).getroot().findall("Article")), 1
+            )
+
+    def test_open_atomic(self):
+        "the file is only replaced once it is written without an error"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "output.xml")
+            for content in [b"<ArticleSet></ArticleSet>", b"<ArticleSet/>"]:
+                with generate.open_atomic(file_path) as open_file:
+                    open_file.write(content)
+            with self.assertRaises(ValueError):
+                with generate.open_atomic(file_path) as open_file:
+                    open_file.write(b"<ArticleSet>")
+                    raise ValueError("build failed")
+            self.assertEqual(os.listdir(tmp_dir), ["output.xml"])
+            self.assertEqual(read_file_content(file_path), b"<ArticleSet/>")
+
+    def test_open_atomic_no_clobber(self):
+        "with no_clobber an existing file is not replaced, with or without hard links"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "output.xml")
+            with patch.object(os, "link", side_effect=PermissionError):
+                for content in [b"<ArticleSet/>", b"<ArticleSet></ArticleSet>"]:
+                    atomic_file = generate.open_atomic(file_path, no_clobber=True)
+                    with atomic_file as open_file:
+                        open_file.write(content)
+                    self.assertEqual(read_file_content(atomic_file.file_path), content)
+            atomic_file = generate.open_atomic(file_path, no_clobber=True)
+            with atomic_file as open_file:
+                open_file.write(b"")
+            self.assertEqual(
+                atomic_file.file_path, os.path.join(tmp_dir, "output-2.xml")
+            )
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)),
+                ["output-1.xml", "output-2.xml", "output.xml"],
+            )
+            self.assertEqual(read_file_content(file_path), b"<ArticleSet/>")
+
+    def test_write_batches_no_clobber(self):
+        "a file of an earlier run with the same batch_id is only kept with no_clobber"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-00666.xml"], "elife"
+        )
+        generator = generate.PubMedGenerator("elife")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            batch_ids = [
+                batch_id
+                for no_clobber in [False, False, True]
+                for batch_id, _ in generator.write_batches(
+                    articles,
+                    tmp_dir,
+                    self.default_pub_date,
+                    max_articles=1,
+                    no_clobber=no_clobber,
+                ).batches
+            ]
+            self.assertEqual(
+                batch_ids,
+                [
+                    "elife-pubmed-00666-20170717071707-001",
+                    "elife-pubmed-00666-20170717071707-001",
+                    "elife-pubmed-00666-20170717071707-001-1",
+                ],
+            )
+            self.assertEqual(
+                set(os.listdir(tmp_dir)), {batch_id + ".xml" for batch_id in batch_ids}
+            )
+
+    def test_pubmed_xml_to_disk_profile(self):
+        "profile files are written next to the output, which is not changed"
+        pubmed_xml_file = "elife-pubmed-02935-20170717071707.xml"
+        with tempfile.TemporaryDirectory() as tmp_dir, patch.object(
+            generate, "TMP_DIR", tmp_dir + os.sep
+        ):
+            articles = generate.build_articles_for_pubmed(
+                [TEST_DATA_PATH + "elife-02935-v2.xml"], "elife", profile=True
+            )
+            generate.pubmed_xml_to_disk(
+                articles, "elife", self.default_pub_date, False, True, profile=True
+            )
+            self.assertEqual(
+                read_file_content(generate.TMP_DIR + pubmed_xml_file),
+                read_file_content(TEST_DATA_PATH + pubmed_xml_file),
+            )
+            batch_id = pubmed_xml_file.replace(".xml", "")
+            for suffix in [".prof", "-allocations.txt", "-memory.json"]:
+                self.assertTrue(os.path.exists(generate.TMP_DIR + batch_id + suffix))
+            memory = json.loads(
+                read_file_content(generate.TMP_DIR + batch_id + "-memory.json")
+            )
+            self.assertEqual(
+                [article.get("article") for article in memory.get("articles")],
+                ["10.7554/eLife.02935"],
+            )
+            # the parse profile file names have the time it was run
+            parse_files = [
+                file_name
+                for file_name in os.listdir(generate.TMP_DIR)
+                if file_name.startswith("elife-pubmed-parse-")
+            ]
+            self.assertEqual(len(parse_files), 3)
+            # the profile files are named after the output it was published to
+            file_paths = generate.pubmed_xml_to_disk(
+                articles, "elife", self.default_pub_date, profile=True, no_clobber=True
+            )
+            self.assertEqual(file_paths, [generate.TMP_DIR + batch_id + "-1.xml"])
+            for suffix in [".prof", "-allocations.txt", "-memory.json"]:
+                self.assertTrue(
+                    os.path.exists(generate.TMP_DIR + batch_id + "-1" + suffix)
+                )
+
+    def test_build_articles_for_pubmed_fast_parse(self):
+        "all references are parsed unless fast_parse is set for the section"
+        article_xmls = [TEST_DATA_PATH + "elife-00666.xml"]
+        articles = generate.build_articles_for_pubmed(article_xmls, "elife")
+        self.assertEqual(len(articles[0].ref_list), 54)
+        self.addCleanup(clear_config_cache)
+        override_config("elife", {"fast_parse": True})
+        articles = generate.build_articles_for_pubmed(article_xmls, "elife")
+        self.assertEqual(
+            [ref.publication_type for ref in articles[0].ref_list], ["data"] * 14
+        )
+
+    def test_build_articles_for_pubmed_cache(self):
+        "articles in the cache are not parsed again"
+        article_xmls = [
+            TEST_DATA_PATH + article_xml_file
+            for article_xml_file in ["elife_poa_e00003.xml", "elife-02935-v2.xml"]
+        ]
+        articles = generate.build_articles_for_pubmed(article_xmls, "elife")
+        with tempfile.TemporaryDirectory() as cache_dir, patch(
+            "elifepubmed.generate.build_article", side_effect=articles
+        ) as fake_build_article:
+            article_cache = cache.ArticleCache(cache_dir)
+            for _ in range(2):
+                cached_articles = generate.build_articles_for_pubmed(
+                    article_xmls, "elife", article_cache=article_cache
+                )
+                self.assertEqual(
+                    [article.doi for article in cached_articles],
+                    [article.doi for article in articles],
+                )
+        self.assertEqual(fake_build_article.call_count, 2)
+        self.assertEqual((article_cache.hits, article_cache.misses), (2, 2))
+
+    def test_pubmed_generator_fragment_cache(self):
+        "cached Article tags give the same output, the comment is not cached"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + test_pass[0] for test_pass in self.passes[:4]], "elife"
+        )
+        pub_date = self.default_pub_date
+        generator = generate.PubMedGenerator("elife", version="1.0")
+        instrumentation = instrument.Instrumentation()
+        cached_generator = generate.PubMedGenerator(
+            "elife", version="2.0", instrumentation=instrumentation
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fragment_cache = cache.FragmentCache(cache_dir)
+            for _ in range(2):
+                self.assertEqual(
+                    cached_generator.generate(
+                        articles, pub_date, False, fragment_cache=fragment_cache
+                    ),
+                    generator.generate(articles, pub_date, False),
+                )
+            self.assertTrue(
+                b" from version 2.0"
+                in cached_generator.generate(
+                    articles, pub_date, fragment_cache=fragment_cache
+                )
+            )
+        self.assertEqual(
+            instrumentation.as_dict().get("counters").get("fragment_cache_hits"),
+            len(articles) * 2,
+        )
+
+    def test_fragment_cache_unpickled(self):
+        "unpickled articles and a default pub date hit the fragments of an earlier run"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + test_pass[0] for test_pass in self.passes[:4]], "elife"
+        )
+        # articles read from an ArticleCache or parsed in worker processes are unpickled
+        unpickled_articles = pickle.loads(pickle.dumps(articles))
+        instrumentation = instrument.Instrumentation()
+        generator = generate.PubMedGenerator("elife", instrumentation=instrumentation)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fragment_cache = cache.FragmentCache(cache_dir)
+            output = generator.generate(
+                articles, None, False, fragment_cache=fragment_cache
+            )
+            self.assertEqual(
+                generator.generate(
+                    unpickled_articles, None, False, fragment_cache=fragment_cache
+                ),
+                output,
+            )
+        self.assertEqual(
+            instrumentation.as_dict().get("counters").get("fragment_cache_hits"),
+            len(articles),
+        )
+
+    def test_build_articles_for_pubmed_jobs(self):
+        "parse in worker processes and the articles are in the same order"
+        config_section = "elife"
+        file_paths = [
+            TEST_DATA_PATH + article_xml_file
+            for article_xml_file, _, section, _ in self.passes
+            if section == config_section
+        ]
+        articles = generate.build_articles_for_pubmed(file_paths, config_section)
+        expected = generate.pubmed_xml(
+            articles, config_section, self.default_pub_date, False
+        )
+        parallel_articles = generate.build_articles_for_pubmed(
+            file_paths, config_section, jobs=2, chunksize=2
+        )
+        self.assertEqual(
+            [article.doi for article in parallel_articles],
+            [article.doi for article in articles],
+        )
+        self.assertEqual(
+            generate.pubmed_xml(
+                parallel_articles, config_section, self.default_pub_date, False
+            ),
+            expected,
+        )
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            executor_articles = generate.build_articles_for_pubmed(
+                file_paths, config_section, executor=executor
+            )
+        self.assertEqual(
+            generate.pubmed_xml(
+                executor_articles, config_section, self.default_pub_date, False
+            ),
+            expected,
+        )
+
+    def test_pubmed_xml_jobs(self):
+        "build and serialise articles in worker processes with identical output"
+        for config_section in ["elife", "bmjopen", "pb"]:
+            file_paths = [
+                TEST_DATA_PATH + article_xml_file
+                for article_xml_file, _, section, _ in self.passes
+                if section == config_section
+            ]
+            articles = generate.build_articles_for_pubmed(file_paths, config_section)
+            for pretty in [False, True]:
+                expected = generate.pubmed_xml(
+                    articles, config_section, self.default_pub_date, False, pretty
+                )
+                self.assertEqual(
+                    generate.pubmed_xml(
+                        articles,
+                        config_section,
+                        self.default_pub_date,
+                        False,
+                        pretty,
+                        jobs=2,
+                        chunksize=2,
+                    ),
+                    expected,
+                )
+
+    def test_worker_article_xml(self):
+        "a worker builds its generator once and returns the article measurements"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-00666.xml", TEST_DATA_PATH + "elife-02935-v2.xml"],
+            "elife",
+        )
+        pubmed_config = load_config("elife")
+        worker_args = (
+            ("elife", pubmed_config, None, False),
+            (self.default_pub_date, False, ""),
+        )
+        fragments = []
+        for poa_article in articles:
+            fragment, measurements = generate.worker_article_xml(
+                poa_article, worker_args
+            )
+            fragments.append(fragment)
+            self.assertEqual(measurements.get("stages").get("journal").get("count"), 1)
+            if len(fragments) == 1:
+                worker_generator = generate.WORKER_STATE.generator
+            self.assertIs(generate.WORKER_STATE.generator, worker_generator)
+        self.assertEqual(
+            fragments,
+            list(
+                generate.PubMedGenerator("elife").iter_fragments(
+                    articles, self.default_pub_date
+                )
+            ),
+        )
+
+    def test_pubmed_xml_executor_instrumentation(self):
+        "the stages and articles built by an executor are recorded"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + "elife-00666.xml", TEST_DATA_PATH + "elife-02935-v2.xml"],
+            "elife",
+        )
+        instrumentation = instrument.Instrumentation()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            output = generate.pubmed_xml(
+                articles,
+                "elife",
+                self.default_pub_date,
+                False,
+                executor=executor,
+                instrumentation=instrumentation,
+            )
+        self.assertEqual(
+            output, generate.pubmed_xml(articles, "elife", self.default_pub_date, False)
+        )
+        measurements = instrumentation.as_dict()
+        self.assertEqual(measurements.get("stages").get("journal").get("count"), 2)
+        self.assertEqual(
+            [article.get("doi") for article in measurements.get("articles")],
+            [poa_article.doi for poa_article in articles],
+        )
+        self.assertEqual(
+            measurements.get("counters").get("elements"),
+            sum(article.get("elements") for article in measurements.get("articles")),
+        )
+
+    def test_pubmed_xml_to_disk_executor(self):
+        "write to disk from articles serialised by an executor"
+        article_xml_file = "elife-00666.xml"
+        pubmed_xml_file = "elife-pubmed-00666-20170717071707.xml"
+        config_section = "elife"
+        file_path = TEST_DATA_PATH + article_xml_file
+        articles = generate.build_articles_for_pubmed(
+            article_xmls=[file_path], config_section=config_section
+        )
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            file_paths = self.written_files(
+                generate.pubmed_xml_to_disk(
+                    articles,
+                    config_section,
+                    self.default_pub_date,
+                    False,
+                    True,
+                    executor=executor,
+                )
+            )
+        self.assertEqual(file_paths, [generate.TMP_DIR + pubmed_xml_file])
+        self.assertEqual(
+            read_file_content(file_paths[0]),
+            read_file_content(TEST_DATA_PATH + pubmed_xml_file),
+        )
+
+    def test_pubmed_generator(self):
+        "a generator for each config section is reused for all of its articles"
+        generators = {}
+        for (
+            article_xml_file,
+            pubmed_xml_file,
+            config_section,
+            pub_date,
+        ) in self.passes:
+            file_path = TEST_DATA_PATH + article_xml_file
+            articles = generate.build_articles_for_pubmed(
+                article_xmls=[file_path], config_section=config_section
+            )
+            if config_section not in generators:
+                generators[config_section] = generate.PubMedGenerator(config_section)
+            generator = generators.get(config_section)
+            expected_output = read_file_content(TEST_DATA_PATH + pubmed_xml_file)
+            self.assertEqual(
+                generator.generate(articles, pub_date, False, pretty=True),
+                expected_output,
+            )
+            open_file = io.BytesIO()
+            generator.write(articles, open_file, pub_date, False, pretty=True)
+            self.assertEqual(open_file.getvalue(), expected_output)
+            fragments = list(generator.iter_fragments(articles, pub_date, pretty=True))
+            self.assertEqual(len(fragments), 1)
+            self.assertTrue(fragments[0] in expected_output)
+        self.assertEqual(sorted(generators), ["bmjopen", "elife", "pb"])
+
+    def test_pubmed_generator_config(self):
+        "the generator prepares its config and lookups once"
+        generator = generate.PubMedGenerator("elife", version="1.0")
+        self.assertEqual(generator.pubmed_config, load_config("elife"))
+        self.assertIsNotNone(generator.publication_type_matcher)
+        self.assertTrue(generator.dataset_resolver is generate.dataset_resolver())
+        p_xml = generator.build([])
+        self.assertTrue(p_xml.generator is generator)
+        self.assertEqual(p_xml.last_commit, "1.0")
+
+    def test_pubmed_generator_stages(self):
+        "stages in the skip_stages config are not run and each stage is timed"
+        generator = generate.PubMedGenerator("pb")
+        self.assertTrue("datasets" not in generator.object_list_pipeline.stage_names)
+        self.assertEqual(
+            generate.PubMedGenerator("bmjopen").pipeline.stage_names,
+            tuple(
+                name
+                for name in generate.ARTICLE_STAGES
+                if name != "plain_language_summary"
+            ),
+        )
+        article = Article("10.7554/eLife.00666", "Title")
+        article.author_keywords = ["keyword"]
+        pubmed_config = dict(load_config("elife"))
+        pubmed_config["article_stages"] = ["article_title", "object_list"]
+        pubmed_config["skip_stages"] = ["keywords"]
+        generator = generate.PubMedGenerator(pubmed_config=pubmed_config)
+        self.assertEqual(
+            ElementTree.tostring(generator.article_tag(article, self.default_pub_date)),
+            b"<Article><ArticleTitle>Title</ArticleTitle></Article>",
+        )
+        self.assertEqual(
+            sorted(generator.stage_timings.report()),
+            sorted(
+                ["article_title", "object_list", "article_type", "research_organism"]
+                + ["categories", "grants", "datasets", "clinical_trials"]
+            ),
+        )
+        pubmed_config["skip_stages"] = ["not_a_stage"]
+        with self.assertRaises(ValueError):
+            generate.PubMedGenerator(pubmed_config=pubmed_config)
+
+    def test_article_tag_threads(self):
+        "Article tags built in threads sharing one generator match the serial output"
+        articles = generate.build_articles_for_pubmed(
+            [TEST_DATA_PATH + test_pass[0] for test_pass in self.passes[:4]], "elife"
+        )
+        pub_date = self.default_pub_date
+        generator = generate.PubMedGenerator("elife")
+        expected = list(generator.iter_fragments(articles * 5, pub_date))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            article_tags = list(
+                executor.map(
+                    lambda article: generator.article_tag(article, pub_date),
+                    articles * 5,
+                )
+            )
+            self.assertEqual(
+                generator.generate(articles, pub_date, False, executor=executor),
+                generator.generate(articles, pub_date, False),
+            )
+        self.assertEqual(
+            [ElementTree.tostring(tag) for tag in article_tags],
+            [
+                ElementTree.tostring(ElementTree.fromstring(fragment))
+                for fragment in expected
+            ],
+        )
+
     def test_set_is_poa(self):
         "test a method to make a non-eLife article aheadofprint by setting is_poa"
         article_xml_file = "pb369-jats.xml"
@@ -184,6 +954,78 @@ class TestGenerate(unittest.TestCase):
         )
 
 
+class TestGetVersion(unittest.TestCase):
+    def test_get_version(self):
+        "version in order of precedence"
+        pubmed_config = {"generator_version": "config"}
+        with patch.dict(os.environ, {generate.VERSION_ENVIRONMENT_VARIABLE: "env"}):
+            self.assertEqual(generate.get_version(pubmed_config, "arg"), "arg")
+            self.assertEqual(generate.get_version(pubmed_config), "config")
+            self.assertEqual(generate.get_version({}), "env")
+
+    @patch("elifepubmed.generate.eautils.get_last_commit_to_master")
+    def test_get_version_last_commit(self, fake_last_commit):
+        "last commit is only looked up once"
+        fake_last_commit.return_value = "commit"
+        generate.get_last_commit.cache_clear()
+        with patch.dict(os.environ, clear=True):
+            self.assertEqual(generate.get_version(), "commit")
+            self.assertEqual(generate.get_version(None), "commit")
+        generate.get_last_commit.cache_clear()
+        self.assertEqual(fake_last_commit.call_count, 1)
+
+    def test_pubmed_xml_version(self):
+        "version argument is in the comment"
+        pubmed_config = load_config("elife")
+        p_xml = generate.PubMedXML([], pubmed_config, version="1.2.3")
+        self.assertTrue(p_xml.comment.text.endswith(" from version 1.2.3"))
+
+
+class TestArticleContext(unittest.TestCase):
+    def test_article_context(self):
+        "values derived from the article are computed once"
+        pubmed_config = load_config("elife")
+        default_pub_date = time.strptime("2013-10-10", "%Y-%m-%d")
+        article = Article("10.7554/eLife.00666", "Title")
+        article.article_type = "research-article"
+        article.is_poa = False
+        article.was_ever_poa = True
+        generator = generate.PubMedGenerator("elife")
+        context = generate.ArticleContext(
+            article, pubmed_config, default_pub_date, generator
+        )
+        self.assertEqual(context.pub_date, default_pub_date)
+        self.assertEqual(context.pub_type, "epublish")
+        self.assertTrue(context.vor_was_ever_poa)
+        self.assertEqual(context.volume, "2")
+        self.assertEqual(context.publication_type, "Journal Article")
+        self.assertEqual(context.contributor_index.authors, [])
+
+    def test_setters_without_context(self):
+        "setters called without a context build the same tags"
+        pubmed_config = load_config("elife")
+        default_pub_date = time.strptime("2013-10-10", "%Y-%m-%d")
+        article = Article("10.7554/eLife.00666", "Title")
+        article.is_poa = False
+        article.was_ever_poa = True
+        context = generate.ArticleContext(article, pubmed_config, default_pub_date)
+        with_context = Element("Article")
+        without_context = Element("Article")
+        generate.set_journal(
+            with_context, article, pubmed_config, default_pub_date, context
+        )
+        generate.set_replaces(with_context, article, context)
+        generate.set_history(
+            with_context, article, pubmed_config, default_pub_date, context
+        )
+        generate.set_journal(without_context, article, pubmed_config, default_pub_date)
+        generate.set_replaces(without_context, article)
+        generate.set_history(without_context, article, pubmed_config, default_pub_date)
+        self.assertEqual(
+            ElementTree.tostring(with_context), ElementTree.tostring(without_context)
+        )
+
+
 class TestDataset(unittest.TestCase):
     def test_dataset_details_empty(self):
         """test an empty Dataset object"""
@@ -260,6 +1102,45 @@ class TestDatasetAssigningAuthority(unittest.TestCase):
         self.assertEqual(assigning_authority, expected)
 
 
+class TestDatasetResolver(unittest.TestCase):
+    def test_assigning_authority_map_order(self):
+        "the first hint in the map order is used when the uri has more than one"
+        resolver = generate.DatasetResolver(
+            uri_map=OrderedDict([("second.example", "Two"), ("first.", "One")]),
+            source_map={},
+        )
+        self.assertEqual(
+            resolver.assigning_authority("https://first.second.example/"), "Two"
+        )
+        self.assertEqual(resolver.assigning_authority("https://first.org"), "One")
+        self.assertIsNone(resolver.assigning_authority("https://example.org"))
+        self.assertIsNone(generate.DatasetResolver({}, {}).assigning_authority("uri"))
+
+    def test_datasets(self):
+        "duplicate data refs are not added, duplicate datasets are kept"
+        article = Article()
+        for _ in range(2):
+            dataset = Dataset()
+            dataset.uri = "https://www.ncbi.nlm.nih.gov/geo/query/acc.cgi?acc=GSE1"
+            dataset.accession_id = "GSE1"
+            article.datasets.append(dataset)
+        for accession in ["GSE1", "GSE2", "GSE2"]:
+            citation = Citation()
+            citation.publication_type = "data"
+            citation.source = "NCBI GENE EXPRESSION OMNIBUS"
+            citation.accession = accession
+            article.ref_list.append(citation)
+        citation = Citation()
+        citation.publication_type = "journal"
+        citation.source = "figshare"
+        citation.accession = "not_data"
+        article.ref_list.append(citation)
+        self.assertEqual(
+            generate.dataset_resolver().datasets(article),
+            [("NCBI:geo", "GSE1"), ("NCBI:geo", "GSE1"), ("NCBI:geo", "GSE2")],
+        )
+
+
 class TestCleanAbstract(unittest.TestCase):
     def test_clean_abstract(self):
         abstract = (
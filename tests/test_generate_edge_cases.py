@@ -406,6 +406,87 @@ class TestSetGroupList(unittest.TestCase):
             "</GroupList>" in str(pubmed_xml_string)
         )
 
+    def test_set_group_list_order(self):
+        "an empty group between groups with individuals is removed, keeping the order"
+        article = Article("10.7554/eLife.00666", "Test article")
+        for group_author_name, surnames in [
+            ("Group One", ["One"]),
+            ("Group Empty", []),
+            ("Group Three", ["Three", "Four"]),
+        ]:
+            collab = Contributor(
+                contrib_type="author",
+                surname=None,
+                given_name=None,
+                collab=group_author_name,
+            )
+            collab.group_author_key = group_author_name
+            article.add_contributor(collab)
+            for surname in surnames:
+                contributor = Contributor(
+                    contrib_type="author non-byline", surname=surname, given_name="A"
+                )
+                contributor.group_author_key = group_author_name
+                article.add_contributor(contributor)
+        p_xml = generate.build_pubmed_xml([article])
+        group_names = [tag.text for tag in p_xml.root.findall(".//Group/GroupName")]
+        self.assertEqual(group_names, ["Group One", "Group Three"])
+        self.assertEqual(
+            [
+                len(tag.findall("IndividualName"))
+                for tag in p_xml.root.findall(".//Group")
+            ],
+            [1, 2],
+        )
+
+
+class TestGroupAuthorKeyCollabMap(unittest.TestCase):
+    def test_group_author_key_collab_map(self):
+        "first collab name for each group_author_key"
+        contributor1 = Contributor("author", None, None, collab="First")
+        contributor1.group_author_key = "group1"
+        contributor2 = Contributor("author", None, None, collab="Second")
+        contributor2.group_author_key = "group1"
+        contributor3 = Contributor("author", "Surname", "Given")
+        contributor3.group_author_key = "group1"
+        self.assertEqual(
+            generate.group_author_key_collab_map(
+                [contributor1, contributor2, contributor3]
+            ),
+            {"group1": "First"},
+        )
+
+
+class TestContributorIndex(unittest.TestCase):
+    def test_contributor_index(self):
+        "contributors partitioned by type, group membership and conflicts"
+        collab = Contributor("author", None, None, collab="Group")
+        collab.group_author_key = "group1"
+        author = Contributor("author", "Surname", "Given")
+        author.conflict = ["No competing interests"]
+        member = Contributor("author non-byline", "Member", "A")
+        member.group_author_key = "group1"
+        on_behalf_of = Contributor("on-behalf-of", None, None, collab="Other Group")
+        blank = Contributor("author", None, None)
+        blank.conflict = ["Blank conflict"]
+        editor = Contributor("editor", "Editor", "E")
+        contributor_index = generate.ContributorIndex(
+            [collab, author, member, on_behalf_of, blank, editor]
+        )
+        self.assertEqual(contributor_index.author_list("author"), [collab, author])
+        self.assertEqual(contributor_index.author_list("author non-byline"), [])
+        self.assertEqual(
+            contributor_index.author_list(), [collab, author, on_behalf_of, editor]
+        )
+        self.assertEqual(
+            contributor_index.group_members, [collab, member, on_behalf_of]
+        )
+        self.assertEqual(
+            contributor_index.collab_names, {"group1": "Group", None: "Other Group"}
+        )
+        self.assertEqual(contributor_index.conflicts(["author"]), [author, blank])
+        self.assertEqual(contributor_index.conflicts(["editor"]), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,76 @@
+import json
+import unittest
+from elifepubmed import instrument
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_phase(self):
+        instrumentation = instrument.Instrumentation()
+        with instrumentation.phase("build"):
+            pass
+        with instrument.phase(instrumentation, "build"):
+            pass
+        phase = instrumentation.as_dict().get("phases").get("build")
+        self.assertEqual(phase.get("count"), 2)
+        self.assertTrue(phase.get("seconds") >= 0)
+        self.assertTrue(phase.get("cpu_seconds") >= 0)
+
+    def test_disabled(self):
+        "the module functions do nothing without an instrumentation"
+        with instrument.phase(None, "build"):
+            pass
+        instrument.count(None, "output_bytes", 10)
+
+    def test_as_dict(self):
+        instrumentation = instrument.Instrumentation()
+        instrumentation.add_article("10.7554/eLife.00666", 0.5, 0.25, 40)
+        instrumentation.add_article("10.7554/eLife.00003", 0.5, 0.25, 2)
+        instrument.count(instrumentation, "output_bytes", 10)
+        instrumentation.stages.add([("journal", 0.5, 0.25)])
+        measurements = instrumentation.as_dict()
+        self.assertEqual(
+            [article.get("doi") for article in measurements.get("articles")],
+            ["10.7554/eLife.00666", "10.7554/eLife.00003"],
+        )
+        self.assertEqual(
+            measurements.get("counters"), {"elements": 42, "output_bytes": 10}
+        )
+        self.assertEqual(
+            measurements.get("stages"),
+            {"journal": {"seconds": 0.5, "count": 1, "cpu_seconds": 0.25}},
+        )
+        self.assertEqual(json.loads(instrumentation.to_json()), measurements)
+        instrumentation.clear()
+        self.assertEqual(
+            instrumentation.as_dict(),
+            {"phases": {}, "stages": {}, "articles": [], "counters": {}},
+        )
+
+    def test_merge(self):
+        "the measurements of a worker are added to the totals"
+        worker = instrument.Instrumentation()
+        worker.add_article("10.7554/eLife.00666", 0.5, 0.25, 40)
+        worker.stages.add([("journal", 0.5, 0.25)])
+        worker.add_phase("build", 1.0, 0.5)
+        instrumentation = instrument.Instrumentation()
+        instrumentation.add_article("10.7554/eLife.00003", 0.5, 0.25, 2)
+        instrumentation.stages.add([("journal", 0.5, 0.25)])
+        instrumentation.merge(worker.as_dict())
+        measurements = instrumentation.as_dict()
+        self.assertEqual(
+            [article.get("doi") for article in measurements.get("articles")],
+            ["10.7554/eLife.00003", "10.7554/eLife.00666"],
+        )
+        self.assertEqual(measurements.get("counters"), {"elements": 42})
+        self.assertEqual(
+            measurements.get("stages"),
+            {"journal": {"seconds": 1.0, "count": 2, "cpu_seconds": 0.5}},
+        )
+        self.assertEqual(
+            measurements.get("phases"),
+            {"build": {"seconds": 1.0, "cpu_seconds": 0.5, "count": 1}},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+import unittest
+from elifepubmed import ledger
+
+
+class TestDepositLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "ledger.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_record(self):
+        "the last deposit of each DOI and version is returned"
+        deposited = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+        with ledger.DepositLedger(self.path) as deposit_ledger:
+            self.assertIsNone(deposit_ledger.last_deposit("10.7554/eLife.00666", 1))
+            deposit_ledger.record(
+                "elife-pubmed-20170717071707",
+                [
+                    ("10.7554/eLife.00666", 1, "key-a", "a"),
+                    ("10.7554/eLife.02935", None, "key-b", "b"),
+                ],
+                deposited,
+            )
+            deposit_ledger.record(
+                "elife-pubmed-20170718071707",
+                [("10.7554/eLife.00666", 1, "key-c", "c")],
+            )
+            self.assertEqual(
+                deposit_ledger.last_deposit("10.7554/eLife.00666", 1).get(
+                    "content_hash"
+                ),
+                "c",
+            )
+            self.assertEqual(
+                deposit_ledger.last_deposit("10.7554/eLife.02935", None),
+                {
+                    "batch_id": "elife-pubmed-20170717071707",
+                    "article_key": "key-b",
+                    "content_hash": "b",
+                    "deposited": "2017-07-17T07:17:07Z",
+                },
+            )
+            self.assertIsNone(deposit_ledger.last_deposit("10.7554/eLife.02935", 2))
+
+    def test_is_changed(self):
+        "an article is changed unless it was deposited with the same article key"
+        with ledger.DepositLedger(self.path) as deposit_ledger:
+            deposit_ledger.record("batch", [("10.7554/eLife.00666", "2", "a", "hash")])
+        # the deposits are kept in the file
+        with ledger.DepositLedger(self.path) as deposit_ledger:
+            self.assertFalse(deposit_ledger.is_changed("10.7554/eLife.00666", 2, "a"))
+            self.assertTrue(deposit_ledger.is_changed("10.7554/eLife.00666", 2, "b"))
+            self.assertTrue(deposit_ledger.is_changed("10.7554/eLife.00666", 1, "a"))
@@ -0,0 +1,262 @@
+import unittest
+from collections import OrderedDict
+from xml.etree.ElementTree import Element
+from xml.parsers.expat import ExpatError
+from xml.etree import ElementTree
+from elifearticle.article import Article
+from elifepubmed import generate, markup, utils
+
+
+class TestUnescapeEntities(unittest.TestCase):
+    def test_unescape_entities(self):
+        self.assertEqual(markup.unescape_entities(None), None)
+        self.assertEqual(markup.unescape_entities("plain"), "plain")
+        self.assertEqual(
+            markup.unescape_entities("&amp; &lt; &gt; &quot; &apos; &#169; &#x2013;"),
+            "& < > \" ' © –",
+        )
+        # unknown entity is left as it is
+        self.assertEqual(markup.unescape_entities("&nbsp;"), "&nbsp;")
+
+    def test_attribute_value(self):
+        self.assertEqual(markup.attribute_value(""), "")
+        self.assertEqual(markup.attribute_value("A\r\nB\tC &amp; D"), "A B C & D")
+
+
+class TestAppendFragment(unittest.TestCase):
+    def test_append_fragment(self):
+        parent = Element("root")
+        string = "One <i>two <b>three</b> four</i> &amp; <sup>5</sup>."
+        expected = (
+            b'<root><AbstractText Label="A &amp; B">One <i>two <b>three</b> four</i>'
+            b" &amp; <sup>5</sup>.</AbstractText></root>"
+        )
+        tag = markup.append_fragment(
+            parent, "AbstractText", string, attributes={"Label": "A &amp; B"}
+        )
+        self.assertEqual(tag.tag, "AbstractText")
+        self.assertEqual(ElementTree.tostring(parent), expected)
+
+    def test_append_fragment_empty(self):
+        parent = Element("root")
+        markup.append_fragment(parent, "AbstractText", "", attributes={"Label": ""})
+        self.assertEqual(
+            ElementTree.tostring(parent), b'<root><AbstractText Label="" /></root>'
+        )
+
+    def test_append_fragment_not_allowed_tag(self):
+        "tags not in the allowed tags are text"
+        parent = Element("root")
+        markup.append_fragment(
+            parent, "ArticleTitle", "<i>a</i><x>", allowed_tags=("<i>", "</i>")
+        )
+        self.assertEqual(
+            ElementTree.tostring(parent),
+            b"<root><ArticleTitle><i>a</i>&lt;x&gt;</ArticleTitle></root>",
+        )
+
+    def test_append_fragment_mismatched_tag(self):
+        parent = Element("root")
+        with self.assertRaises(ExpatError):
+            markup.append_fragment(parent, "ArticleTitle", "<i>a<b>b</i></b>")
+        with self.assertRaises(ExpatError):
+            markup.append_fragment(parent, "ArticleTitle", "<i>a")
+        with self.assertRaises(ExpatError):
+            markup.append_fragment(parent, "ArticleTitle", "a</i>")
+
+    def test_set_article_title_mismatched_tag(self):
+        "a title with mismatched tags raises ExpatError as the minidom parser did"
+        poa_article = Article("10.7554/eLife.00666", "<i>a<b>b</i></b>")
+        with self.assertRaises(ExpatError):
+            generate.set_article_title(Element("Article"), poa_article)
+
+
+class TestAbstractSections(unittest.TestCase):
+    def test_abstract_sections_empty(self):
+        self.assertEqual(markup.abstract_sections(None, []), [])
+        self.assertEqual(markup.abstract_sections("<abstract>\n</abstract>", []), [])
+
+    def test_abstract_sections_paragraphs(self):
+        abstract = (
+            "<abstract>\n<!-- a comment -->\n"
+            '<object-id pub-id-type="doi">10.7554/eLife.00666.001</object-id>\n'
+            "<p>One &amp; <italic>two</italic> <sc>three</sc> &gt; "
+            "<inline-formula><mml:math><mml:mi>x</mml:mi></mml:math></inline-formula>"
+            '<xref ref-type="bibr" rid="bib1">\n</xref>.</p>\n'
+            "<p><bold>Editorial note:</bold> A note.</p>\n</abstract>"
+        )
+        self.assertEqual(
+            markup.abstract_sections(abstract, ["Editorial note:"]),
+            [
+                OrderedDict(
+                    [
+                        (
+                            "text",
+                            "One &amp; <i>two</i> three &gt; [Formula: see text].\n",
+                        ),
+                        ("label", ""),
+                    ]
+                ),
+                OrderedDict([("text", " A note."), ("label", "Editorial note")]),
+            ],
+        )
+
+    def test_abstract_sections_sec(self):
+        abstract = (
+            "<abstract>"
+            '<object-id pub-id-type="doi">10.7554/eLife.00666.001</object-id>'
+            '<sec id="abs1">\n<title>Background:</title>\n'
+            '<p>Lorem ipsum <xref ref-type="bibr" rid="bib12">Anon (2002)</xref> '
+            '<ext-link ext-link-type="uri" xlink:href="https://elifesciences.org/">'
+            "eLife</ext-link> <named-content>x</named-content></p>\n"
+            "</sec>\n"
+            '<sec id="abs2"><title>Results &amp; more</title><p>Result.</p></sec>'
+            "</abstract>"
+        )
+        self.assertEqual(
+            markup.abstract_sections(abstract, []),
+            [
+                OrderedDict(
+                    [
+                        (
+                            "text",
+                            "Lorem ipsum Anon (2002) eLife "
+                            "&lt;named-content&gt;x&lt;/named-content&gt;",
+                        ),
+                        ("label", "Background:"),
+                    ]
+                ),
+                OrderedDict([("text", "Result."), ("label", "Results &amp; more")]),
+            ],
+        )
+
+    def test_abstract_sections_object_id_lines(self):
+        "object-id text across lines is not removed, the same as clean_abstract()"
+        abstract = '<p><object-id pub-id-type="doi">\n10.7554/x</object-id>One.</p>'
+        self.assertEqual(
+            markup.abstract_sections(abstract, []),
+            [OrderedDict([("text", "10.7554/xOne."), ("label", "")])],
+        )
+
+
+class TestAbstractParts(unittest.TestCase):
+    def test_abstract_parts(self):
+        "test splitting abstract content into sections"
+        label_types = ["Editorial note:"]
+        self.assertEqual(markup.abstract_parts(None, []), [])
+        self.assertEqual(
+            markup.abstract_parts("<p>First.</p><p>Second.</p>", label_types),
+            [
+                OrderedDict([("text", "First."), ("label", "")]),
+                OrderedDict([("text", "Second."), ("label", "")]),
+            ],
+        )
+        self.assertEqual(
+            markup.abstract_parts(
+                "<p>One.</p><p><bold>Editorial note: </bold>A note.</p>", label_types
+            ),
+            [
+                OrderedDict([("text", "One."), ("label", "")]),
+                OrderedDict([("text", "A note."), ("label", "Editorial note")]),
+            ],
+        )
+        # test without a label type match
+        self.assertEqual(
+            markup.abstract_parts(
+                "<p>One.</p><p><bold>Editorial note: </bold>A note.</p>", []
+            ),
+            [
+                OrderedDict([("text", "One."), ("label", "")]),
+                OrderedDict(
+                    [("text", "<bold>Editorial note: </bold>A note."), ("label", "")]
+                ),
+            ],
+        )
+        self.assertEqual(
+            markup.abstract_parts(
+                "<p>One.</p><p><bold>Editorial note: </bold>A note \nacross multiple lines.</p>",
+                label_types,
+            ),
+            [
+                OrderedDict([("text", "One."), ("label", "")]),
+                OrderedDict(
+                    [
+                        ("text", "A note \nacross multiple lines."),
+                        ("label", "Editorial note"),
+                    ]
+                ),
+            ],
+        )
+
+    def test_abstract_sec(self):
+        string = "<sec><title>A title</title><p>Paragraph.</p></sec>"
+        expected = [OrderedDict([("text", "Paragraph."), ("label", "A title")])]
+        result = markup.abstract_parts(string, [])
+        self.assertEqual(result, expected)
+
+    def test_abstract_sec_blank(self):
+        string = ""
+        expected = []
+        result = markup.abstract_parts(string, [])
+        self.assertEqual(result, expected)
+
+    def test_abstract_sec_whitespace(self):
+        string = "<sec><title>A title</title>  \n   </sec>"
+        expected = []
+        result = markup.abstract_parts(string, [])
+        self.assertEqual(result, expected)
+
+
+class TestMarkupPolicy(unittest.TestCase):
+    def test_rename(self):
+        policy = markup.MarkupPolicy()
+        self.assertEqual(policy.rename(None), None)
+        self.assertEqual(
+            policy.rename("<italic>a</italic> <bold>b</bold> <underline>c</underline>"),
+            "<i>a</i> <b>b</b> <u>c</u>",
+        )
+
+    def test_strip(self):
+        policy = markup.MarkupPolicy()
+        self.assertEqual(policy.strip("<sc>a</sc> <sup>b</sup>"), "a <sup>b</sup>")
+        self.assertEqual(
+            policy.strip("<italic>a</italic> <sup>b</sup>", policy.allowed_tag_names),
+            "a b",
+        )
+
+    def test_escape_unmatched(self):
+        policy = markup.MarkupPolicy()
+        self.assertEqual(
+            policy.escape_unmatched("<i>a</i> < b > <x>c</x> <a<b>"),
+            "<i>a</i> &lt; b &gt; &lt;x&gt;c&lt;/x&gt; &lt;a<b>",
+        )
+
+    def test_custom_policy(self):
+        policy = markup.MarkupPolicy(
+            allowed_tags=("<i>", "</i>"),
+            tag_replacements=OrderedDict([("em", "i")]),
+            remove_tags=("b",),
+        )
+        self.assertEqual(policy.allowed_tag_names, ("i",))
+        string = policy.strip(policy.rename("<em>a</em> <b>b</b> <sup>c</sup>"))
+        self.assertEqual(
+            policy.escape_unmatched(string), "<i>a</i> b &lt;sup&gt;c&lt;/sup&gt;"
+        )
+
+    def test_markup_policy(self):
+        "policies of the same config values are compiled once"
+        self.assertTrue(markup.markup_policy() is markup.markup_policy({}))
+        self.assertEqual(markup.markup_policy().allowed_tags, utils.allowed_tags())
+        pubmed_config = {
+            "markup_allowed_tags": ["i", "sup"],
+            "markup_tag_replacements": OrderedDict([("italic", "i")]),
+            "markup_remove_tags": ["sc", "bold"],
+        }
+        policy = markup.markup_policy(pubmed_config)
+        self.assertTrue(policy is markup.markup_policy(dict(pubmed_config)))
+        self.assertEqual(policy.allowed_tags, ("<i>", "</i>", "<sup>", "</sup>"))
+        self.assertEqual(policy.remove_tags, ("sc", "bold"))
+
+
+if __name__ == "__main__":
+    unittest.main()
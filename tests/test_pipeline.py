@@ -0,0 +1,56 @@
+import unittest
+from collections import OrderedDict
+from elifepubmed import pipeline
+
+
+def registry():
+    "stages which append their name to a list"
+    return OrderedDict(
+        (name, lambda parts, name=name: parts.append(name))
+        for name in ["one", "two", "three"]
+    )
+
+
+class TestStagePipeline(unittest.TestCase):
+    def test_run(self):
+        parts = []
+        pipeline.StagePipeline(registry()).run(parts)
+        self.assertEqual(parts, ["one", "two", "three"])
+
+    def test_order_and_skip(self):
+        stage_pipeline = pipeline.StagePipeline(
+            registry(), ["three", "two", "one"], ["two"]
+        )
+        self.assertEqual(stage_pipeline.stage_names, ("three", "one"))
+        parts = []
+        stage_pipeline.run(parts)
+        self.assertEqual(parts, ["three", "one"])
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            pipeline.StagePipeline(registry(), ["one", "four"])
+        with self.assertRaises(ValueError):
+            pipeline.StagePipeline(registry(), None, ["four"])
+
+    def test_timings(self):
+        timings = pipeline.StageTimings()
+        stage_pipeline = pipeline.StagePipeline(registry(), None, ["one"])
+        stage_pipeline.run([], timings=timings)
+        stage_pipeline.run([], timings=timings)
+        report = timings.report()
+        self.assertEqual(list(report), ["two", "three"])
+        self.assertEqual(report.get("two").get("count"), 2)
+        self.assertTrue(report.get("two").get("seconds") >= 0)
+        timings.clear()
+        self.assertEqual(timings.report(), OrderedDict())
+
+    def test_cpu_timings(self):
+        timings = pipeline.StageTimings(cpu=True)
+        pipeline.StagePipeline(registry()).run([], timings=timings)
+        self.assertEqual(
+            sorted(timings.report().get("one")), ["count", "cpu_seconds", "seconds"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+from elifepubmed import profiling
+
+
+class TestProfiler(unittest.TestCase):
+    def test_run(self):
+        "the profile files are written once the run ends"
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = profiling.Profiler("run", output_dir, top=3)
+            with profiler.run():
+                for name in ["one", "two"]:
+                    with profiling.article(profiler, name):
+                        data = [str(index) for index in range(10000)]
+            self.assertTrue(data)
+            self.assertTrue(
+                pstats.Stats(os.path.join(output_dir, "run.prof")).total_calls > 0
+            )
+            with open(os.path.join(output_dir, "run-allocations.txt")) as open_file:
+                self.assertEqual(len(open_file.readlines()), 3)
+            with open(os.path.join(output_dir, "run-memory.json")) as open_file:
+                memory = json.load(open_file)
+        self.assertEqual(
+            [article.get("article") for article in memory.get("articles")],
+            ["one", "two"],
+        )
+        for article in memory.get("articles"):
+            self.assertTrue(0 < article.get("peak_bytes") <= memory.get("peak_bytes"))
+
+    def test_disabled(self):
+        "the module functions do nothing without a profiler"
+        with profiling.run(None), profiling.article(None, "one"):
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
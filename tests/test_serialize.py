@@ -0,0 +1,99 @@
+import unittest
+from xml.etree.ElementTree import Element, SubElement, Comment
+from elifepubmed import serialize
+
+
+PUBLIC_ID = "-//NLM//DTD PubMed 2.7//EN"
+SYSTEM_ID = "https://dtd.nlm.nih.gov/ncbi/pubmed/in/PubMed.dtd"
+
+
+def mixed_content_root():
+    "ArticleSet with a comment, an empty tag and inline tags in text"
+    root = Element("ArticleSet")
+    root.append(Comment("a comment"))
+    article = SubElement(root, "Article")
+    abstract_text = SubElement(article, "AbstractText")
+    abstract_text.set("Label", "")
+    abstract_text.text = "A & B "
+    italic = SubElement(abstract_text, "i")
+    italic.text = "italic"
+    italic.tail = ' "quoted" < 1'
+    SubElement(article, "Empty")
+    return root
+
+
+class TestSerialize(unittest.TestCase):
+    def test_escape_data(self):
+        self.assertEqual(
+            serialize.escape_data('<a href="x">&</a>'),
+            "&lt;a href=&quot;x&quot;&gt;&amp;&lt;/a&gt;",
+        )
+        self.assertEqual(serialize.escape_data("plain"), "plain")
+
+    def test_escape_text(self):
+        self.assertEqual(serialize.escape_text("one\r\ntwo\rthree"), "one\ntwo\nthree")
+
+    def test_doctype(self):
+        self.assertEqual(
+            serialize.doctype("ArticleSet", PUBLIC_ID, SYSTEM_ID),
+            '<!DOCTYPE ArticleSet PUBLIC "%s"  "%s">' % (PUBLIC_ID, SYSTEM_ID),
+        )
+        self.assertEqual(
+            serialize.doctype("ArticleSet", PUBLIC_ID, SYSTEM_ID, "\n"),
+            '<!DOCTYPE ArticleSet\n PUBLIC "%s"\n  "%s">\n' % (PUBLIC_ID, SYSTEM_ID),
+        )
+        self.assertEqual(
+            serialize.doctype("ArticleSet", None, SYSTEM_ID),
+            '<!DOCTYPE ArticleSet SYSTEM "%s">' % SYSTEM_ID,
+        )
+        self.assertEqual(serialize.doctype("ArticleSet"), "<!DOCTYPE ArticleSet>")
+
+    def test_output_xml(self):
+        expected = (
+            b'<?xml version="1.0" encoding="utf-8"?>'
+            b'<!DOCTYPE ArticleSet PUBLIC "-//NLM//DTD PubMed 2.7//EN"'
+            b'  "https://dtd.nlm.nih.gov/ncbi/pubmed/in/PubMed.dtd">'
+            b"<ArticleSet><!--a comment--><Article>"
+            b'<AbstractText Label="">A &amp; B <i>italic</i>'
+            b" &quot;quoted&quot; &lt; 1</AbstractText>"
+            b"<Empty/></Article></ArticleSet>"
+        )
+        output = serialize.output_xml(mixed_content_root(), PUBLIC_ID, SYSTEM_ID)
+        self.assertEqual(output, expected)
+
+    def test_output_xml_pretty(self):
+        expected = (
+            b'<?xml version="1.0" encoding="utf-8"?>\n'
+            b"<!DOCTYPE ArticleSet\n"
+            b' PUBLIC "-//NLM//DTD PubMed 2.7//EN"\n'
+            b'  "https://dtd.nlm.nih.gov/ncbi/pubmed/in/PubMed.dtd">\n'
+            b"<ArticleSet>\n"
+            b"\t<!--a comment-->\n"
+            b"\t<Article>\n"
+            b'\t\t<AbstractText Label="">\n'
+            b"\t\t\tA &amp; B \n"
+            b"\t\t\t<i>italic</i>\n"
+            b"\t\t\t &quot;quoted&quot; &lt; 1\n"
+            b"\t\t</AbstractText>\n"
+            b"\t\t<Empty/>\n"
+            b"\t</Article>\n"
+            b"</ArticleSet>\n"
+        )
+        output = serialize.output_xml(
+            mixed_content_root(), PUBLIC_ID, SYSTEM_ID, pretty=True, indent="\t"
+        )
+        self.assertEqual(output, expected)
+
+    def test_element_xml_level(self):
+        article = Element("Article")
+        title = SubElement(article, "ArticleTitle")
+        title.text = "Title – é"
+        self.assertEqual(
+            serialize.element_xml(article, pretty=True, indent="  ", level=1),
+            "  <Article>\n    <ArticleTitle>Title – é</ArticleTitle>\n"
+            "  </Article>\n".encode("utf-8"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,4 @@
 import unittest
-from collections import OrderedDict
 from elifepubmed import utils
 
 
@@ -38,6 +37,13 @@ class TestUtils(unittest.TestCase):
             ),
             "\n[Formula: see text]\n",
         )
+        # replacement is not treated as a regular expression template
+        self.assertEqual(
+            utils.replace_mathml_tags(
+                "a <inline-formula>m</inline-formula>", replacement=r"\1 \g<0>"
+            ),
+            r"a \1 \g<0>",
+        )
 
     def test_compare_values(self):
         "various comparisons of values"
@@ -121,6 +127,50 @@ class TestUtils(unittest.TestCase):
             "Journal Article",
         )
 
+    def test_publication_type_matcher(self):
+        "first matching rule wins whichever values it matches on"
+        types_map = [
+            {"article_type": "research-article"},
+            {"display_channel": "Feature", "publication_type": "Feature"},
+            {
+                "article_type": "Research-Article",
+                "display_channel": "feature",
+                "publication_type": "Research Feature",
+            },
+            {"article_type": "research-article", "publication_type": "Research"},
+            {
+                "article_type": "research-article",
+                "case_sensitive": True,
+                "publication_type": "Never used",
+            },
+        ]
+        matcher = utils.PublicationTypeMatcher(types_map)
+        self.assertEqual(matcher.match("research-article", "feature"), "Feature")
+        self.assertEqual(matcher.match("RESEARCH-ARTICLE", None), "Research")
+        self.assertEqual(matcher.match("editorial", "insight"), "Journal Article")
+        self.assertEqual(matcher.match(None, None), "Journal Article")
+        self.assertEqual(matcher.results.get(("RESEARCH-ARTICLE", None)), "Research")
+        # a rule with both values matches before a later single value rule
+        types_map.insert(
+            0,
+            {
+                "article_type": "research-article",
+                "display_channel": "Feature",
+                "case_sensitive": True,
+                "publication_type": "Exact",
+            },
+        )
+        matcher = utils.PublicationTypeMatcher(types_map)
+        self.assertEqual(matcher.match("research-article", "Feature"), "Exact")
+        self.assertEqual(matcher.match("research-article", "feature"), "Feature")
+
+    def test_publication_type_matcher_cached(self):
+        "the same types_map list reuses the compiled matcher"
+        types_map = [{"article_type": "editorial", "publication_type": "Editorial"}]
+        matcher = utils.publication_type_matcher(types_map)
+        self.assertIs(utils.publication_type_matcher(types_map), matcher)
+        self.assertIsNot(utils.publication_type_matcher(list(types_map)), matcher)
+
     def test_contributor_initials(self):
         "various contributor initial values to test"
         self.assertEqual(utils.contributor_initials(None, None), "")
@@ -140,80 +190,19 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(utils.separate_initials("Wendy XY Zoe"), "Wendy X Y Zoe")
         self.assertEqual(utils.separate_initials("STrange Example"), "STrange Example")
 
+    def test_separate_initials_cached(self):
+        "repeated names use the cached result"
+        utils.separate_initials.cache_clear()
+        utils.separate_initials("AB")
+        utils.separate_initials("AB")
+        self.assertEqual(utils.separate_initials.cache_info().hits, 1)
+
     def test_join_phrases(self):
         "test joining some phrases with punctuation"
         self.assertEqual(utils.join_phrases([None, None]), "")
         self.assertEqual(utils.join_phrases(["A", "B", "C"]), "A, B, C")
         self.assertEqual(utils.join_phrases(["A", "B.", "C"]), "A, B. C")
 
-    def test_abstract_parts(self):
-        "test splitting abstract content into sections"
-        label_types = ["Editorial note:"]
-        self.assertEqual(utils.abstract_parts(None, []), [])
-        self.assertEqual(
-            utils.abstract_parts("<p>First.</p><p>Second.</p>", label_types),
-            [
-                OrderedDict([("text", "First."), ("label", "")]),
-                OrderedDict([("text", "Second."), ("label", "")]),
-            ],
-        )
-        self.assertEqual(
-            utils.abstract_parts(
-                "<p>One.</p><p><bold>Editorial note: </bold>A note.</p>", label_types
-            ),
-            [
-                OrderedDict([("text", "One."), ("label", "")]),
-                OrderedDict([("text", "A note."), ("label", "Editorial note")]),
-            ],
-        )
-        # test without a label type match
-        self.assertEqual(
-            utils.abstract_parts(
-                "<p>One.</p><p><bold>Editorial note: </bold>A note.</p>", []
-            ),
-            [
-                OrderedDict([("text", "One."), ("label", "")]),
-                OrderedDict(
-                    [("text", "<bold>Editorial note: </bold>A note."), ("label", "")]
-                ),
-            ],
-        )
-        self.assertEqual(
-            utils.abstract_parts(
-                "<p>One.</p><p><bold>Editorial note: </bold>A note \nacross multiple lines.</p>",
-                label_types,
-            ),
-            [
-                OrderedDict([("text", "One."), ("label", "")]),
-                OrderedDict(
-                    [
-                        ("text", "A note \nacross multiple lines."),
-                        ("label", "Editorial note"),
-                    ]
-                ),
-            ],
-        )
-
-
-class TestAbstractSec(unittest.TestCase):
-    def test_abstract_sec(self):
-        string = "<title>A title</title><p>Paragraph.</p>"
-        expected = OrderedDict([("text", "Paragraph."), ("label", "A title")])
-        result = utils.abstract_sec(string)
-        self.assertEqual(result, expected)
-
-    def test_abstract_sec_blank(self):
-        string = ""
-        expected = OrderedDict()
-        result = utils.abstract_sec(string)
-        self.assertEqual(result, expected)
-
-    def test_abstract_sec_whitespace(self):
-        string = "  \n   "
-        expected = OrderedDict()
-        result = utils.abstract_sec(string)
-        self.assertEqual(result, expected)
-
 
 if __name__ == "__main__":
     unittest.main()